@@ -0,0 +1,546 @@
+import os
+import json
+import datetime
+import random
+import string
+import re
+import gzip
+import time
+import uuid
+import asyncio
+from typing import List, Optional
+from pydantic import BaseModel
+from celery import states
+from fastapi import FastAPI, Request
+from fastapi.responses import HTMLResponse
+from fastapi.templating import Jinja2Templates
+from fastapi.staticfiles import StaticFiles
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from uploads import MAX_UPLOAD_BYTES, InvalidUpload, UploadTooLarge, copy_stream_to_disk, receive_uploads
+from profiles import UnknownProfile, resolve_profile
+from probe import InvalidAudio, check_admission, probe_audio
+from partials import is_known_task, mark_submitted, read_segments, time_to_first_text
+from batches import (
+    BATCH_MAX_FILES, BATCH_CONCURRENCY, batch_done_count, batch_queue_length, create_batch, dispatch_batch_items,
+    get_batch, read_batch_done, resolve_manifest_path,
+)
+from routing import queue_stats, route_transcription
+from task_events import TASK_EVENTS_KEEPALIVE_SECS, format_sse, get_task_event_hub
+from result_cache import get_result_cache
+from word_table import OUTPUT_MODES
+from metrics import observe, observe_stage, render_metrics, stage_timer
+from operations import pending_operation_count
+from scratch import SCRATCH_RETRY_AFTER_SECS, ScratchFull, check_intake, scratch_usage_bytes
+from translation import TRANSLATION_MAX_CHARS, translate_text, translate_transcript
+from celery_app import TRANSCRIPTION_TASK, celery_app, send_task
+
+
+# API side of the service: uploads, batches, results and monitoring. It queues tasks by name and
+# imports none of the Google SDKs, pydub or the worker pipeline, so it starts fast and stays small.
+# Start it with "uvicorn api:fastapi_app".
+
+# /result responses at least this large are gzip compressed for clients that accept it (bytes)
+RESULT_GZIP_MIN_BYTES = 1024
+
+# Seconds between checks for newly finished files while streaming batch results
+BATCH_RESULTS_POLL_SECS = 2
+
+# FastAPI app
+fastapi_app = FastAPI()
+
+# Simple root route for testing
+@fastapi_app.get("/")
+async def root():
+    return {
+        "message": "Audio Transcription Service",
+        "endpoints": {
+            "transcribe_english": "/transcribe/",
+            "transcribe_georgian": "/transcribe-georgian/",
+            "transcribe_profile": "/transcribe/{profile}/",
+            "get_result": "/result/{task_id}",
+            "translate": "/translate/",
+            "docs": "/docs"
+        }
+    }
+
+# Reject oversized uploads from the Content-Length header before the body is parsed, and any upload
+# while scratch storage is over its quota
+@fastapi_app.middleware("http")
+async def limit_upload_size(request: Request, call_next):
+    if request.method == "POST" and request.url.path.startswith(("/transcribe", "/batch")):
+        content_length = request.headers.get("content-length")
+        content_length = int(content_length) if content_length and content_length.isdigit() else 0
+        if request.url.path.startswith("/transcribe") and content_length > MAX_UPLOAD_BYTES:
+            return JSONResponse(status_code=413, content={"error": f"Upload exceeds the {MAX_UPLOAD_BYTES} byte limit"})
+        try:
+            await run_in_threadpool(check_intake, content_length)
+        except ScratchFull as e:
+            return scratch_full_response(e)
+    return await call_next(request)
+
+def scratch_full_response(error):
+    return JSONResponse(status_code=503, content={"error": str(error)},
+                        headers={"Retry-After": str(SCRATCH_RETRY_AFTER_SECS)})
+
+# Record the latency of every API request by route, for /metrics
+@fastapi_app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    start = time.perf_counter()
+    response = await call_next(request)
+    route = request.scope.get("route")
+    await run_in_threadpool(
+        observe, "http_request_seconds", time.perf_counter() - start,
+        method=request.method, route=route.path if route is not None else "unmatched", status=str(response.status_code),
+    )
+    return response
+
+fastapi_app.mount("/static", StaticFiles(directory="static"), name="static")
+
+templates = Jinja2Templates(directory="templates")
+
+@fastapi_app.get("/data", response_class=HTMLResponse)
+async def render_index(request: Request):
+    return templates.TemplateResponse("index.html", {"request": request})
+
+#------------------------------------------------------------------------------------------------------
+# Upload endpoints read the multipart body themselves (uploads.receive_uploads), writing each file
+# straight into uploads_audios; these describe the body in the API docs
+def upload_body_schema(properties, required):
+    return {"requestBody": {"required": True, "content": {"multipart/form-data": {"schema": {
+        "type": "object", "properties": properties, "required": required,
+    }}}}}
+
+UPLOAD_BODY = upload_body_schema({"file": {"type": "string", "format": "binary"}}, ["file"])
+BATCH_UPLOAD_BODY = upload_body_schema({
+    "files": {"type": "array", "items": {"type": "string", "format": "binary"}},
+    "language": {"type": "string", "default": "english"},
+    "output": {"type": "string", "default": "segments"},
+}, ["files"])
+
+# Function to get the path an uploaded file is saved under
+def upload_path(filename):
+    return f"uploads_audios/{generate_unique_filename() + filename}"
+
+# FastAPI endpoint
+# ?output=words adds the word table (per-word timings and confidences) to the result
+@fastapi_app.post("/transcribe/", openapi_extra=UPLOAD_BODY)
+async def transcribe_audio(request: Request, output: str = "segments"):
+    return await submit_transcription(request, "english", "Transcription in progress.", output)
+
+# FastAPI endpoint for Georgian transcription
+@fastapi_app.post("/transcribe-georgian/", openapi_extra=UPLOAD_BODY)
+async def transcribe_georgian_audio(request: Request, output: str = "segments"):
+    return await submit_transcription(request, "georgian", "Georgian transcription in progress.", output)
+
+# FastAPI endpoint for transcription with any registered recognition profile
+@fastapi_app.post("/transcribe/{profile}/", openapi_extra=UPLOAD_BODY)
+async def transcribe_audio_with_profile(profile: str, request: Request, output: str = "segments"):
+    return await submit_transcription(request, profile, f"Transcription ({profile}) in progress.", output)
+
+# Function to save an upload and queue its transcription with the given profile and output mode
+async def submit_transcription(request, profile, message, output="segments"):
+    try:
+        profile = resolve_profile(profile)
+    except UnknownProfile as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+    if output not in OUTPUT_MODES:
+        return JSONResponse(status_code=400, content={"error": f"Unknown output mode: {output}"})
+
+    try:
+        upload_start = time.perf_counter()
+        _, uploads = await receive_uploads(request, upload_path)
+        upload = uploads[0]
+        audio_path = upload["audio_path"]
+        upload_secs = time.perf_counter() - upload_start
+        print(f"Saved upload {audio_path} ({upload['size_bytes']} bytes, sha256 {upload['sha256']})")
+        probe = await admit_upload(audio_path)
+        options = route_transcription(audio_path, profile, probe=probe)
+        observe_stage("upload", upload_secs, profile, probe["duration_secs"])
+        # Submission is recorded before the task is sent, so a task finishing at once (a cache hit)
+        # never stores its first text ahead of it
+        task_id = str(uuid.uuid4())
+        mark_submitted(task_id)
+        send_task(TRANSCRIPTION_TASK, args=(audio_path, profile, upload["sha256"], output), task_id=task_id, **options)
+        return {
+            "task_id": task_id,
+            "message": message + " Use /result/{task_id} to fetch the result.",
+            "audio": {"duration_secs": probe["duration_secs"], "estimated_cost": options["headers"]["audio_cost"]},
+        }
+    except UploadTooLarge as e:
+        return JSONResponse(status_code=413, content={"error": str(e)})
+    except (InvalidUpload, InvalidAudio) as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+    except Exception as e:
+        return {"error": str(e)}
+
+# Function to probe a saved upload's headers and reject it (deleting the file) when it isn't readable
+# audio or is longer than MAX_AUDIO_LENGTH_SECS; returns the probe
+async def admit_upload(audio_path, name=None):
+    try:
+        probe = await run_in_threadpool(probe_audio, audio_path)
+        check_admission(probe)
+        return probe
+    except InvalidAudio as e:
+        os.remove(audio_path)
+        raise type(e)(f"{name}: {e}" if name else str(e)) from e
+
+#------------------------------------------------------------------------------------------------------
+# FastAPI endpoint for batch transcription of many uploaded files, sent as "files" fields with
+# "language" and "output" form fields
+@fastapi_app.post("/batch/", openapi_extra=BATCH_UPLOAD_BODY)
+async def submit_batch(request: Request):
+    try:
+        upload_start = time.perf_counter()
+        fields, uploads = await receive_uploads(request, upload_path, "files", max_files=BATCH_MAX_FILES)
+        upload_secs = time.perf_counter() - upload_start
+    except UploadTooLarge as e:
+        return JSONResponse(status_code=413, content={"error": str(e)})
+    except InvalidUpload as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+    # The form fields may follow the files, so they are only checked once the body is read
+    items = [{"filename": upload["filename"], "audio_path": upload["audio_path"], "upload_sha256": upload["sha256"]}
+             for upload in uploads]
+    output = fields.get("output", "segments")
+    try:
+        language = resolve_profile(fields.get("language", "english"))
+    except UnknownProfile as e:
+        remove_batch_uploads(items)
+        return JSONResponse(status_code=400, content={"error": str(e)})
+    if output not in OUTPUT_MODES:
+        remove_batch_uploads(items)
+        return JSONResponse(status_code=400, content={"error": f"Unknown output mode: {output}"})
+
+    try:
+        observe_stage("upload", upload_secs, language)
+        for item in items:
+            item["probe"] = await admit_upload(item["audio_path"], item["filename"])
+            item["output_mode"] = output
+        return start_batch(items, language)
+    except InvalidAudio as e:
+        remove_batch_uploads(items)
+        return JSONResponse(status_code=400, content={"error": str(e)})
+    except Exception as e:
+        remove_batch_uploads(items)
+        return {"error": str(e)}
+
+class BatchManifest(BaseModel):
+    paths: List[str]
+    language: str = "english"
+    output: str = "segments"
+
+# FastAPI endpoint for batch transcription of files already on the server (under BATCH_MANIFEST_ROOT)
+@fastapi_app.post("/batch/manifest")
+async def submit_batch_manifest(manifest: BatchManifest):
+    try:
+        language = resolve_profile(manifest.language)
+    except UnknownProfile as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+    if manifest.output not in OUTPUT_MODES:
+        return JSONResponse(status_code=400, content={"error": f"Unknown output mode: {manifest.output}"})
+    if len(manifest.paths) > BATCH_MAX_FILES:
+        return JSONResponse(status_code=400, content={"error": f"A batch can hold at most {BATCH_MAX_FILES} files"})
+
+    items = []
+    try:
+        for path in manifest.paths:
+            source_path = resolve_manifest_path(path)
+            filename = os.path.basename(source_path)
+            audio_path = f"uploads_audios/{generate_unique_filename() + filename}"
+            # Work on a copy: processing deletes its input, and the manifest files are not ours
+            await run_in_threadpool(check_intake, os.path.getsize(source_path))
+            upload = await run_in_threadpool(copy_file_to_disk, source_path, audio_path)
+            probe = await admit_upload(audio_path, path)
+            items.append({"filename": path, "audio_path": audio_path, "upload_sha256": upload["sha256"],
+                          "output_mode": manifest.output, "probe": probe})
+        return start_batch(items, language)
+    except (ValueError, UploadTooLarge, InvalidAudio) as e:
+        remove_batch_uploads(items)
+        return JSONResponse(status_code=400, content={"error": str(e)})
+    except ScratchFull as e:
+        remove_batch_uploads(items)
+        return scratch_full_response(e)
+    except Exception as e:
+        remove_batch_uploads(items)
+        return {"error": str(e)}
+
+# Function to record a batch and start its first BATCH_CONCURRENCY items
+def start_batch(items, language_config):
+    batch_id, items = create_batch(items, language_config)
+    dispatch_batch_items(batch_id, BATCH_CONCURRENCY)
+    return {
+        "batch_id": batch_id,
+        "task_ids": [item["task_id"] for item in items],
+        "message": f"Batch of {len(items)} files in progress. Use /batch/{batch_id}/results to fetch the results.",
+    }
+
+# Function to remove the files saved for a batch that could not be started
+def remove_batch_uploads(items):
+    for item in items:
+        if os.path.exists(item["audio_path"]):
+            os.remove(item["audio_path"])
+
+# Function to copy a server-local file into uploads_audios, hashing it on the way
+def copy_file_to_disk(source_path, audio_path):
+    with open(source_path, "rb") as source:
+        return copy_stream_to_disk(source, audio_path)
+
+#------------------------------------------------------------------------------------------------------
+# Endpoint to get a batch's progress
+@fastapi_app.get("/batch/{batch_id}")
+def get_batch_status(batch_id: str):
+    batch = get_batch(batch_id)
+    if batch is None:
+        return JSONResponse(status_code=404, content={"error": "Batch not found"})
+    done = batch_done_count(batch_id)
+    waiting = batch_queue_length(batch_id)
+    return {
+        "batch_id": batch_id,
+        "total": batch["total"],
+        "done": done,
+        "running": batch["total"] - done - waiting,
+        "waiting": waiting,
+        "concurrency": batch["concurrency"],
+    }
+
+# Endpoint streaming a batch's finished transcripts as NDJSON, one line per file.
+# With ?wait=true the stream stays open and delivers each file as it finishes until the batch is done.
+@fastapi_app.get("/batch/{batch_id}/results")
+async def stream_batch_results(batch_id: str, wait: bool = False):
+    batch = await run_in_threadpool(get_batch, batch_id)
+    if batch is None:
+        return JSONResponse(status_code=404, content={"error": "Batch not found"})
+    filenames = {item["task_id"]: item["filename"] for item in batch["items"]}
+
+    async def ndjson_stream():
+        cursor = 0
+        while True:
+            entries, cursor = await run_in_threadpool(read_batch_done, batch_id, cursor)
+            for entry in entries:
+                yield json.dumps(dict(entry, filename=filenames.get(entry["task_id"]))) + "\n"
+            if not wait or cursor >= batch["total"]:
+                return
+            await asyncio.sleep(BATCH_RESULTS_POLL_SECS)
+
+    return StreamingResponse(ndjson_stream(), media_type="application/x-ndjson")
+
+#------------------------------------------------------------------------------------------------------
+# Endpoint to get each queue's depth and recent wait times
+@fastapi_app.get("/queues/stats")
+def get_queue_stats():
+    with celery_app.connection_for_read() as connection:
+        return queue_stats(connection.default_channel.client)
+
+#------------------------------------------------------------------------------------------------------
+# Endpoint exposing API and worker metrics in the Prometheus text format: stage histograms by profile
+# and audio duration, recognition path and error counters, Celery task run times and queue waits,
+# plus the current queue depths and pending long running operations
+@fastapi_app.get("/metrics")
+def get_metrics():
+    with celery_app.connection_for_read() as connection:
+        depths = [({"queue": name}, stats["depth"]) for name, stats in queue_stats(connection.default_channel.client).items()]
+    gauges = {
+        "celery_queue_depth": ("Tasks waiting in each queue", depths),
+        "pending_long_running_operations": ("Long running operations waiting for the poller", [({}, pending_operation_count())]),
+        "scratch_bytes": ("Disk used by uploads and task workspaces on this API host", [({}, scratch_usage_bytes())]),
+    }
+    return PlainTextResponse(render_metrics(gauges), media_type="text/plain; version=0.0.4")
+
+#------------------------------------------------------------------------------------------------------
+# Endpoint to get result cache hit/miss counters
+@fastapi_app.get("/cache/stats")
+def get_cache_stats():
+    cache = get_result_cache()
+    if cache is None:
+        return {"backend": "off"}
+    return cache.stats()
+
+#------------------------------------------------------------------------------------------------------
+class TranslationRequest(BaseModel):
+    text: Optional[str] = None
+    segments: Optional[List[str]] = None
+    source_language: str = "ka"
+    target_language: str = "en"
+
+# FastAPI endpoint to translate a transcript, sent as one text or as its segments, sentence by
+# sentence. Repeated sentences are translated once, sentences translated before (e.g. by the
+# translation task run after transcription) come from the cache, and the rest are batched into as
+# few backend calls as possible.
+@fastapi_app.post("/translate/")
+async def translate(request: TranslationRequest):
+    if not request.text and not request.segments:
+        return JSONResponse(status_code=400, content={"error": "Nothing to translate: send text or segments"})
+    size = len(request.text or "") + sum(len(segment) for segment in request.segments or [])
+    if size > TRANSLATION_MAX_CHARS:
+        return JSONResponse(status_code=413, content={"error": f"Text exceeds the {TRANSLATION_MAX_CHARS} character limit"})
+
+    try:
+        with stage_timer("translate"):
+            if request.segments:
+                translations, stats = await run_in_threadpool(
+                    translate_transcript, request.segments, request.source_language, request.target_language)
+                translation = " ".join(translation for translation in translations if translation)
+            else:
+                translations = None
+                translation, stats = await run_in_threadpool(
+                    translate_text, request.text, request.source_language, request.target_language)
+    except Exception as e:
+        print(f"Error translating {size} characters: {e}")
+        return JSONResponse(status_code=502, content={"error": f"Translation failed: {str(e)}"})
+
+    response = {
+        "translation": translation,
+        "source_language": request.source_language,
+        "target_language": request.target_language,
+        **stats,
+    }
+    if translations is not None:
+        response["translations"] = translations
+    return response
+
+#------------------------------------------------------------------------------------------------------
+# Endpoint to get transcription result
+# With ?cursor=N only the partial segments stored after position N are returned, together with the
+# cursor to send next time, so long jobs can be read while they are still running. A plain def:
+# the result backend and Redis reads block, so FastAPI runs it in the thread pool.
+@fastapi_app.get("/result/{task_id}")
+def get_result(task_id: str, request: Request, cursor: Optional[int] = None):
+    payload = task_result_payload(task_id)
+    if cursor is None:
+        return json_response(request, payload)
+
+    segments, next_cursor = read_segments(task_id, cursor)
+    response = {
+        "status": payload["status"],
+        "segments": segments,
+        "cursor": next_cursor,
+        "time_to_first_text_s": time_to_first_text(task_id),
+    }
+    if payload["status"] == "failure":
+        response["message"] = payload["message"]
+    return json_response(request, response)
+
+# Function to build a JSON response, gzip compressed when it is large and the client accepts gzip
+def json_response(request, payload):
+    body = json.dumps(payload, default=str).encode("utf-8")
+    if len(body) < RESULT_GZIP_MIN_BYTES or "gzip" not in request.headers.get("accept-encoding", ""):
+        return Response(body, media_type="application/json")
+    return Response(gzip.compress(body), media_type="application/json",
+                    headers={"Content-Encoding": "gzip", "Vary": "Accept-Encoding"})
+
+# Function to describe a task's state the way /result reports it
+def task_result_payload(task_id):
+    result = celery_app.AsyncResult(task_id)
+    if result.state == "SUCCESS":
+        return {"status": "success", "result": result.result}
+    elif result.state in states.READY_STATES:
+        return {"status": "failure", "message": result.info}
+    else:
+        # PENDING, STARTED and RETRY are all still in progress
+        return {"status": "pending", "message": "Task is still in progress."}
+
+#------------------------------------------------------------------------------------------------------
+# Function to get the state an event stream reports when it closes without a result event: the
+# stored result, or a failure for a task that was never submitted (or expired); None while pending
+def stream_closing_payload(task_id):
+    payload = task_result_payload(task_id)
+    if payload["status"] != "pending":
+        return payload
+    if not is_known_task(task_id):
+        return {"status": "failure", "message": "Unknown task"}
+    return None
+
+# Endpoint streaming task progress and the final result as Server-Sent Events.
+# All clients share the process wide Redis listener, and each stream ends after the result event.
+# The stored state is checked again at every keepalive, so a result event missed while the listener
+# was reconnecting, or never sent by a task that was killed, still ends the stream.
+@fastapi_app.get("/events/{task_id}")
+async def stream_task_events(task_id: str, request: Request):
+    hub = get_task_event_hub()
+    # Subscribe before reading the stored state so a task finishing in between is not missed
+    queue = await hub.subscribe(task_id)
+
+    async def event_stream():
+        try:
+            payload = await run_in_threadpool(stream_closing_payload, task_id)
+            if payload is not None:
+                yield format_sse("result", payload)
+                return
+
+            last = await hub.last_event(task_id)
+            if last is not None:
+                yield format_sse("progress", last)
+
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), TASK_EVENTS_KEEPALIVE_SECS)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        return
+                    payload = await run_in_threadpool(stream_closing_payload, task_id)
+                    if payload is not None:
+                        yield format_sse("result", payload)
+                        return
+                    yield ": keepalive\n\n"
+                    continue
+
+                if event["type"] == "result":
+                    yield format_sse("result", {"status": event["status"], "result": event["result"]})
+                    return
+                yield format_sse(event["type"], event)
+        finally:
+            hub.unsubscribe(task_id, queue)
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+#------------------------------------------------------------------------------------------------------
+
+# General Functions
+#------------------------------------------------------------------------------------------------------
+# Function to generate a newfilename
+def generate_unique_filename():
+    prefix="HOAudio_"
+    # Get current time in microseconds
+    microseconds = datetime.datetime.now().microsecond
+    # Generate a random string of 8 characters
+    random_string = ''.join(random.choices(string.ascii_lowercase + string.digits, k=8))
+    # Combine prefix, microseconds, and random string
+    filename = f"{prefix}{microseconds}{random_string}"
+    return filename
+#------------------------------------------------------------------------------------------------------
+# Function to extract data from url without prefix 
+def extract_uri(response_str):
+  lines = response_str.splitlines()
+  for line in lines:
+    if "uri:" in line:
+      uri = line.split(": ")[1].strip() 
+      # Remove the bucket prefix
+      uri = uri.replace("gs://ho_georgian/", "") 
+      return uri
+  return None
+#------------------------------------------------------------------------------------------------------
+#Funtion to Extracts the first occurrence of a URI from the given result string.
+def get_first_uri(result_string):
+  match = re.search(r'uri:\s*"(.*?)"', result_string)
+  if match:
+    return match.group(1)
+  else:
+    return None
+  
+def remove_gs_bucket_prefix(path):
+  if path.startswith("gs://healthorbit_bucket/"):
+    return path[len("gs://healthorbit_bucket/"):]
+  else:
+    return path
+
+def remove_gs_bucket_prefix_georgian(path):
+  if path.startswith("gs://ho_georgian/"):
+    return path[len("gs://ho_georgian/"):]
+  else:
+    return path
+  
+def remove_local_pathsuffix(path):
+  if path.startswith("uploads_audios/"):
+    return path[len("uploads_audios/"):]
+  else:
+    return path  
+#------------------------------------------------------------------------------------------------------
@@ -0,0 +1,191 @@
+import os
+import json
+import time
+import uuid
+
+import redis
+
+from celery_app import BATCH_ITEM_TASK, send_task
+from partials import mark_queued, mark_submitted
+from routing import route_transcription
+
+
+# Redis holding batch manifests and their progress
+BATCH_REDIS_URL = os.environ.get("BATCH_REDIS_URL", "redis://localhost:6379/1")
+
+# Files of one batch being transcribed at the same time, so a big batch can't starve interactive requests
+BATCH_CONCURRENCY = int(os.environ.get("BATCH_CONCURRENCY", 4))
+
+# Most files accepted in one batch
+BATCH_MAX_FILES = int(os.environ.get("BATCH_MAX_FILES", 1000))
+
+# Server-local manifest paths must live under this directory
+BATCH_MANIFEST_ROOT = os.environ.get("BATCH_MANIFEST_ROOT", "batch_inbox")
+
+# How long batch records are kept (seconds)
+BATCH_TTL_SECS = int(os.environ.get("BATCH_TTL_SECS", 7 * 24 * 60 * 60))
+
+BATCH_PREFIX = "batch:"
+
+# Set of the batches with unfinished items, walked by the reaper (reap_batch_items)
+ACTIVE_BATCHES_KEY = BATCH_PREFIX + "active"
+
+_client = None
+
+def get_batch_client():
+    global _client
+    if _client is None:
+        _client = redis.Redis.from_url(BATCH_REDIS_URL)
+    return _client
+
+#------------------------------------------------------------------------------------------------------
+# Function to resolve a manifest path, refusing anything outside BATCH_MANIFEST_ROOT
+def resolve_manifest_path(path, root=BATCH_MANIFEST_ROOT):
+    root = os.path.realpath(root)
+    resolved = os.path.realpath(os.path.join(root, path))
+    if os.path.commonpath([root, resolved]) != root:
+        raise ValueError(f"Manifest path is outside {BATCH_MANIFEST_ROOT}: {path}")
+    if not os.path.isfile(resolved):
+        raise ValueError(f"Manifest file not found: {path}")
+    return resolved
+
+#------------------------------------------------------------------------------------------------------
+# Function to record a new batch. Every item gets its task ID up front, so results can be listed
+# before the item is dispatched. All items start in the batch's waiting queue.
+def create_batch(items, language_config="english", concurrency=BATCH_CONCURRENCY):
+    batch_id = str(uuid.uuid4())
+    key = BATCH_PREFIX + batch_id
+    items = [dict(item, task_id=str(uuid.uuid4()), language_config=language_config) for item in items]
+
+    pipe = get_batch_client().pipeline()
+    pipe.hset(key, mapping={
+        "total": len(items),
+        "concurrency": concurrency,
+        "language_config": language_config,
+        "created_at": time.time(),
+    })
+    encoded = [json.dumps(item) for item in items]
+    pipe.rpush(key + ":items", *encoded)
+    pipe.rpush(key + ":queue", *encoded)
+    for suffix in ("", ":items", ":queue"):
+        pipe.expire(key + suffix, BATCH_TTL_SECS)
+    pipe.sadd(ACTIVE_BATCHES_KEY, batch_id)
+    pipe.execute()
+    mark_queued([item["task_id"] for item in items])
+    return batch_id, items
+
+# Function to take up to count waiting items off a batch's queue
+def pop_batch_queue(batch_id, count):
+    items = get_batch_client().lpop(BATCH_PREFIX + batch_id + ":queue", count)
+    return [json.loads(item) for item in items or []]
+
+# Function to queue up to count waiting items of a batch, under their pre-assigned task IDs. Each is
+# recorded as running until it is marked done, so the reaper can find items whose task died. An item
+# that can't be queued (broker down, routing error) is finished with the error, its upload removed,
+# and the next waiting item takes its slot, so the batch still completes.
+def dispatch_batch_items(batch_id, count):
+    running_key = BATCH_PREFIX + batch_id + ":running"
+    while count > 0:
+        items = pop_batch_queue(batch_id, count)
+        count = 0
+        for item in items:
+            pipe = get_batch_client().pipeline()
+            pipe.hset(running_key, item["task_id"], json.dumps(item))
+            pipe.expire(running_key, BATCH_TTL_SECS)
+            pipe.execute()
+            mark_submitted(item["task_id"])
+            try:
+                send_task(
+                    BATCH_ITEM_TASK,
+                    args=(batch_id, item["audio_path"], item["language_config"], item["upload_sha256"],
+                          item.get("output_mode", "segments")),
+                    task_id=item["task_id"],
+                    **route_transcription(item["audio_path"], item["language_config"], bulk=True,
+                                          probe=item.get("probe")),
+                )
+            except Exception as e:
+                print(f"Error queueing batch item {item['task_id']} of batch {batch_id}: {e}")
+                mark_batch_item_done(batch_id, item["task_id"], {"error": f"Transcription failed: {str(e)}"})
+                if os.path.exists(item["audio_path"]):
+                    os.remove(item["audio_path"])
+                count += 1
+
+# Function to record that a batch item finished. The result is kept with it, so bulk retrieval
+# never has to wait for or look up the Celery result backend. An item is recorded once: returns
+# False when it was already done (e.g. finished by the task and then by the reaper).
+def mark_batch_item_done(batch_id, task_id, result):
+    key = BATCH_PREFIX + batch_id
+    client = get_batch_client()
+    if not client.hsetnx(key + ":done_ids", task_id, 1):
+        return False
+    pipe = client.pipeline()
+    pipe.rpush(key + ":done", json.dumps({"task_id": task_id, "result": result}))
+    pipe.hdel(key + ":running", task_id)
+    for suffix in (":done", ":done_ids"):
+        pipe.expire(key + suffix, BATCH_TTL_SECS)
+    pipe.llen(key + ":done")
+    pipe.hget(key, "total")
+    done, total = pipe.execute()[-2:]
+    if total is None or done >= int(total):
+        client.srem(ACTIVE_BATCHES_KEY, batch_id)
+    return True
+
+# Function to finish a batch item and start the next waiting one of its batch, unless it was done already
+def finish_batch_item(batch_id, task_id, result):
+    if mark_batch_item_done(batch_id, task_id, result):
+        dispatch_batch_items(batch_id, 1)
+
+#------------------------------------------------------------------------------------------------------
+# Function to list the running items of every active batch as (batch_id, item); batches that
+# expired are dropped from the active set
+def running_batch_items():
+    client = get_batch_client()
+    running = []
+    for batch_id in [batch_id.decode() for batch_id in client.smembers(ACTIVE_BATCHES_KEY)]:
+        if not client.exists(BATCH_PREFIX + batch_id):
+            client.srem(ACTIVE_BATCHES_KEY, batch_id)
+            continue
+        for item in client.hvals(BATCH_PREFIX + batch_id + ":running"):
+            running.append((batch_id, json.loads(item)))
+    return running
+
+# Function to get the upload paths of every batch item not done yet, waiting or running, which the
+# scratch sweeper must keep however long they wait
+def pending_batch_audio_paths():
+    client = get_batch_client()
+    paths = {item["audio_path"] for _, item in running_batch_items()}
+    for batch_id in client.smembers(ACTIVE_BATCHES_KEY):
+        for item in client.lrange(BATCH_PREFIX + batch_id.decode() + ":queue", 0, -1):
+            paths.add(json.loads(item)["audio_path"])
+    return paths
+
+#------------------------------------------------------------------------------------------------------
+# Function to get a batch's metadata and items, None when the batch is unknown
+def get_batch(batch_id):
+    client = get_batch_client()
+    meta = client.hgetall(BATCH_PREFIX + batch_id)
+    if not meta:
+        return None
+    meta = {name.decode(): value.decode() for name, value in meta.items()}
+    items = [json.loads(item) for item in client.lrange(BATCH_PREFIX + batch_id + ":items", 0, -1)]
+    return {
+        "batch_id": batch_id,
+        "total": int(meta["total"]),
+        "concurrency": int(meta["concurrency"]),
+        "language_config": meta["language_config"],
+        "created_at": float(meta["created_at"]),
+        "items": items,
+    }
+
+# Function to read the items finished after the given cursor; returns (entries, next_cursor)
+def read_batch_done(batch_id, cursor=0):
+    entries = get_batch_client().lrange(BATCH_PREFIX + batch_id + ":done", cursor, -1)
+    return [json.loads(entry) for entry in entries], cursor + len(entries)
+
+# Function to count a batch's finished items
+def batch_done_count(batch_id):
+    return get_batch_client().llen(BATCH_PREFIX + batch_id + ":done")
+
+# Function to count a batch's waiting items
+def batch_queue_length(batch_id):
+    return get_batch_client().llen(BATCH_PREFIX + batch_id + ":queue")
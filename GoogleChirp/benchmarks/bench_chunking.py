@@ -0,0 +1,97 @@
+# Benchmark: chunked parallel recognition on a synthetic "speech" WAV with the offline recognizer.
+#
+# The fixture is a sequence of short tones ("words") separated by pauses; each tone frequency maps to
+# a word. The local recognizer (recognizers.LocalRecognizer) finds the tones in a chunk and reports
+# them with chunk relative offsets, so the merged transcript can be checked for ordering, offsets and
+# duplicated overlap words.
+# Usage: python benchmarks/bench_chunking.py --minutes 30 --workers 1 2 4 8 --latency 0.5
+import os
+import sys
+import json
+import math
+import time
+import wave
+import array
+import random
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from chunking import plan_chunks, recognize_chunks, merge_chunk_results
+from recognizers import LOCAL_BASE_FREQ, LOCAL_FREQ_STEP, LOCAL_VOCABULARY, LocalRecognizer
+
+RATE = 16000
+BASE_FREQ = LOCAL_BASE_FREQ
+FREQ_STEP = LOCAL_FREQ_STEP
+VOCABULARY = LOCAL_VOCABULARY[:8]
+
+
+def make_fixture(path, minutes, seed=7):
+    rng = random.Random(seed)
+    expected = []
+    samples = array.array("h")
+    total = int(minutes * 60 * RATE)
+    while len(samples) < total:
+        pause = rng.choice([0.15, 0.25, 0.4, 0.4, 1.2])
+        samples.extend([0] * int(pause * RATE))
+        index = rng.randrange(len(VOCABULARY))
+        freq = BASE_FREQ + FREQ_STEP * index
+        length = rng.choice([0.2, 0.3, 0.45])
+        start = len(samples) / RATE
+        samples.extend(int(8000 * math.sin(2 * math.pi * freq * n / RATE)) for n in range(int(length * RATE)))
+        expected.append((VOCABULARY[index], start, len(samples) / RATE))
+    with wave.open(path, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(RATE)
+        wav.writeframes(samples.tobytes())
+    return expected
+
+
+def check(expected, output_data):
+    got = [word for entry in output_data for word in entry["transcript"].split()]
+    starts = [float(entry["start_time"].rstrip("s")) for entry in output_data]
+    return {
+        "expected_words": len(expected),
+        "merged_words": len(got),
+        "words_match": got == [word for word, _, _ in expected],
+        "ordered": starts == sorted(starts),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Chunked recognition benchmark")
+    parser.add_argument("--minutes", type=float, default=30)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--latency", type=float, default=0.5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        wav_path = os.path.join(workdir, "fixture.wav")
+        expected = make_fixture(wav_path, args.minutes)
+
+        start = time.perf_counter()
+        chunks = plan_chunks(wav_path)
+        plan_s = time.perf_counter() - start
+
+        for workers in args.workers:
+            recognizer = LocalRecognizer(latency=args.latency)
+            start = time.perf_counter()
+            chunk_results = recognize_chunks(wav_path, chunks, recognizer, max_workers=workers)
+            output_data = merge_chunk_results(chunk_results)
+            elapsed = time.perf_counter() - start
+            result = {
+                "audio_minutes": args.minutes,
+                "chunks": len(chunks),
+                "workers": workers,
+                "plan_s": round(plan_s, 3),
+                "elapsed_s": round(elapsed, 3),
+                "audio_secs_per_sec": round(args.minutes * 60 / elapsed, 1),
+            }
+            result.update(check(expected, output_data))
+            print(json.dumps(result))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+# Microbenchmark: per-task Google client overhead, new clients per task vs the process-wide pool.
+#
+# By default it runs offline with anonymous credentials and measures client construction and gRPC
+# channel setup. Pass --credentials to include service account loading; TLS handshakes on first
+# use come on top of this against the real API.
+# Usage: python benchmarks/bench_clients.py --tasks 200 [--credentials healthorbit-ai.json]
+import os
+import sys
+import json
+import time
+import argparse
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import google.auth
+from google.auth.credentials import AnonymousCredentials
+from google.cloud import speech
+from google.cloud import storage
+
+import clients
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(pct / 100.0 * (len(values) - 1))))
+    return values[index]
+
+
+def per_task_clients():
+    speech.SpeechClient()
+    storage.Client()
+
+
+def pooled_clients():
+    clients.get_speech_client()
+    clients.get_storage_client()
+
+
+def measure(name, setup, tasks):
+    timings = []
+    for _ in range(tasks):
+        start = time.perf_counter()
+        setup()
+        timings.append(time.perf_counter() - start)
+    return {
+        "mode": name,
+        "tasks": tasks,
+        "total_s": round(sum(timings), 4),
+        "mean_ms": round(sum(timings) / tasks * 1000, 3),
+        "p99_ms": round(percentile(timings, 99) * 1000, 3),
+        "first_ms": round(timings[0] * 1000, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Google client pool microbenchmark")
+    parser.add_argument("--tasks", type=int, default=200)
+    parser.add_argument("--credentials")
+    args = parser.parse_args()
+
+    if args.credentials:
+        os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = args.credentials
+        auth = mock.patch.object(google.auth, "default", wraps=google.auth.default)
+    else:
+        auth = mock.patch.object(google.auth, "default", return_value=(AnonymousCredentials(), "bench-project"))
+
+    with auth:
+        print(json.dumps(measure("per_task", per_task_clients, args.tasks)))
+        print(json.dumps(measure("pooled", pooled_clients, args.tasks)))
+
+
+if __name__ == "__main__":
+    main()
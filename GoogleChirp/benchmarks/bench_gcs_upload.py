@@ -0,0 +1,155 @@
+# Benchmark: transcode to a local WAV and upload it (old path) vs streaming the transcoder output
+# straight into a resumable chunked GCS upload (gcs_upload.AudioStager).
+#
+# Runs against a GCS emulator through STORAGE_EMULATOR_HOST: pass --emulator http://localhost:4443
+# for fake-gcs-server, otherwise a minimal in-process fake speaking the JSON upload API is started.
+# Each mode runs in its own subprocess so peak RSS is measured in isolation.
+# Usage: python benchmarks/bench_gcs_upload.py --minutes 5 30 [--emulator http://localhost:4443]
+import os
+import sys
+import json
+import time
+import uuid
+import argparse
+import resource
+import tempfile
+import threading
+import subprocess
+from urllib.parse import urlparse, parse_qs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from bench_transcode import make_fixture
+
+BUCKET = "bench-bucket"
+
+
+#------------------------------------------------------------------------------------------------------
+# Minimal fake GCS: resumable and multipart uploads and deletes, object sizes kept in memory
+class FakeGCSHandler(BaseHTTPRequestHandler):
+    objects = {}
+    sessions = {}
+
+    def log_message(self, *args):
+        pass
+
+    def read_body(self):
+        return self.rfile.read(int(self.headers.get("Content-Length") or 0))
+
+    def send_json(self, status, body, headers=None):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        bucket = url.path.split("/")[5]
+        query = parse_qs(url.query)
+        body = self.read_body()
+        if query["uploadType"][0] == "resumable":
+            name = query.get("name", [None])[0] or json.loads(body or b"{}").get("name")
+            session = str(uuid.uuid4())
+            self.sessions[session] = {"bucket": bucket, "name": name, "size": 0}
+            host = self.headers["Host"]
+            self.send_json(200, {}, {"Location": f"http://{host}/upload/resumable/{session}"})
+        else:
+            # Multipart: metadata part, then the data; the object size is close enough for a benchmark
+            name = query.get("name", [None])[0] or json.loads(body.split(b"\r\n\r\n", 2)[1].split(b"\r\n--")[0])["name"]
+            self.objects[(bucket, name)] = len(body)
+            self.send_json(200, {"bucket": bucket, "name": name, "size": str(len(body))})
+
+    def do_PUT(self):
+        session = self.sessions[self.path.rsplit("/", 1)[1]]
+        body = self.read_body()
+        session["size"] += len(body)
+        total = self.headers.get("Content-Range", "").rsplit("/", 1)[-1]
+        if total != "*" and session["size"] >= int(total):
+            self.objects[(session["bucket"], session["name"])] = session["size"]
+            self.send_json(200, {"bucket": session["bucket"], "name": session["name"], "size": str(session["size"])})
+            return
+        self.send_response(308)
+        self.send_header("Range", f"bytes=0-{session['size'] - 1}")
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_DELETE(self):
+        parts = urlparse(self.path).path.split("/")
+        self.objects.pop((parts[4], "/".join(parts[6:])), None)
+        self.send_response(204)
+        self.end_headers()
+
+
+def start_fake_gcs():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeGCSHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_address[1]}"
+
+#------------------------------------------------------------------------------------------------------
+def run_one(path, mode):
+    from clients import get_storage_client
+    from gcs_upload import AudioStager
+    from transcoder import transcode_audio, transcode_audio_to_sink
+
+    storage_client = get_storage_client()
+    local_bytes = 0
+    start = time.perf_counter()
+    if mode == "local_wav":
+        destination = tempfile.mktemp(suffix=".wav")
+        transcode_audio(path, destination)
+        local_bytes = os.path.getsize(destination)
+        blob = storage_client.bucket(BUCKET).blob(f"temp_audio_{uuid.uuid4()}.wav")
+        blob.upload_from_filename(destination)
+        os.remove(destination)
+        uploaded = local_bytes
+    else:
+        stager = AudioStager(bucket_name=BUCKET, storage_client=storage_client)
+        transcode_audio_to_sink(path, stager)
+        staged = stager.close()
+        uploaded = staged.size_bytes if staged.blob_name else 0
+    elapsed = time.perf_counter() - start
+    return {
+        "fixture": os.path.basename(path),
+        "mode": mode,
+        "elapsed_s": round(elapsed, 3),
+        "uploaded_bytes": uploaded,
+        "local_wav_bytes": local_bytes,
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local WAV + upload vs direct streaming GCS upload benchmark")
+    parser.add_argument("--minutes", type=float, nargs="+", default=[5, 30])
+    parser.add_argument("--formats", nargs="+", default=["wav"])
+    parser.add_argument("--emulator", help="GCS emulator URL; an in-process fake is used when omitted")
+    parser.add_argument("--run", nargs=2, metavar=("PATH", "MODE"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        print(json.dumps(run_one(*args.run)))
+        return
+
+    emulator = args.emulator or start_fake_gcs()
+    env = dict(os.environ, STORAGE_EMULATOR_HOST=emulator)
+    with tempfile.TemporaryDirectory() as workdir:
+        for minutes in args.minutes:
+            for audio_format in args.formats:
+                path = make_fixture(workdir, minutes, audio_format)
+                for mode in ("local_wav", "direct"):
+                    output = subprocess.run(
+                        [sys.executable, os.path.abspath(__file__), "--run", path, mode],
+                        capture_output=True, text=True, check=True, env=env,
+                    ).stdout
+                    result = json.loads(output.strip().splitlines()[-1])
+                    result["minutes"] = minutes
+                    print(json.dumps(result))
+
+
+if __name__ == "__main__":
+    main()
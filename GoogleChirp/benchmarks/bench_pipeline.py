@@ -0,0 +1,297 @@
+# Benchmark / load test: the full upload -> transcode -> recognize -> result path, offline.
+#
+# Synthetic tone fixtures (wav, and mp3/m4a/linear16 when ffmpeg is installed) of each length are uploaded
+# through the FastAPI app at each concurrency level. The Speech API is replaced by a fake client
+# with configurable latency (or, with --recognizer local, the service runs its own offline
+# recognizer with that latency), GCS by the in-process fake server of bench_gcs_upload, the Celery
+# broker and result backend by in-memory transports, and Redis by fakeredis when it is installed
+# (--redis local uses the configured Redis instead). Celery runs eagerly inside the request, or
+# as an in-process thread pool worker (--celery worker).
+#
+# Every (fixture, concurrency) run is its own subprocess so peak RSS is measured in isolation, and
+# prints one JSON line: throughput, per-stage latency percentiles and peak memory. Save the output
+# and pass it to --compare on a later run to print the change of every metric.
+# Usage: python benchmarks/bench_pipeline.py --minutes 0.5 5 --formats wav mp3 --concurrency 1 4 \
+#            --requests 8 --latency 0.2 --celery worker > run.jsonl
+#        python benchmarks/bench_pipeline.py ... --compare run.jsonl
+import io
+import os
+import sys
+import json
+import time
+import wave
+import shutil
+import argparse
+import datetime
+import resource
+import tempfile
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.join(BENCH_DIR, "..")
+sys.path.insert(0, APP_DIR)
+
+from bench_transcode import make_fixture
+from bench_gcs_upload import start_fake_gcs
+
+# Stages timed by wrapping the API or worker function doing the work
+STAGE_FUNCTIONS = {
+    "upload": ("api", "receive_uploads"),
+    "transcode_local": ("worker", "preprocess_audio_local"),
+    "transcode_direct": ("worker", "stage_audio_direct"),
+    "recognize_local": ("worker", "run_batch_recognize"),
+    "recognize_direct": ("worker", "run_staged_recognize"),
+}
+
+RESULT_POLL_SECS = 0.02
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    if not values:
+        return None
+    index = min(len(values) - 1, int(round(pct / 100.0 * (len(values) - 1))))
+    return values[index]
+
+
+def summarize(values):
+    return {
+        "count": len(values),
+        "p50_ms": round(percentile(values, 50) * 1000, 1) if values else None,
+        "p95_ms": round(percentile(values, 95) * 1000, 1) if values else None,
+        "p99_ms": round(percentile(values, 99) * 1000, 1) if values else None,
+        "max_ms": round(max(values) * 1000, 1) if values else None,
+    }
+
+#------------------------------------------------------------------------------------------------------
+# Fake Speech client: recognize() sleeps for a base latency plus a per-audio-second latency and
+# reports one word per second of audio
+class FakeSpeechClient:
+    def __init__(self, latency=0.2, latency_per_audio_sec=0.0):
+        self.latency = latency
+        self.latency_per_audio_sec = latency_per_audio_sec
+
+    def response_for(self, duration_secs):
+        from google.cloud import speech
+
+        words = [
+            speech.WordInfo(
+                word=f"word{second % 50}",
+                start_time=datetime.timedelta(seconds=second),
+                end_time=datetime.timedelta(seconds=second + 0.5),
+                confidence=0.9,
+            )
+            for second in range(int(duration_secs))
+        ]
+        alternative = speech.SpeechRecognitionAlternative(
+            transcript=" ".join(word.word for word in words), confidence=0.9, words=words,
+        )
+        return speech.RecognizeResponse(results=[speech.SpeechRecognitionResult(alternatives=[alternative])])
+
+    def recognize(self, config=None, audio=None):
+        with wave.open(io.BytesIO(audio.content), "rb") as wav:
+            duration_secs = wav.getnframes() / float(wav.getframerate())
+        time.sleep(self.latency + self.latency_per_audio_sec * duration_secs)
+        return self.response_for(duration_secs)
+
+    def long_running_recognize(self, config=None, audio=None):
+        raise NotImplementedError("The benchmark recognizes inline and in chunks only")
+
+#------------------------------------------------------------------------------------------------------
+# Function to replace redis-py's from_url with fakeredis sharing one in-memory server
+def use_fake_redis():
+    import redis
+    import redis.asyncio
+    import fakeredis
+    import fakeredis.aioredis
+
+    server = fakeredis.FakeServer()
+    redis.Redis.from_url = classmethod(lambda cls, url, **kwargs: fakeredis.FakeRedis(server=server))
+    redis.asyncio.Redis.from_url = classmethod(lambda cls, url, **kwargs: fakeredis.aioredis.FakeRedis(server=server))
+
+# Function to wrap the stage functions so each call's duration is recorded
+def instrument_stages(timings):
+    import inspect
+    import importlib
+
+    def wrap(stage, function):
+        if inspect.iscoroutinefunction(function):
+            async def timed(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return await function(*args, **kwargs)
+                finally:
+                    timings[stage].append(time.perf_counter() - start)
+        else:
+            def timed(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return function(*args, **kwargs)
+                finally:
+                    timings[stage].append(time.perf_counter() - start)
+        return timed
+
+    for stage, (module_name, name) in STAGE_FUNCTIONS.items():
+        module = importlib.import_module(module_name)
+        setattr(module, name, wrap(stage, getattr(module, name)))
+
+#------------------------------------------------------------------------------------------------------
+def run_one(path, minutes, concurrency, requests, celery_mode, latency, latency_per_audio_sec, redis_mode):
+    workdir = tempfile.mkdtemp()
+    os.makedirs(os.path.join(workdir, "static"))
+    os.makedirs(os.path.join(workdir, "uploads_audios"))
+    shutil.copytree(os.path.join(APP_DIR, "templates"), os.path.join(workdir, "templates"))
+    os.chdir(workdir)
+
+    if redis_mode == "fake":
+        use_fake_redis()
+
+    import api
+    import worker
+    import clients
+    from routing import queue_names
+    from fastapi.testclient import TestClient
+
+    # The in-memory broker polls its queues; the default 1 s interval would dominate short tasks
+    transport_options = dict(worker.celery_app.conf.broker_transport_options, polling_interval=0.01)
+    worker.celery_app.conf.update(broker_url="memory://", result_backend="cache+memory://",
+                                  broker_transport_options=transport_options)
+    if celery_mode == "eager":
+        worker.celery_app.conf.update(task_always_eager=True, task_store_eager_result=True)
+    clients.set_clients(speech_client=FakeSpeechClient(latency, latency_per_audio_sec))
+
+    timings = {stage: [] for stage in STAGE_FUNCTIONS}
+    timings["end_to_end"] = []
+    instrument_stages(timings)
+    errors = []
+    lock = threading.Lock()
+
+    def one(client, index):
+        start = time.perf_counter()
+        with open(path, "rb") as source:
+            response = client.post("/transcribe/", files={"file": (f"bench_{index}{os.path.splitext(path)[1]}", source)})
+        task_id = response.json().get("task_id")
+        while task_id:
+            payload = client.get(f"/result/{task_id}").json()
+            if payload["status"] != "pending":
+                break
+            time.sleep(RESULT_POLL_SECS)
+        else:
+            payload = {"status": "failure", "message": response.text}
+        with lock:
+            timings["end_to_end"].append(time.perf_counter() - start)
+            if payload["status"] != "success" or "error" in payload.get("result", {}):
+                errors.append(str(payload)[:200])
+
+    def drive():
+        with TestClient(api.fastapi_app) as client, ThreadPoolExecutor(max_workers=concurrency) as pool:
+            start = time.perf_counter()
+            list(pool.map(lambda index: one(client, index), range(requests)))
+            return time.perf_counter() - start
+
+    if celery_mode == "worker":
+        from celery.contrib.testing.worker import start_worker
+        with start_worker(worker.celery_app, pool="threads", concurrency=concurrency, perform_ping_check=False,
+                          queues=queue_names(), loglevel="WARNING"):
+            elapsed = drive()
+    else:
+        elapsed = drive()
+
+    shutil.rmtree(workdir, ignore_errors=True)
+    return {
+        "fixture": os.path.basename(path),
+        "minutes": minutes,
+        "celery": celery_mode,
+        "concurrency": concurrency,
+        "requests": requests,
+        "recognizer": os.environ.get("RECOGNIZER_BACKEND", "google"),
+        "latency_s": latency,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(requests / elapsed, 3),
+        "audio_secs_per_sec": round(requests * minutes * 60 / elapsed, 1),
+        "errors": len(errors),
+        "first_error": errors[0] if errors else None,
+        "stages": {stage: summarize(values) for stage, values in timings.items() if values},
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0, 1),
+    }
+
+#------------------------------------------------------------------------------------------------------
+# Function to print the change of each metric against a previous run's output
+def compare(baseline_path, results):
+    baseline = {}
+    with open(baseline_path) as f:
+        for line in f:
+            if line.strip():
+                entry = json.loads(line)
+                baseline[(entry["fixture"], entry["celery"], entry["concurrency"])] = entry
+
+    for result in results:
+        before = baseline.get((result["fixture"], result["celery"], result["concurrency"]))
+        if before is None:
+            continue
+        changes = {"throughput_rps": ratio(before["throughput_rps"], result["throughput_rps"]),
+                   "peak_rss_mb": ratio(before["peak_rss_mb"], result["peak_rss_mb"])}
+        for stage, summary in result["stages"].items():
+            if stage in before["stages"]:
+                changes[f"{stage}_p95_ms"] = ratio(before["stages"][stage]["p95_ms"], summary["p95_ms"])
+        print(json.dumps({"compare": result["fixture"], "celery": result["celery"],
+                          "concurrency": result["concurrency"], "ratio_vs_baseline": changes}))
+
+def ratio(before, after):
+    if not before or after is None:
+        return None
+    return round(after / before, 3)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end upload/transcode/recognize/result benchmark")
+    parser.add_argument("--minutes", type=float, nargs="+", default=[0.5, 5])
+    parser.add_argument("--formats", nargs="+", default=["wav", "mp3", "m4a", "linear16"])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4])
+    parser.add_argument("--requests", type=int, default=8, help="uploads per run")
+    parser.add_argument("--latency", type=float, default=0.2, help="fake Speech API latency per request (s)")
+    parser.add_argument("--latency-per-audio-sec", type=float, default=0.0)
+    parser.add_argument("--celery", choices=["eager", "worker"], default="worker")
+    parser.add_argument("--redis", choices=["fake", "local"], default="fake")
+    parser.add_argument("--recognizer", choices=["fake", "local"], default="fake",
+                        help="fake Speech API client, or the service's local recognizer (RECOGNIZER_BACKEND=local)")
+    parser.add_argument("--compare", help="JSON lines of an earlier run to compare against")
+    parser.add_argument("--run", nargs=3, metavar=("PATH", "MINUTES", "CONCURRENCY"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        result = run_one(args.run[0], float(args.run[1]), int(args.run[2]), args.requests, args.celery, args.latency,
+                         args.latency_per_audio_sec, args.redis)
+        print(json.dumps(result))
+        return
+
+    formats = args.formats if shutil.which("ffmpeg") else ["wav"]
+    env = dict(os.environ, STORAGE_EMULATOR_HOST=start_fake_gcs(), RESULT_CACHE_BACKEND="off")
+    if args.recognizer == "local":
+        env.update(RECOGNIZER_BACKEND="local", LOCAL_RECOGNIZER_LATENCY_SECS=str(args.latency),
+                   LOCAL_RECOGNIZER_SECS_PER_AUDIO_SEC=str(args.latency_per_audio_sec))
+    passthrough = ["--requests", str(args.requests), "--latency", str(args.latency),
+                   "--latency-per-audio-sec", str(args.latency_per_audio_sec),
+                   "--celery", args.celery, "--redis", args.redis]
+    results = []
+    with tempfile.TemporaryDirectory() as fixtures:
+        for minutes in args.minutes:
+            for audio_format in formats:
+                path = make_fixture(fixtures, minutes, audio_format)
+                for concurrency in args.concurrency:
+                    output = subprocess.run(
+                        [sys.executable, os.path.abspath(__file__), "--run", path, str(minutes), str(concurrency)] + passthrough,
+                        capture_output=True, text=True, check=True, env=env,
+                    ).stdout
+                    result = json.loads(output.strip().splitlines()[-1])
+                    results.append(result)
+                    print(json.dumps(result), flush=True)
+
+    if args.compare:
+        compare(args.compare, results)
+
+
+if __name__ == "__main__":
+    main()
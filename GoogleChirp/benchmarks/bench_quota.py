@@ -0,0 +1,207 @@
+# Benchmark / fault injection: a burst of transcriptions against a fake Speech API that enforces a
+# request quota and injects errors, with and without the shared rate limiter and task retries (quota.py).
+#
+# The fake answers at most --quota requests per minute (a token bucket of --quota-burst requests)
+# and fails the rest with ResourceExhausted. On top of that a --transient-rate share of requests fails
+# with ServiceUnavailable and a --permanent-rate share with InvalidArgument. Each mode runs in its
+# own subprocess, with an in-process thread pool Celery worker:
+#   baseline  no rate limiter and no retries: every quota or transient error fails the upload
+#   limited   rate limiter at --headroom of the quota, and retries with jittered exponential backoff
+# and prints one JSON line: outcomes, Speech API calls by result, task retries, throughput against
+# the quota, and files left behind (a retry must keep the upload, a finished task must remove it).
+# The rate limiter's token bucket is a Lua script, so this needs the configured Redis server.
+# Usage: python benchmarks/bench_quota.py --requests 60 --quota 120 --concurrency 8 --transient-rate 0.05
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import threading
+import subprocess
+import collections
+from concurrent.futures import ThreadPoolExecutor
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.join(BENCH_DIR, "..")
+sys.path.insert(0, APP_DIR)
+
+from bench_transcode import make_fixture
+from bench_gcs_upload import start_fake_gcs
+from bench_pipeline import FakeSpeechClient, summarize
+
+RESULT_POLL_SECS = 0.05
+RESULT_TIMEOUT_SECS = 600
+
+
+#------------------------------------------------------------------------------------------------------
+# Fake Speech API with a per-minute request quota and injected transient and permanent errors
+class FaultySpeechClient(FakeSpeechClient):
+    def __init__(self, latency, quota_per_min, quota_burst, transient_rate, permanent_rate, seed=0):
+        super().__init__(latency)
+        self.rate = quota_per_min / 60.0
+        self.capacity = self.tokens = float(quota_burst)
+        self.updated = time.monotonic()
+        self.transient_rate = transient_rate
+        self.permanent_rate = permanent_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.calls = collections.Counter()
+
+    # Function to admit one request, raising the error the real API would send
+    def admit(self):
+        from google.api_core import exceptions
+
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens < 1:
+                self.calls["quota_exceeded"] += 1
+                raise exceptions.ResourceExhausted("Quota exceeded for quota metric 'Requests' of service speech.googleapis.com")
+            self.tokens -= 1
+            roll = self.random.random()
+            if roll < self.permanent_rate:
+                self.calls["invalid_argument"] += 1
+                raise exceptions.InvalidArgument("Invalid recognition config")
+            if roll < self.permanent_rate + self.transient_rate:
+                self.calls["unavailable"] += 1
+                raise exceptions.ServiceUnavailable("The service is currently unavailable")
+            self.calls["ok"] += 1
+
+    def recognize(self, config=None, audio=None):
+        self.admit()
+        return super().recognize(config, audio)
+
+def count_files(path):
+    return sum(len(files) for _, _, files in os.walk(path)) if os.path.isdir(path) else 0
+
+#------------------------------------------------------------------------------------------------------
+def run_one(mode, path, args):
+    workdir = tempfile.mkdtemp()
+    os.makedirs(os.path.join(workdir, "static"))
+    os.makedirs(os.path.join(workdir, "uploads_audios"))
+    shutil.copytree(os.path.join(APP_DIR, "templates"), os.path.join(workdir, "templates"))
+    os.chdir(workdir)
+
+    import api
+    import quota
+    import worker
+    import clients
+    from routing import queue_names
+    from celery.signals import task_retry
+    from fastapi.testclient import TestClient
+
+    transport_options = dict(worker.celery_app.conf.broker_transport_options, polling_interval=0.01)
+    worker.celery_app.conf.update(broker_url="memory://", result_backend="cache+memory://",
+                                  broker_transport_options=transport_options)
+    speech = FaultySpeechClient(args.latency, args.quota, args.quota_burst, args.transient_rate,
+                                args.permanent_rate, args.seed)
+    clients.set_clients(speech_client=speech)
+    quota.get_quota_client().delete(quota.QUOTA_KEY)
+
+    retries = []
+    task_retry.connect(lambda **kwargs: retries.append(1), weak=False)
+    outcomes = collections.Counter()
+    latencies = []
+    lock = threading.Lock()
+
+    def one(client, index):
+        start = time.perf_counter()
+        with open(path, "rb") as source:
+            response = client.post("/transcribe/", files={"file": (f"bench_{index}.wav", source)})
+        task_id = response.json().get("task_id")
+        deadline = time.time() + RESULT_TIMEOUT_SECS
+        payload = {"status": "failure", "message": response.text}
+        while task_id and time.time() < deadline:
+            payload = client.get(f"/result/{task_id}").json()
+            if payload["status"] != "pending":
+                break
+            time.sleep(RESULT_POLL_SECS)
+
+        error = payload.get("result", {}).get("error") if payload["status"] == "success" else str(payload)
+        if error is None:
+            outcome = "succeeded"
+        elif "400 " in error:
+            outcome = "failed_permanent"
+        else:
+            outcome = "failed_transient"
+        with lock:
+            outcomes[outcome] += 1
+            latencies.append(time.perf_counter() - start)
+
+    from celery.contrib.testing.worker import start_worker
+    with start_worker(worker.celery_app, pool="threads", concurrency=args.concurrency, perform_ping_check=False,
+                      queues=queue_names(), loglevel="WARNING"):
+        with TestClient(api.fastapi_app) as client, ThreadPoolExecutor(max_workers=args.requests) as pool:
+            start = time.perf_counter()
+            list(pool.map(lambda index: one(client, index), range(args.requests)))
+            elapsed = time.perf_counter() - start
+
+    leftover = count_files("uploads_audios") + count_files("scratch")
+    shutil.rmtree(workdir, ignore_errors=True)
+    quota_rps = args.quota / 60.0
+    return {
+        "mode": mode,
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "quota_per_min": args.quota,
+        "limiter_per_min": quota.SPEECH_REQUESTS_PER_MIN,
+        "max_retries": quota.SPEECH_MAX_RETRIES,
+        "elapsed_s": round(elapsed, 2),
+        "outcomes": dict(outcomes),
+        "speech_calls": dict(speech.calls),
+        "task_retries": len(retries),
+        "succeeded_per_min": round(outcomes["succeeded"] / elapsed * 60, 1),
+        "quota_utilization": round(speech.calls["ok"] / elapsed / quota_rps, 3),
+        "end_to_end": summarize(latencies),
+        "leftover_files": leftover,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Speech API quota, retry and rate limiter benchmark")
+    parser.add_argument("--modes", nargs="+", choices=["baseline", "limited"], default=["baseline", "limited"])
+    parser.add_argument("--requests", type=int, default=60, help="uploads sent in one burst")
+    parser.add_argument("--seconds", type=float, default=5, help="length of each upload")
+    parser.add_argument("--concurrency", type=int, default=8, help="worker threads")
+    parser.add_argument("--latency", type=float, default=0.1, help="fake Speech API latency per request (s)")
+    parser.add_argument("--quota", type=float, default=120, help="fake Speech API requests per minute")
+    parser.add_argument("--quota-burst", type=float, default=5)
+    parser.add_argument("--headroom", type=float, default=0.95, help="limiter rate as a share of the quota")
+    parser.add_argument("--transient-rate", type=float, default=0.05)
+    parser.add_argument("--permanent-rate", type=float, default=0.02)
+    parser.add_argument("--max-retries", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--run", nargs=2, metavar=("MODE", "PATH"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        print(json.dumps(run_one(args.run[0], args.run[1], args)))
+        return
+
+    passthrough = []
+    for name in ("requests", "concurrency", "latency", "quota", "quota_burst", "transient_rate", "permanent_rate", "seed"):
+        passthrough += ["--" + name.replace("_", "-"), str(getattr(args, name))]
+    base_env = dict(os.environ, STORAGE_EMULATOR_HOST=start_fake_gcs(), RESULT_CACHE_BACKEND="off",
+                    SPEECH_REQUESTS_BURST=str(args.quota_burst), SPEECH_RETRY_BASE_SECS="0.5",
+                    SPEECH_RETRY_MAX_SECS="10")
+    modes = {
+        "baseline": {"SPEECH_REQUESTS_PER_MIN": "0", "SPEECH_MAX_RETRIES": "0"},
+        "limited": {"SPEECH_REQUESTS_PER_MIN": str(args.quota * args.headroom),
+                    "SPEECH_MAX_RETRIES": str(args.max_retries)},
+    }
+    with tempfile.TemporaryDirectory() as fixtures:
+        path = make_fixture(fixtures, args.seconds / 60.0, "wav")
+        for mode in args.modes:
+            output = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "--run", mode, path] + passthrough,
+                capture_output=True, text=True, check=True, env=dict(base_env, **modes[mode]),
+            ).stdout
+            print(output.strip().splitlines()[-1], flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+# Benchmark: stored size of a word level transcription, one dict per word vs the columnar word table,
+# as JSON, zlib compressed JSON (the default result serializer) and msgpack when it is installed.
+#
+# The transcript is synthetic: words drawn from a Zipf-like vocabulary at about 2.5 words per second.
+# Usage: python benchmarks/bench_result_size.py --minutes 1 10 60
+import os
+import sys
+import json
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from word_table import build_word_table, zjson_dumps
+
+WORDS_PER_SEC = 2.5
+SEGMENT_WORDS = 40
+VOCABULARY_SIZE = 5000
+
+
+def make_words(minutes, seed=7):
+    rng = random.Random(seed)
+    vocabulary = [f"word{index}" for index in range(VOCABULARY_SIZE)]
+    weights = [1.0 / (rank + 1) for rank in range(VOCABULARY_SIZE)]
+    words, t = [], 0.0
+    for text in rng.choices(vocabulary, weights, k=int(minutes * 60 * WORDS_PER_SEC)):
+        length = rng.uniform(0.15, 0.5)
+        words.append({"word": text, "start": round(t, 3), "end": round(t + length, 3), "confidence": rng.uniform(0.6, 1.0)})
+        t += length + rng.uniform(0.0, 0.3)
+    return [words[i:i + SEGMENT_WORDS] for i in range(0, len(words), SEGMENT_WORDS)]
+
+
+def entries_for(segments):
+    return [
+        {"start_time": f"{words[0]['start']}s", "end_time": f"{words[-1]['end']}s", "language_code": "english",
+         "confidence": 0.9, "transcript": " ".join(word["word"] for word in words)}
+        for words in segments
+    ]
+
+
+def encoders():
+    found = {"json": lambda value: json.dumps(value).encode("utf-8"), "zjson": zjson_dumps}
+    try:
+        import msgpack
+        found["msgpack"] = msgpack.packb
+    except ImportError:
+        pass
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Word level result size benchmark")
+    parser.add_argument("--minutes", type=float, nargs="+", default=[1, 10, 60])
+    args = parser.parse_args()
+
+    for minutes in args.minutes:
+        segments = make_words(minutes)
+        layouts = {
+            "segments_only": {"transcription": entries_for(segments)},
+            "word_dicts": {"transcription": [dict(entry, words=words) for entry, words in zip(entries_for(segments), segments)]},
+            "word_table": {"transcription": entries_for(segments), "words": build_word_table(segments)},
+        }
+        for layout, value in layouts.items():
+            for name, encode in encoders().items():
+                start = time.perf_counter()
+                payload = encode(value)
+                print(json.dumps({
+                    "minutes": minutes,
+                    "words": sum(len(words) for words in segments),
+                    "layout": layout,
+                    "serializer": name,
+                    "bytes": len(payload),
+                    "encode_ms": round((time.perf_counter() - start) * 1000, 2),
+                }))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+# Benchmark: cold start of each entry module, the lean API (api), the worker (worker) and the
+# combined app (app), to track what the API process pays at every start, reload and new pod.
+#
+# Every sample imports one module in a fresh interpreter and reports the import time, the resident
+# memory after the import (RSS, and the increase over an empty interpreter) and whether the heavy
+# stacks (Google SDKs, gRPC, protobuf, pydub) were loaded. One JSON line per module, with the
+# median of --repeat samples.
+# Usage: python benchmarks/bench_startup.py --modules api worker app --repeat 5
+import os
+import sys
+import json
+import shutil
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.join(BENCH_DIR, "..")
+
+HEAVY_PREFIXES = ("google.cloud.speech", "google.cloud.storage", "grpc", "google.protobuf", "pydub")
+
+# Runs in the child interpreter: import one module and report its cost
+PROBE = """
+import os, sys, json, time, resource, importlib, warnings
+warnings.filterwarnings("ignore")
+def rss_mb():
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1048576.0
+before = rss_mb()
+start = time.perf_counter()
+if sys.argv[1] != "-":
+    importlib.import_module(sys.argv[1])
+elapsed = time.perf_counter() - start
+print(json.dumps({
+    "import_ms": elapsed * 1000,
+    "rss_mb": rss_mb(),
+    "rss_delta_mb": rss_mb() - before,
+    "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0,
+    "modules": len(sys.modules),
+    "heavy": sorted({name for name in sys.modules if name.startswith(%r)}),
+}))
+""" % (HEAVY_PREFIXES,)
+
+
+# Function to name the stack a module belongs to: google.cloud.<api>, google.protobuf, grpc, pydub
+def stack_name(module):
+    parts = module.split(".")
+    if parts[0] != "google":
+        return parts[0]
+    return ".".join(parts[:3] if parts[1] == "cloud" else parts[:2])
+
+
+def sample(module, workdir):
+    env = dict(os.environ, PYTHONPATH=os.path.abspath(APP_DIR))
+    output = subprocess.run([sys.executable, "-c", PROBE, module], cwd=workdir, env=env,
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import time and memory of the API and worker modules")
+    parser.add_argument("--modules", nargs="+", default=["api", "worker", "app"])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    # The API mounts static/ and templates/ at import, so each child runs from a prepared directory
+    workdir = tempfile.mkdtemp()
+    os.makedirs(os.path.join(workdir, "static"))
+    shutil.copytree(os.path.join(APP_DIR, "templates"), os.path.join(workdir, "templates"))
+    try:
+        # Warm the bytecode cache, so every module is measured the way a restarted process sees it
+        for module in args.modules:
+            sample(module, workdir)
+
+        for module in ["-"] + args.modules:
+            samples = [sample(module, workdir) for _ in range(args.repeat)]
+            print(json.dumps({
+                "module": module if module != "-" else "(interpreter)",
+                "import_ms_median": round(statistics.median(s["import_ms"] for s in samples), 1),
+                "import_ms_min": round(min(s["import_ms"] for s in samples), 1),
+                "rss_mb": round(statistics.median(s["rss_mb"] for s in samples), 1),
+                "rss_delta_mb": round(statistics.median(s["rss_delta_mb"] for s in samples), 1),
+                "peak_rss_mb": round(statistics.median(s["peak_rss_mb"] for s in samples), 1),
+                "modules_loaded": samples[0]["modules"],
+                "heavy_stacks": sorted({stack_name(name) for name in samples[0]["heavy"]}),
+            }))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+# Benchmark: pydub full in-memory decode vs the streaming sox/ffmpeg pipe transcoder.
+#
+# Tone fixtures are generated as 44.1 kHz stereo WAV, and as mp3/m4a when ffmpeg is installed.
+# Each (fixture, backend) pair runs in its own subprocess so peak RSS is measured in isolation.
+# Usage: python benchmarks/bench_transcode.py --minutes 10 60 --formats wav mp3 m4a
+import os
+import sys
+import json
+import math
+import time
+import wave
+import array
+import shutil
+import argparse
+import resource
+import tempfile
+import subprocess
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from transcoder import select_backends, transcode_audio
+
+SOURCE_RATE = 44100
+
+
+def make_tone_wav(path, minutes):
+    # One second of a stereo 440/660 Hz tone, repeated
+    second = array.array("h")
+    for n in range(SOURCE_RATE):
+        second.append(int(6000 * math.sin(2 * math.pi * 440 * n / SOURCE_RATE)))
+        second.append(int(6000 * math.sin(2 * math.pi * 660 * n / SOURCE_RATE)))
+    block = second.tobytes()
+    with wave.open(path, "wb") as wav:
+        wav.setnchannels(2)
+        wav.setsampwidth(2)
+        wav.setframerate(SOURCE_RATE)
+        for _ in range(int(minutes * 60)):
+            wav.writeframes(block)
+
+
+def make_fixture(workdir, minutes, audio_format):
+    wav_path = os.path.join(workdir, f"tone_{minutes}m.wav")
+    if not os.path.exists(wav_path):
+        make_tone_wav(wav_path, minutes)
+    if audio_format == "wav":
+        return wav_path
+    # "linear16": a WAV already in the recognition format (16 kHz mono LINEAR16)
+    if audio_format == "linear16":
+        path = os.path.join(workdir, f"tone_{minutes}m_linear16.wav")
+        subprocess.run(["ffmpeg", "-nostdin", "-v", "error", "-y", "-i", wav_path, "-ac", "1", "-ar", "16000", path], check=True)
+        return path
+    path = os.path.join(workdir, f"tone_{minutes}m.{audio_format}")
+    subprocess.run(["ffmpeg", "-nostdin", "-v", "error", "-y", "-i", wav_path, path], check=True)
+    return path
+
+
+def run_one(path, backend, minutes):
+    destination = path + f".{backend}.out.wav"
+    backends = ["pydub"] if backend == "pydub" else [b for b in select_backends(path) if b != "pydub"]
+    start = time.perf_counter()
+    used = transcode_audio(path, destination, backends=backends)
+    elapsed = time.perf_counter() - start
+    os.remove(destination)
+    return {
+        "fixture": os.path.basename(path),
+        "backend": used if backend != "pydub" else "pydub",
+        "audio_minutes": minutes,
+        "elapsed_s": round(elapsed, 3),
+        "audio_secs_per_sec": round(minutes * 60 / elapsed, 1),
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Transcoder benchmark")
+    parser.add_argument("--minutes", type=float, nargs="+", default=[10, 60])
+    parser.add_argument("--formats", nargs="+", default=["wav", "mp3", "m4a"])
+    parser.add_argument("--backends", nargs="+", default=["pydub", "stream"])
+    parser.add_argument("--run")
+    args = parser.parse_args()
+
+    if args.run:
+        # Child process: transcode one fixture with one backend and print one JSON line
+        path, backend = args.run.rsplit(":", 1)
+        # Keep the transcoder's own progress output off stdout
+        sys.stdout = sys.stderr
+        result = run_one(path, backend, args.minutes[0])
+        sys.stdout = sys.__stdout__
+        print(json.dumps(result))
+        return
+
+    formats = args.formats
+    if not shutil.which("ffmpeg"):
+        formats = [f for f in formats if f == "wav"]
+
+    with tempfile.TemporaryDirectory() as workdir:
+        for minutes in args.minutes:
+            for audio_format in formats:
+                path = make_fixture(workdir, minutes, audio_format)
+                for backend in args.backends:
+                    subprocess.run([
+                        sys.executable, os.path.abspath(__file__),
+                        "--run", f"{path}:{backend}",
+                        "--minutes", str(minutes),
+                    ], check=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+# Benchmark: translating a transcript with repeated sentences through translation.py, against the
+# local translator with a simulated per-call latency standing in for the Cloud Translation API.
+#
+# A synthetic Georgian transcript of --sentences sentences is built, --repeat-share of them repeats
+# of earlier ones (greetings, "yes", "thank you", ...). Three modes, one JSON line each:
+#   per_segment   one backend call per sentence and no cache (the UI's old one-request-per-segment path)
+#   batched_cold  translate_text with an empty cache: repeats translated once, the rest batched
+#   batched_warm  the same text again, answered from the cache
+# Every line reports backend calls, sentences sent to the backend, elapsed time and whether the
+# translation matches the per_segment one. Runs offline (fakeredis is used when installed,
+# --redis local otherwise).
+# Usage: python benchmarks/bench_translation.py --sentences 200 --repeat-share 0.3 --latency 0.1
+import os
+import sys
+import json
+import time
+import random
+import argparse
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, ".."))
+
+from bench_pipeline import use_fake_redis
+
+
+# Local translator counting its calls and the sentences sent
+def counting_translator(latency):
+    from translation import LocalTranslator
+
+    class CountingTranslator(LocalTranslator):
+        def __init__(self):
+            super().__init__(latency)
+            self.calls = 0
+            self.sent = 0
+
+        def translate_batch(self, texts, source_language, target_language):
+            self.calls += 1
+            self.sent += len(texts)
+            return super().translate_batch(texts, source_language, target_language)
+
+    return CountingTranslator()
+
+# Function to build a transcript of sentences from the local dictionary, a share of them repeats
+def make_transcript(sentences, repeat_share, seed):
+    from translation import LOCAL_DICTIONARY
+
+    rng = random.Random(seed)
+    words = sorted(LOCAL_DICTIONARY[("ka", "en")])
+    transcript = []
+    for _ in range(sentences):
+        if transcript and rng.random() < repeat_share:
+            transcript.append(rng.choice(transcript))
+        else:
+            transcript.append(" ".join(rng.choice(words) for _ in range(rng.randint(3, 12))).capitalize() + ".")
+    return transcript
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-segment vs batched and cached transcript translation")
+    parser.add_argument("--sentences", type=int, default=200)
+    parser.add_argument("--repeat-share", type=float, default=0.3, help="share of sentences repeating an earlier one")
+    parser.add_argument("--latency", type=float, default=0.1, help="local translator latency per call (s)")
+    parser.add_argument("--redis", choices=["fake", "local"], default="fake")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.redis == "fake":
+        use_fake_redis()
+    import translation
+
+    sentences = make_transcript(args.sentences, args.repeat_share, args.seed)
+    text = " ".join(sentences)
+    # Start from an empty cache, also when run against a local Redis
+    client = translation.get_translation_client()
+    for key in client.scan_iter(match=f"{translation.TRANSLATION_PREFIX}local:*"):
+        client.delete(key)
+
+    reference = None
+    for mode in ("per_segment", "batched_cold", "batched_warm"):
+        translator = counting_translator(args.latency)
+        start = time.perf_counter()
+        if mode == "per_segment":
+            result = " ".join(translator.translate_batch([sentence], "ka", "en")[0] for sentence in sentences)
+        else:
+            result, _ = translation.translate_text(text, "ka", "en", translator)
+        elapsed = time.perf_counter() - start
+        reference = reference or result
+        print(json.dumps({
+            "mode": mode,
+            "sentences": len(sentences),
+            "unique": len(set(sentences)),
+            "latency_s": args.latency,
+            "backend_calls": translator.calls,
+            "sentences_sent": translator.sent,
+            "elapsed_s": round(elapsed, 3),
+            "matches_per_segment": result == reference,
+        }), flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+# Benchmark: multipart uploads over HTTP into a real uvicorn server, received the old way (Starlette
+# parses the form into a spooled temporary file, then it is copied into the upload directory) vs
+# uploads.receive_uploads (the body is parsed as it arrives and each file written once, straight
+# to its destination).
+#
+# Each mode runs its own server subprocess; --concurrency clients upload a --size-mb file at the
+# same time with a streaming HTTP client. One JSON line per mode: latency percentiles, and from the
+# server process its peak RSS, the bytes it wrote (wchar, counting the spooled copy) and the p99
+# lag of its event loop (a proxy for other requests stalling).
+# Usage: python benchmarks/bench_upload.py --size-mb 500 --concurrency 4
+import os
+import sys
+import json
+import time
+import socket
+import contextlib
+import shutil
+import asyncio
+import argparse
+import resource
+import tempfile
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, APP_DIR)
+
+SERVER_START_TIMEOUT_SECS = 30
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    if not values:
+        return 0.0
+    index = min(len(values) - 1, int(round(pct / 100.0 * (len(values) - 1))))
+    return values[index]
+
+
+def make_fixture(path, size_mb):
+    block = os.urandom(1024 * 1024)
+    with open(path, "wb") as f:
+        for _ in range(size_mb):
+            f.write(block)
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+# Function to read the bytes this process passed to write(), files and sockets alike
+def written_bytes():
+    with open("/proc/self/io") as f:
+        return int(dict(line.split(": ") for line in f.read().splitlines())["wchar"])
+
+#------------------------------------------------------------------------------------------------------
+# Server side: one upload route per mode, plus the process stats
+def build_app(workdir):
+    from fastapi import FastAPI, File, Request, UploadFile
+    from starlette.concurrency import run_in_threadpool
+
+    from uploads import copy_stream_to_disk, receive_uploads
+
+    lags = []
+
+    # Event loop lag, sampled for as long as the server runs
+    @contextlib.asynccontextmanager
+    async def lifespan(app, interval=0.01):
+        async def measure():
+            loop = asyncio.get_running_loop()
+            while True:
+                expected = loop.time() + interval
+                await asyncio.sleep(interval)
+                lags.append(max(0.0, loop.time() - expected))
+        task = asyncio.create_task(measure())
+        yield
+        task.cancel()
+
+    app = FastAPI(lifespan=lifespan)
+    counter = [0]
+
+    def destination(filename):
+        counter[0] += 1
+        return os.path.join(workdir, f"{counter[0]}_{filename}")
+
+    # The receiving path of the transcription endpoints before receive_uploads
+    @app.post("/spooled")
+    async def spooled(file: UploadFile = File(...)):
+        await file.seek(0)
+        upload = await run_in_threadpool(copy_stream_to_disk, file.file, destination(file.filename), 0)
+        return {"size_bytes": upload["size_bytes"]}
+
+    @app.post("/streaming")
+    async def streaming(request: Request):
+        _, uploads = await receive_uploads(request, destination, max_bytes=0)
+        return {"size_bytes": uploads[0]["size_bytes"]}
+
+    @app.get("/stats")
+    async def stats():
+        return {
+            "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0,
+            "written_mb": written_bytes() / 1048576.0,
+            "p99_loop_lag_ms": percentile(lags, 99) * 1000,
+        }
+
+    return app
+
+
+def serve(port, workdir):
+    import uvicorn
+    uvicorn.run(build_app(workdir), host="127.0.0.1", port=port, log_level="warning")
+
+#------------------------------------------------------------------------------------------------------
+# Client side
+def run_mode(mode, fixture, concurrency, size_mb):
+    import httpx
+
+    port = free_port()
+    workdir = tempfile.mkdtemp()
+    server = subprocess.Popen([sys.executable, os.path.abspath(__file__), "--serve", str(port), workdir])
+    base = f"http://127.0.0.1:{port}"
+    try:
+        deadline = time.time() + SERVER_START_TIMEOUT_SECS
+        while True:
+            try:
+                baseline = httpx.get(base + "/stats").json()
+                break
+            except httpx.TransportError:
+                if time.time() > deadline:
+                    raise
+                time.sleep(0.1)
+
+        def one(index):
+            start = time.perf_counter()
+            with open(fixture, "rb") as source:
+                response = httpx.post(f"{base}/{mode}", files={"file": (f"bench_{index}.wav", source)}, timeout=None)
+            response.raise_for_status()
+            return time.perf_counter() - start
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            latencies = list(pool.map(one, range(concurrency)))
+        elapsed = time.perf_counter() - start
+        stats = httpx.get(base + "/stats").json()
+    finally:
+        server.terminate()
+        server.wait()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    return {
+        "mode": mode,
+        "size_mb": size_mb,
+        "concurrency": concurrency,
+        "elapsed_s": round(elapsed, 3),
+        "p50_latency_s": round(percentile(latencies, 50), 3),
+        "p99_latency_s": round(percentile(latencies, 99), 3),
+        "p99_loop_lag_ms": round(stats["p99_loop_lag_ms"], 2),
+        "server_peak_rss_mb": round(stats["peak_rss_mb"], 1),
+        "server_written_mb": round(stats["written_mb"] - baseline["written_mb"], 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Multipart upload receiving benchmark")
+    parser.add_argument("--size-mb", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--modes", nargs="+", choices=["spooled", "streaming"], default=["spooled", "streaming"])
+    parser.add_argument("--serve", nargs=2, metavar=("PORT", "WORKDIR"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(int(args.serve[0]), args.serve[1])
+        return
+
+    with tempfile.TemporaryDirectory() as fixtures:
+        fixture = os.path.join(fixtures, "fixture.bin")
+        make_fixture(fixture, args.size_mb)
+        for mode in args.modes:
+            print(json.dumps(run_mode(mode, fixture, args.concurrency, args.size_mb)), flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+import os
+
+from celery import Celery
+
+from routing import celery_routing_config
+from word_table import celery_result_config
+from operations import OPERATIONS_POLL_INTERVAL_SECS
+from scratch import SCRATCH_SWEEP_INTERVAL_SECS
+
+
+# Task names. They are kept from when the API and the tasks shared app.py, so tasks queued by an
+# older release and the beat schedule keep working.
+TRANSCRIPTION_TASK = "app.process_transcription"
+BATCH_ITEM_TASK = "app.process_batch_item"
+POLL_OPERATIONS_TASK = "app.poll_pending_operations"
+SWEEP_SCRATCH_TASK = "app.sweep_scratch"
+TRANSLATION_TASK = "app.translate_transcription"
+REAP_BATCHES_TASK = "app.reap_batch_items"
+
+# Seconds between checks for batch items whose task died without finishing them (hard time limit,
+# killed worker), which would otherwise hold their batch's slot forever
+BATCH_REAP_INTERVAL_SECS = int(os.environ.get("BATCH_REAP_INTERVAL_SECS", 60))
+
+# Celery setup
+celery_app = Celery("tasks", broker="redis://localhost:6379/0", backend="redis://localhost:6379/1", broker_connection_retry_on_startup=True)
+# Separate interactive/long/bulk queues per language, with priorities inside each queue
+celery_app.conf.update(celery_routing_config())
+# Results are stored compressed (RESULT_SERIALIZER)
+celery_app.conf.update(celery_result_config())
+# Pending long running operations are checked by one periodic task (run celery beat)
+celery_app.conf.beat_schedule = {
+    "poll-pending-operations": {
+        "task": POLL_OPERATIONS_TASK,
+        "schedule": OPERATIONS_POLL_INTERVAL_SECS,
+        "options": {"expires": OPERATIONS_POLL_INTERVAL_SECS},
+    },
+    "reap-batch-items": {
+        "task": REAP_BATCHES_TASK,
+        "schedule": BATCH_REAP_INTERVAL_SECS,
+        "options": {"expires": BATCH_REAP_INTERVAL_SECS},
+    },
+    "sweep-scratch": {
+        "task": SWEEP_SCRATCH_TASK,
+        "schedule": SCRATCH_SWEEP_INTERVAL_SECS,
+        "options": {"expires": SCRATCH_SWEEP_INTERVAL_SECS},
+    },
+}
+
+#------------------------------------------------------------------------------------------------------
+# Function to queue a task by name, so the API never imports the worker module and its Google SDK
+# stack. Where the task is registered (in the worker, or with both modules loaded) it goes through
+# the task object, which also honours task_always_eager.
+def send_task(name, args=(), **options):
+    return celery_app.signature(name).apply_async(args=args, **options)
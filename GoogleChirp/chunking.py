@@ -0,0 +1,223 @@
+import io
+import os
+import wave
+import audioop
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import current_labels, labels_from, stage_timer
+from quota import is_retryable, retry_delay
+from word_table import transcription_with_words
+
+
+# Target length of each recognition chunk, kept under the one minute inline limit (seconds)
+CHUNK_SECS = float(os.environ.get("CHUNK_SECS", 50))
+
+# Audio shared by neighbouring chunks so words cut at a boundary are heard in full (seconds)
+CHUNK_OVERLAP_SECS = float(os.environ.get("CHUNK_OVERLAP_SECS", 2))
+
+# How far back from the target length to look for the quietest cut point (seconds)
+CHUNK_SEARCH_SECS = float(os.environ.get("CHUNK_SEARCH_SECS", 8))
+
+# Frame length used for the energy based silence detection (milliseconds)
+SILENCE_FRAME_MS = 30
+
+# Number of chunks recognized concurrently per file
+RECOGNITION_WORKERS = int(os.environ.get("RECOGNITION_WORKERS", 8))
+
+# Retries of a chunk that failed with a retryable error, before the whole file fails. A chunk is
+# retried on its own, with retry_delay backoff, so the chunks already recognized are not sent again.
+CHUNK_MAX_RETRIES = int(os.environ.get("CHUNK_MAX_RETRIES", 3))
+
+
+#------------------------------------------------------------------------------------------------------
+# Function to get the duration of a WAV file from its header
+def get_wav_duration(wav_path):
+    with wave.open(wav_path, "rb") as wav:
+        return wav.getnframes() / float(wav.getframerate())
+
+#------------------------------------------------------------------------------------------------------
+# Function to find the quietest frame in [start, end) and return its middle as a frame position
+def find_quiet_point(wav, start, end):
+    frame_len = max(1, int(wav.getframerate() * SILENCE_FRAME_MS / 1000))
+    width = wav.getsampwidth() * wav.getnchannels()
+    wav.setpos(start)
+    data = wav.readframes(end - start)
+
+    best_pos, best_rms = end, None
+    for offset in range(0, len(data) // width - frame_len + 1, frame_len):
+        rms = audioop.rms(data[offset * width:(offset + frame_len) * width], wav.getsampwidth())
+        if best_rms is None or rms < best_rms:
+            best_pos, best_rms = start + offset + frame_len // 2, rms
+    return best_pos
+
+#------------------------------------------------------------------------------------------------------
+# Function to split a WAV into overlapping chunks cut at the quietest point near each target length.
+# Only the search windows are read, so planning an 8 hour file stays cheap.
+# Each chunk is (index, start_frame, end_frame, own_start_frame, own_end_frame); the "own" range is
+# the part of the audio whose words this chunk is responsible for when merging.
+def plan_chunks(wav_path, chunk_secs=CHUNK_SECS, overlap_secs=CHUNK_OVERLAP_SECS, search_secs=CHUNK_SEARCH_SECS):
+    with wave.open(wav_path, "rb") as wav:
+        rate = wav.getframerate()
+        total = wav.getnframes()
+        chunk_frames = int(chunk_secs * rate)
+        overlap_frames = int(overlap_secs * rate)
+        search_frames = min(int(search_secs * rate), chunk_frames // 2)
+
+        cuts = [0]
+        while total - cuts[-1] > chunk_frames:
+            target = cuts[-1] + chunk_frames - overlap_frames
+            cuts.append(find_quiet_point(wav, target - search_frames, target))
+        cuts.append(total)
+
+    chunks = []
+    for index in range(len(cuts) - 1):
+        own_start, own_end = cuts[index], cuts[index + 1]
+        chunks.append((
+            index,
+            max(0, own_start - overlap_frames),
+            min(total, own_end + overlap_frames),
+            own_start,
+            own_end,
+        ))
+    return chunks
+
+#------------------------------------------------------------------------------------------------------
+# Function to read one planned chunk as a standalone WAV clip
+def read_chunk_wav(wav_path, start, end):
+    with wave.open(wav_path, "rb") as wav:
+        params = wav.getparams()
+        wav.setpos(start)
+        frames = wav.readframes(end - start)
+
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as out:
+        out.setparams(params)
+        out.writeframes(frames)
+    return buffer.getvalue()
+
+#------------------------------------------------------------------------------------------------------
+# Function to recognize every chunk with a bounded worker pool.
+# At most 2 * max_workers chunks are held in memory at once. Results come back in chunk order.
+# on_chunk(done, total, chunk_result) is called from the worker threads as each chunk finishes.
+# A chunk failing with a retryable error (quota, server error, ...) is retried on its own up to
+# CHUNK_MAX_RETRIES times. A chunk that still fails fails the file: no further chunk is submitted or
+# sent to the recognizer, so a file about to be retried as a whole spends no more quota.
+def recognize_chunks(wav_path, chunks, recognizer, language_config="english", max_workers=RECOGNITION_WORKERS, on_chunk=None):
+    with wave.open(wav_path, "rb") as wav:
+        rate = float(wav.getframerate())
+
+    slots = threading.BoundedSemaphore(max_workers * 2)
+    progress_lock = threading.Lock()
+    done = [0]
+    failed = threading.Event()
+    # Metric labels of the calling task, for the stages timed in the pool threads
+    labels = current_labels()
+
+    def recognize_one(chunk):
+        index, start, end, own_start, own_end = chunk
+        try:
+            for attempt in range(CHUNK_MAX_RETRIES + 1):
+                if failed.is_set():
+                    return None
+                try:
+                    with labels_from(labels), stage_timer("recognize"):
+                        results = recognizer.recognize(read_chunk_wav(wav_path, start, end), language_config)
+                    break
+                except Exception as e:
+                    if not is_retryable(e) or attempt == CHUNK_MAX_RETRIES:
+                        raise
+                    delay = retry_delay(attempt)
+                    print(f"Retrying chunk {index} of {wav_path} in {delay:.1f}s after: {e}")
+                    # Wakes up early when another chunk fails the file
+                    failed.wait(delay)
+        except Exception:
+            failed.set()
+            raise
+        finally:
+            slots.release()
+        chunk_result = {
+            "index": index,
+            "offset": start / rate,
+            "own_start": own_start / rate,
+            "own_end": own_end / rate,
+            "results": results,
+        }
+        if on_chunk is not None:
+            with progress_lock:
+                done[0] += 1
+                on_chunk(done[0], len(chunks), chunk_result)
+        return chunk_result
+
+    futures = []
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        for chunk in chunks:
+            slots.acquire()
+            if failed.is_set():
+                slots.release()
+                break
+            futures.append(pool.submit(recognize_one, chunk))
+        try:
+            # Raises the failing chunk's error; the chunks skipped before it return None
+            return [future.result() for future in futures]
+        except Exception:
+            # The file fails (or is retried) as a whole, so the chunks not started yet are dropped
+            failed.set()
+            for future in futures:
+                future.cancel()
+            raise
+
+#------------------------------------------------------------------------------------------------------
+# Function to merge per-chunk results into one ordered transcript.
+# Word offsets are shifted by the chunk start, and a word is only kept by the chunk that owns the
+# point in time at its middle, which drops the duplicates heard in the overlaps.
+# With with_words each entry also keeps its words, for transcription_with_words().
+def merge_chunk_results(chunk_results, language_config="english", with_words=False):
+    output_data = []
+    for chunk in sorted(chunk_results, key=lambda c: c["index"]):
+        offset = chunk["offset"]
+        for result in chunk["results"]:
+            words = result.get("words") or []
+            if not words:
+                continue
+            kept = []
+            for word in words:
+                start, end = word["start"] + offset, word["end"] + offset
+                if chunk["own_start"] <= (start + end) / 2 < chunk["own_end"]:
+                    kept.append(dict(word, start=start, end=end))
+            if not kept:
+                continue
+
+            transcript = result["transcript"]
+            if len(kept) != len(words):
+                transcript = " ".join(word["word"] for word in kept)
+            entry = {
+                "start_time": f"{round(kept[0]['start'], 3)}s",
+                "end_time": f"{round(kept[-1]['end'], 3)}s",
+                "language_code": language_config,
+                "confidence": result["confidence"],
+                "transcript": transcript,
+            }
+            if with_words:
+                entry["words"] = kept
+            output_data.append((kept[0]["start"], entry))
+
+    output_data.sort(key=lambda item: item[0])
+    return [entry for _, entry in output_data]
+
+#------------------------------------------------------------------------------------------------------
+# Main function to transcribe a long 16 kHz WAV as concurrently recognized overlapping chunks
+def run_chunked_recognize(wav_path, language_config="english", recognizer=None, max_workers=RECOGNITION_WORKERS, on_chunk=None):
+    if recognizer is None:
+        from recognizers import get_recognizer
+        recognizer = get_recognizer()
+
+    chunks = plan_chunks(wav_path)
+    print(f"Recognizing {wav_path} as {len(chunks)} chunks with {max_workers} workers")
+    chunk_results = recognize_chunks(wav_path, chunks, recognizer, language_config, max_workers, on_chunk)
+
+    with stage_timer("result_parse"):
+        output_data = merge_chunk_results(chunk_results, language_config, with_words=True)
+        if not output_data:
+            return {"error": "No transcription results found"}
+        return transcription_with_words(output_data)
@@ -0,0 +1,136 @@
+import os
+import itertools
+import threading
+
+from celery.signals import worker_process_init
+
+from quota import RateLimitedSpeechClient
+
+
+# Number of gRPC channels (one SpeechClient each) handed out round-robin per process
+SPEECH_CHANNEL_POOL_SIZE = int(os.environ.get("SPEECH_CHANNEL_POOL_SIZE", 4))
+
+# gRPC keepalive so idle channels between tasks are not silently dropped (milliseconds)
+GRPC_KEEPALIVE_TIME_MS = int(os.environ.get("GRPC_KEEPALIVE_TIME_MS", 30000))
+GRPC_KEEPALIVE_TIMEOUT_MS = int(os.environ.get("GRPC_KEEPALIVE_TIMEOUT_MS", 10000))
+
+# HTTP connection pool size of the Storage client
+STORAGE_HTTP_POOL_SIZE = int(os.environ.get("STORAGE_HTTP_POOL_SIZE", 16))
+
+# Service account key used by every Google client, in the API (translation) and the workers alike.
+# Set here, in the module both processes import, before any client is built.
+os.environ.setdefault("GOOGLE_APPLICATION_CREDENTIALS", "healthorbit-ai.json")
+
+
+_lock = threading.Lock()
+_speech_clients = None
+_speech_cycle = None
+_storage_client = None
+_translate_client = None
+
+#------------------------------------------------------------------------------------------------------
+# Function to build one SpeechClient on its own keepalive-enabled gRPC channel
+def create_speech_client():
+    from google.cloud import speech
+    from google.cloud.speech_v1.services.speech.transports.grpc import SpeechGrpcTransport
+
+    channel = SpeechGrpcTransport.create_channel(
+        options=[
+            ("grpc.max_send_message_length", -1),
+            ("grpc.max_receive_message_length", -1),
+            ("grpc.keepalive_time_ms", GRPC_KEEPALIVE_TIME_MS),
+            ("grpc.keepalive_timeout_ms", GRPC_KEEPALIVE_TIMEOUT_MS),
+            ("grpc.keepalive_permit_without_calls", 1),
+        ],
+    )
+    return speech.SpeechClient(transport=SpeechGrpcTransport(channel=channel))
+
+# Function to build the Storage client with a connection pool sized for concurrent uploads.
+# With STORAGE_EMULATOR_HOST set (e.g. fake-gcs-server) it talks to the emulator anonymously.
+def create_storage_client():
+    import requests
+    from google.cloud import storage
+
+    if os.environ.get("STORAGE_EMULATOR_HOST"):
+        from google.auth.credentials import AnonymousCredentials
+        client = storage.Client(project="emulator", credentials=AnonymousCredentials())
+    else:
+        client = storage.Client()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=STORAGE_HTTP_POOL_SIZE, pool_maxsize=STORAGE_HTTP_POOL_SIZE)
+    client._http.mount("https://", adapter)
+    client._http.mount("http://", adapter)
+    return client
+
+# Function to build the Cloud Translation client (google-cloud-translate, only needed by the google
+# translation backend)
+def create_translate_client():
+    from google.cloud import translate_v3
+    return translate_v3.TranslationServiceClient()
+
+#------------------------------------------------------------------------------------------------------
+# Function to get a pooled SpeechClient; the pool is created once per process on first use.
+# Its recognize calls wait for their turn under the shared Speech API rate limit (quota.py).
+def get_speech_client():
+    global _speech_clients, _speech_cycle
+    with _lock:
+        if _speech_clients is None:
+            _speech_clients = [
+                RateLimitedSpeechClient(create_speech_client()) for _ in range(max(1, SPEECH_CHANNEL_POOL_SIZE))
+            ]
+            _speech_cycle = itertools.cycle(_speech_clients)
+        return next(_speech_cycle)
+
+# Function to get the process wide Storage client
+def get_storage_client():
+    global _storage_client
+    with _lock:
+        if _storage_client is None:
+            _storage_client = create_storage_client()
+        return _storage_client
+
+# Function to get the process wide Translation client
+def get_translate_client():
+    global _translate_client
+    with _lock:
+        if _translate_client is None:
+            _translate_client = create_translate_client()
+        return _translate_client
+
+#------------------------------------------------------------------------------------------------------
+# Function to inject clients (fakes in tests and benchmarks); None leaves that client unchanged.
+# An injected SpeechClient is rate limited like the real ones.
+def set_clients(speech_client=None, storage_client=None):
+    global _speech_clients, _speech_cycle, _storage_client
+    with _lock:
+        if speech_client is not None:
+            _speech_clients = [RateLimitedSpeechClient(speech_client)]
+            _speech_cycle = itertools.cycle(_speech_clients)
+        if storage_client is not None:
+            _storage_client = storage_client
+
+# Function to drop all clients so the next call builds new ones
+def reset_clients():
+    global _lock, _speech_clients, _speech_cycle, _storage_client, _translate_client
+    # A lock held by another thread at fork time would stay locked forever in the child
+    _lock = threading.Lock()
+    _speech_clients = None
+    _speech_cycle = None
+    _storage_client = None
+    _translate_client = None
+
+# gRPC channels must not be shared across fork, so every child starts with an empty pool
+os.register_at_fork(after_in_child=reset_clients)
+
+# Build the clients once in each Celery worker process, right after the fork. The Speech client
+# is left out when another recognizer backend is configured (recognizers.RECOGNIZER_BACKEND).
+@worker_process_init.connect
+def init_worker_clients(**kwargs):
+    from recognizers import RECOGNIZER_BACKEND
+
+    try:
+        if RECOGNIZER_BACKEND == "google":
+            get_speech_client()
+        get_storage_client()
+    except Exception as e:
+        # Missing credentials should fail the task that needs them, not the worker
+        print(f"Warning: Could not initialize Google clients: {e}")
@@ -0,0 +1,104 @@
+import io
+import os
+import uuid
+import wave
+
+from clients import get_storage_client
+from result_cache import new_pcm_hasher
+
+
+# Stream transcoder output straight into memory or a resumable GCS upload, with no local WAV,
+# whenever the file will not be chunked
+DIRECT_GCS_UPLOAD = os.environ.get("DIRECT_GCS_UPLOAD", "1") == "1"
+
+# Bucket holding the temporary audio of long running recognitions
+GCS_TEMP_BUCKET = os.environ.get("GCS_TEMP_BUCKET", "ho_georgian")
+
+# Size of each request of a resumable upload; GCS needs a multiple of 256 KiB (bytes)
+GCS_UPLOAD_CHUNK_SIZE = int(os.environ.get("GCS_UPLOAD_CHUNK_SIZE", 8 * 1024 * 1024))
+
+# Audio up to this size is sent inline with the request, larger audio by GCS URI.
+# One minute of 16 kHz mono LINEAR16, the limit of synchronous recognition.
+INLINE_MAX_BYTES = 16000 * 2 * 60
+
+
+#------------------------------------------------------------------------------------------------------
+# Audio staged for recognition: either inline WAV content, or raw LINEAR16 PCM in a GCS blob
+class StagedAudio:
+    def __init__(self, size_bytes, pcm_sha256, sample_rate, content=None, bucket_name=None, blob_name=None):
+        self.size_bytes = size_bytes
+        self.pcm_sha256 = pcm_sha256
+        self.sample_rate = sample_rate
+        self.content = content
+        self.bucket_name = bucket_name
+        self.blob_name = blob_name
+
+    @property
+    def duration_secs(self):
+        return self.size_bytes / (2.0 * self.sample_rate)
+
+# Writable sink for LINEAR16 mono PCM. It counts and hashes every block, keeps the audio in memory
+# while it still fits inline, and from the first block past INLINE_MAX_BYTES on streams it into a
+# resumable, chunked GCS upload, so a long file is never held in memory or written to local disk.
+class AudioStager:
+    def __init__(self, sample_rate=16000, inline_max_bytes=INLINE_MAX_BYTES, bucket_name=GCS_TEMP_BUCKET,
+                 chunk_size=GCS_UPLOAD_CHUNK_SIZE, storage_client=None):
+        self.sample_rate = sample_rate
+        self.inline_max_bytes = inline_max_bytes
+        self.bucket_name = bucket_name
+        self.chunk_size = chunk_size
+        self.storage_client = storage_client
+        self.size_bytes = 0
+        self.sha256 = new_pcm_hasher(sample_rate, 1, 2)
+        self.buffer = bytearray()
+        self.blob = None
+        self.writer = None
+
+    def write(self, block):
+        self.size_bytes += len(block)
+        self.sha256.update(block)
+        if self.writer is not None:
+            self.writer.write(block)
+            return
+        self.buffer.extend(block)
+        if len(self.buffer) > self.inline_max_bytes:
+            self.spill()
+
+    def spill(self):
+        storage_client = self.storage_client or get_storage_client()
+        self.blob = storage_client.bucket(self.bucket_name).blob(f"temp_audio_{uuid.uuid4()}.pcm")
+        print(f"Audio exceeds {self.inline_max_bytes} bytes, streaming it to gs://{self.bucket_name}/{self.blob.name}")
+        self.writer = self.blob.open("wb", chunk_size=self.chunk_size, ignore_flush=True, content_type="audio/l16")
+        self.writer.write(bytes(self.buffer))
+        self.buffer = None
+
+    # Function to finish staging and describe the result
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            return StagedAudio(self.size_bytes, self.sha256.hexdigest(), self.sample_rate,
+                               bucket_name=self.bucket_name, blob_name=self.blob.name)
+
+        content = io.BytesIO()
+        with wave.open(content, "wb") as wav:
+            wav.setnchannels(1)
+            wav.setsampwidth(2)
+            wav.setframerate(self.sample_rate)
+            wav.writeframes(bytes(self.buffer))
+        return StagedAudio(self.size_bytes, self.sha256.hexdigest(), self.sample_rate, content=content.getvalue())
+
+    # Function to drop a failed staging. An unfinished resumable upload never becomes an object, but
+    # the upload may have been finished when the failure came (a lost response to its last request),
+    # so the blob is deleted when it exists.
+    def abort(self):
+        blob = self.blob if self.writer is not None else None
+        self.buffer = None
+        self.writer = None
+        if blob is None:
+            return
+        try:
+            blob.delete()
+            print(f"Deleted the partly staged gs://{self.bucket_name}/{blob.name}")
+        except Exception as e:
+            if getattr(e, "code", None) != 404:
+                print(f"Warning: Could not delete gs://{self.bucket_name}/{blob.name}: {e}")
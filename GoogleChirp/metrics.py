@@ -0,0 +1,212 @@
+import os
+import json
+import time
+import threading
+from contextlib import contextmanager
+
+import redis
+from celery.signals import task_postrun, task_prerun
+
+
+# Redis shared by the API and every worker, so /metrics on any API process sees all of them
+METRICS_REDIS_URL = os.environ.get("METRICS_REDIS_URL", "redis://localhost:6379/1")
+
+# Set to 0 to turn metrics recording off
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "1") == "1"
+
+METRICS_PREFIX = "metrics:"
+
+# Histogram bucket upper bounds (seconds)
+STAGE_BUCKETS = [0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800, 3600]
+HTTP_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30]
+
+# Audio durations are reported in classes, not seconds, to keep the label set small (upper bounds, seconds)
+DURATION_CLASSES = [(60, "0-1m"), (5 * 60, "1-5m"), (30 * 60, "5-30m"), (2 * 60 * 60, "30m-2h")]
+
+# Every metric: (type, help, buckets)
+METRICS = {
+    "transcription_stage_seconds": ("histogram", "Time spent in each transcription stage", STAGE_BUCKETS),
+    "transcription_stage_errors_total": ("counter", "Errors raised or reported by each transcription stage", None),
+    "recognition_path_total": ("counter", "Recognitions by path: inline, gcs, chunked or cache", None),
+    "transcriptions_total": ("counter", "Finished transcriptions by profile and outcome", None),
+    "time_to_first_text_seconds": ("histogram", "Time from submission to the first stored text of a transcription", STAGE_BUCKETS),
+    "celery_task_seconds": ("histogram", "Run time of Celery tasks", STAGE_BUCKETS),
+    "celery_tasks_total": ("counter", "Finished Celery tasks by task and state", None),
+    "celery_queue_wait_seconds": ("histogram", "Time tasks waited in their queue", STAGE_BUCKETS),
+    "http_request_seconds": ("histogram", "API request latency until the response starts", HTTP_BUCKETS),
+    "speech_quota_wait_seconds": ("histogram", "Time Speech API requests waited for the rate limiter", STAGE_BUCKETS),
+    "transcription_retries_total": ("counter", "Transcriptions retried after a transient error, by profile and error", None),
+    "translation_segments_total": ("counter", "Translated sentences, answered from the cache or by the backend", None),
+}
+
+_client = None
+_labels = threading.local()
+
+def get_metrics_client():
+    global _client
+    if _client is None:
+        _client = redis.Redis.from_url(METRICS_REDIS_URL)
+    return _client
+
+#------------------------------------------------------------------------------------------------------
+# Function to name the class of an audio duration, "unknown" when it isn't known
+def duration_class(duration_secs):
+    if duration_secs is None:
+        return "unknown"
+    for limit, name in DURATION_CLASSES:
+        if duration_secs <= limit:
+            return name
+    return "2h+"
+
+# Function to get this thread's labels, to carry them into worker threads
+def current_labels():
+    return dict(getattr(_labels, "value", None) or {"profile": "unknown", "duration": "unknown"})
+
+# Sets labels taken from current_labels() in another thread
+@contextmanager
+def labels_from(labels):
+    previous = getattr(_labels, "value", None)
+    _labels.value = labels
+    try:
+        yield
+    finally:
+        _labels.value = previous
+
+# Sets the profile and audio duration reported by every stage timed in this thread
+def metric_labels(profile=None, duration_secs=None):
+    return labels_from({"profile": profile or "unknown", "duration": duration_class(duration_secs)})
+
+def stage_labels(stage, profile=None, duration_secs=None):
+    labels = current_labels()
+    if profile is not None:
+        labels["profile"] = profile
+    if duration_secs is not None:
+        labels["duration"] = duration_class(duration_secs)
+    labels["stage"] = stage
+    return labels
+
+#------------------------------------------------------------------------------------------------------
+# Recording. Every write is one Redis pipeline; failures are logged and never break the caller.
+#------------------------------------------------------------------------------------------------------
+def label_key(labels):
+    return json.dumps(labels, sort_keys=True)
+
+# Function to add one observation to a histogram
+def observe(name, value, **labels):
+    if not METRICS_ENABLED:
+        return
+    buckets = METRICS[name][2]
+    bucket = next((index for index, bound in enumerate(buckets) if value <= bound), len(buckets))
+    key, field = METRICS_PREFIX + name, label_key(labels)
+    try:
+        pipe = get_metrics_client().pipeline(transaction=False)
+        pipe.hincrby(key, f"{field}|{bucket}", 1)
+        pipe.hincrby(key, f"{field}|count", 1)
+        pipe.hincrbyfloat(key, f"{field}|sum", value)
+        pipe.execute()
+    except redis.RedisError as e:
+        print(f"Warning: Could not record metric {name}: {e}")
+
+# Function to add to a counter
+def increment(name, amount=1, **labels):
+    if not METRICS_ENABLED:
+        return
+    try:
+        get_metrics_client().hincrbyfloat(METRICS_PREFIX + name, label_key(labels), amount)
+    except redis.RedisError as e:
+        print(f"Warning: Could not record metric {name}: {e}")
+
+#------------------------------------------------------------------------------------------------------
+# Times a transcription stage; an exception also counts as an error of the stage
+@contextmanager
+def stage_timer(stage, profile=None, duration_secs=None):
+    labels = stage_labels(stage, profile, duration_secs)
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        increment("transcription_stage_errors_total", **labels)
+        raise
+    finally:
+        observe("transcription_stage_seconds", time.perf_counter() - start, **labels)
+
+# Function to record a stage timed by the caller
+def observe_stage(stage, seconds, profile=None, duration_secs=None):
+    observe("transcription_stage_seconds", seconds, **stage_labels(stage, profile, duration_secs))
+
+# Function to count an error a stage reported without raising
+def count_stage_error(stage, profile=None, duration_secs=None):
+    increment("transcription_stage_errors_total", **stage_labels(stage, profile, duration_secs))
+
+# Function to count the path a recognition took (inline, gcs, chunked or cache)
+def count_recognition_path(path, profile=None):
+    labels = current_labels()
+    increment("recognition_path_total", path=path, profile=profile or labels["profile"])
+
+# Function to record how long a transcription took to store its first text after submission
+def observe_time_to_first_text(seconds):
+    observe("time_to_first_text_seconds", seconds, **current_labels())
+
+#------------------------------------------------------------------------------------------------------
+# Celery worker metrics: run time and final state of every task
+_task_started = {}
+
+@task_prerun.connect
+def record_task_start(task_id=None, **kwargs):
+    _task_started[task_id] = time.perf_counter()
+
+@task_postrun.connect
+def record_task_end(task_id=None, task=None, state=None, **kwargs):
+    start = _task_started.pop(task_id, None)
+    queue = (task.request.delivery_info or {}).get("routing_key") or "unknown"
+    if start is not None:
+        observe("celery_task_seconds", time.perf_counter() - start, task=task.name, queue=queue)
+    increment("celery_tasks_total", task=task.name, state=state or "UNKNOWN")
+
+#------------------------------------------------------------------------------------------------------
+# Function to render every recorded metric, plus the given gauges, in the Prometheus text format.
+# gauges is {name: (help, [(labels, value), ...])}.
+def render_metrics(gauges=None):
+    client = get_metrics_client()
+    lines = []
+    for name, (kind, help_text, buckets) in METRICS.items():
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        fields = client.hgetall(METRICS_PREFIX + name)
+        if kind == "counter":
+            for field, value in sorted(fields.items()):
+                lines.append(f"{name}{format_labels(json.loads(field))} {format_value(value)}")
+            continue
+
+        series = {}
+        for field, value in fields.items():
+            labels, _, part = field.decode().rpartition("|")
+            series.setdefault(labels, {})[part] = float(value)
+        for labels, parts in sorted(series.items()):
+            labels = json.loads(labels)
+            cumulative = 0
+            for index, bound in enumerate(buckets + ["+Inf"]):
+                cumulative += parts.get(str(index), 0)
+                lines.append(f"{name}_bucket{format_labels(dict(labels, le=str(bound)))} {int(cumulative)}")
+            lines.append(f"{name}_sum{format_labels(labels)} {parts.get('sum', 0)}")
+            lines.append(f"{name}_count{format_labels(labels)} {int(parts.get('count', 0))}")
+
+    for name, (help_text, samples) in (gauges or {}).items():
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} gauge")
+        for labels, value in samples:
+            lines.append(f"{name}{format_labels(labels)} {format_value(value)}")
+    return "\n".join(lines) + "\n"
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    escaped = (
+        f'{name}="' + str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") + '"'
+        for name, value in sorted(labels.items())
+    )
+    return "{" + ",".join(escaped) + "}"
+
+def format_value(value):
+    value = float(value)
+    return str(int(value)) if value.is_integer() else str(value)
@@ -0,0 +1,115 @@
+import os
+import json
+import time
+
+import redis
+
+
+# Redis holding the long running recognition operations still waiting for their result
+OPERATIONS_REDIS_URL = os.environ.get("OPERATIONS_REDIS_URL", "redis://localhost:6379/1")
+
+# Submit long running operations and let the poller finish them, instead of blocking a worker slot
+ASYNC_OPERATIONS = os.environ.get("ASYNC_OPERATIONS", "1") == "1"
+
+# Seconds between checks of one pending operation, and most operations checked per poll
+OPERATIONS_POLL_INTERVAL_SECS = int(os.environ.get("OPERATIONS_POLL_INTERVAL_SECS", 10))
+OPERATIONS_POLL_BATCH = int(os.environ.get("OPERATIONS_POLL_BATCH", 100))
+
+# Operations checked in parallel within one poll
+OPERATIONS_POLL_WORKERS = 8
+
+# A claimed operation is handed out again after this long, in case its poller died (seconds)
+OPERATIONS_CLAIM_SECS = 120
+
+# Time allowed for one operation: a base plus an allowance per second of audio (seconds)
+OPERATION_TIMEOUT_BASE_SECS = int(os.environ.get("OPERATION_TIMEOUT_BASE_SECS", 120))
+OPERATION_TIMEOUT_PER_AUDIO_SEC = float(os.environ.get("OPERATION_TIMEOUT_PER_AUDIO_SEC", 1.0))
+
+OPERATIONS_KEY = "operations:pending"
+OPERATIONS_DUE_KEY = "operations:due"
+
+# Takes the due operations and pushes their next check back by the claim time in one step,
+# so overlapping polls never pick up the same operation
+CLAIM_DUE_SCRIPT = """
+local names = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, ARGV[2])
+for _, name in ipairs(names) do
+    redis.call('ZADD', KEYS[1], ARGV[3], name)
+end
+return names
+"""
+
+_client = None
+_claim_due = None
+
+def get_operations_client():
+    global _client, _claim_due
+    if _client is None:
+        _client = redis.Redis.from_url(OPERATIONS_REDIS_URL)
+        _claim_due = _client.register_script(CLAIM_DUE_SCRIPT)
+    return _client
+
+#------------------------------------------------------------------------------------------------------
+# Function to get the time allowed for the operation of a file of the given duration (seconds)
+def operation_timeout(duration_secs):
+    return OPERATION_TIMEOUT_BASE_SECS + OPERATION_TIMEOUT_PER_AUDIO_SEC * duration_secs
+
+#------------------------------------------------------------------------------------------------------
+# Function to record a submitted operation. The record carries everything needed to finish the
+# task without it: task ID, profile, GCS blob, deadline, cache keys and batch.
+def save_pending_operation(record):
+    pipe = get_operations_client().pipeline()
+    pipe.hset(OPERATIONS_KEY, record["name"], json.dumps(record))
+    pipe.zadd(OPERATIONS_DUE_KEY, {record["name"]: time.time() + OPERATIONS_POLL_INTERVAL_SECS})
+    pipe.execute()
+
+# Function to claim up to limit operations due for a check; returns their records
+def claim_due_operations(limit=OPERATIONS_POLL_BATCH):
+    client = get_operations_client()
+    now = time.time()
+    names = _claim_due(keys=[OPERATIONS_DUE_KEY], args=[now, limit, now + OPERATIONS_CLAIM_SECS])
+    if not names:
+        return []
+    records = client.hmget(OPERATIONS_KEY, names)
+    return [json.loads(record) for record in records if record]
+
+# Function to schedule the next check of an operation still running
+def reschedule_operation(name, delay=OPERATIONS_POLL_INTERVAL_SECS):
+    get_operations_client().zadd(OPERATIONS_DUE_KEY, {name: time.time() + delay})
+
+# Function to count the operations still pending
+def pending_operation_count():
+    return get_operations_client().hlen(OPERATIONS_KEY)
+
+# Function to get the GCS blob names of the operations still pending, which the temp blob sweeper keeps
+def pending_operation_blobs():
+    return {json.loads(record)["blob"] for record in get_operations_client().hvals(OPERATIONS_KEY)}
+
+# Function to forget a finished operation
+def remove_operation(name):
+    pipe = get_operations_client().pipeline()
+    pipe.hdel(OPERATIONS_KEY, name)
+    pipe.zrem(OPERATIONS_DUE_KEY, name)
+    pipe.execute()
+
+#------------------------------------------------------------------------------------------------------
+# Function to check one operation with the Speech client's operations API.
+# Returns ("running", None), ("done", LongRunningRecognizeResponse), ("failed", message) or
+# ("timed_out", None); an operation past its deadline is cancelled.
+def check_operation(client, record):
+    from google.cloud import speech
+
+    operations_client = client.transport.operations_client
+    operation = operations_client.get_operation(record["name"])
+
+    if not operation.done:
+        if time.time() < record["deadline"]:
+            return "running", None
+        try:
+            operations_client.cancel_operation(record["name"])
+        except Exception as e:
+            print(f"Warning: Could not cancel operation {record['name']}: {e}")
+        return "timed_out", None
+
+    if operation.HasField("error"):
+        return "failed", operation.error.message
+    return "done", speech.LongRunningRecognizeResponse.deserialize(operation.response.value)
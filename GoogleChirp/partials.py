@@ -0,0 +1,91 @@
+import os
+import json
+import time
+
+import redis
+
+
+# Redis holding the partial transcript segments of running and recent tasks
+PARTIALS_REDIS_URL = os.environ.get("PARTIALS_REDIS_URL", "redis://localhost:6379/1")
+
+# How long partial segments are kept after the last write (seconds)
+PARTIALS_TTL_SECS = int(os.environ.get("PARTIALS_TTL_SECS", 24 * 60 * 60))
+
+PARTIALS_PREFIX = "partials:"
+
+_client = None
+
+def get_partials_client():
+    global _client
+    if _client is None:
+        _client = redis.Redis.from_url(PARTIALS_REDIS_URL)
+    return _client
+
+#------------------------------------------------------------------------------------------------------
+# Function to note when a task was submitted, the starting point of time to first text
+def mark_submitted(task_id):
+    key = PARTIALS_PREFIX + task_id + ":meta"
+    pipe = get_partials_client().pipeline()
+    pipe.hsetnx(key, "submitted_at", time.time())
+    pipe.expire(key, PARTIALS_TTL_SECS)
+    pipe.execute()
+
+# Function to note batch items queued in their batch, so they are known before they are submitted
+def mark_queued(task_ids):
+    pipe = get_partials_client().pipeline()
+    for task_id in task_ids:
+        key = PARTIALS_PREFIX + task_id + ":meta"
+        pipe.hsetnx(key, "queued_at", time.time())
+        pipe.expire(key, PARTIALS_TTL_SECS)
+    pipe.execute()
+
+# Function to check whether a task was submitted (or queued in a batch) in the last PARTIALS_TTL_SECS
+def is_known_task(task_id):
+    return get_partials_client().exists(PARTIALS_PREFIX + task_id + ":meta") > 0
+
+#------------------------------------------------------------------------------------------------------
+# Function to append finished transcript entries of one part of the audio.
+# Segment IDs are stable (part index plus the entry's position within that part). Each part is
+# stored once: a part written again after a retry is ignored, so readers never get a segment twice
+# and their cursors stay valid. Segments are stored in completion order and each carries its own
+# start/end offsets. Returns the segments, or None when the part was already stored.
+def store_segments(task_id, part_index, entries):
+    segments = [
+        dict(entry, segment_id=f"{part_index:05d}.{position}")
+        for position, entry in enumerate(entries)
+    ]
+    segments_key = PARTIALS_PREFIX + task_id
+    meta_key = segments_key + ":meta"
+    parts_key = segments_key + ":parts"
+
+    client = get_partials_client()
+    if not client.hsetnx(parts_key, part_index, len(segments)):
+        return None
+    pipe = client.pipeline()
+    if segments:
+        pipe.rpush(segments_key, *[json.dumps(segment) for segment in segments])
+        pipe.hsetnx(meta_key, "first_text_at", time.time())
+    pipe.hincrby(meta_key, "parts", 1)
+    for key in (segments_key, meta_key, parts_key):
+        pipe.expire(key, PARTIALS_TTL_SECS)
+    pipe.execute()
+    return segments
+
+#------------------------------------------------------------------------------------------------------
+# Function to read the segments stored after the given cursor; returns (segments, next_cursor)
+def read_segments(task_id, cursor=0):
+    cursor = max(0, cursor)
+    items = get_partials_client().lrange(PARTIALS_PREFIX + task_id, cursor, -1)
+    return [json.loads(item) for item in items], cursor + len(items)
+
+#------------------------------------------------------------------------------------------------------
+# Function to get the seconds from submission to the first stored text, None until there is text
+def time_to_first_text(task_id):
+    meta = get_partials_client().hgetall(PARTIALS_PREFIX + task_id + ":meta")
+    if b"submitted_at" not in meta or b"first_text_at" not in meta:
+        return None
+    return round(float(meta[b"first_text_at"]) - float(meta[b"submitted_at"]), 3)
+
+# Function to check whether any part of a task has been stored yet
+def has_segments(task_id):
+    return get_partials_client().hexists(PARTIALS_PREFIX + task_id + ":meta", "parts")
@@ -0,0 +1,295 @@
+import os
+import re
+import json
+import math
+import shutil
+import struct
+import subprocess
+
+
+# Longest audio accepted for transcription (seconds)
+MAX_AUDIO_LENGTH_SECS = float(os.environ.get("MAX_AUDIO_LENGTH_SECS", 8 * 60 * 60))
+
+# Bitrate assumed when nothing can read a file's header (bits per second)
+FALLBACK_BITRATE = 128000
+
+# Speech API price and billing increment used for cost estimates
+SPEECH_USD_PER_MINUTE = float(os.environ.get("SPEECH_USD_PER_MINUTE", 0.024))
+SPEECH_BILLING_INCREMENT_SECS = int(os.environ.get("SPEECH_BILLING_INCREMENT_SECS", 1))
+
+# Audio covered by one synchronous Speech API request, the limit of inline recognition and the size
+# of a chunk. A long running recognition is charged to the rate limiter as this many requests.
+SPEECH_REQUEST_AUDIO_SECS = 60
+
+# Seconds the ffprobe/ffmpeg header read may take
+PROBE_TIMEOUT_SECS = 10
+
+# Bytes read from the start of a file to find its format headers
+HEADER_READ_BYTES = 64 * 1024
+
+# WAV format tags (ffprobe codec names, by bits per sample for PCM)
+WAV_CODECS = {3: "pcm_f{bits}le", 6: "pcm_alaw", 7: "pcm_mulaw", 0x55: "mp3"}
+
+# MPEG audio layer III tables: bitrates (kbit/s) and sample rates by MPEG version
+MP3_BITRATES = {
+    1: [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    2: [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+}
+MP3_SAMPLE_RATES = {1: [44100, 48000, 32000], 2: [22050, 24000, 16000], 2.5: [11025, 12000, 8000]}
+
+
+class InvalidAudio(Exception):
+    pass
+
+class AudioTooLong(InvalidAudio):
+    pass
+
+#------------------------------------------------------------------------------------------------------
+# A probe is a plain dict, so it can travel in task headers and batch items:
+#   format          container: wav, flac, mp3, or what ffprobe/ffmpeg report
+#   codec           ffprobe style codec name (pcm_s16le, flac, mp3, aac, ...), "unknown" when unread
+#   sample_rate     Hz, None when unknown
+#   channels        None when unknown
+#   duration_secs   from the header, or from the file size when estimated is True
+#   estimated       True when the duration is a guess from the file size
+#   size_bytes      size of the file
+def make_probe(audio_path, audio_format, codec, sample_rate, channels, duration_secs, estimated=False):
+    return {
+        "format": audio_format,
+        "codec": codec,
+        "sample_rate": sample_rate,
+        "channels": channels,
+        "duration_secs": round(duration_secs, 3),
+        "estimated": estimated,
+        "size_bytes": os.path.getsize(audio_path),
+    }
+
+#------------------------------------------------------------------------------------------------------
+# Function to read an audio file's duration, sample rate, channels and codec from its headers only.
+# WAV, FLAC and MP3 are parsed here; other containers are read by ffprobe (or ffmpeg -i), and when
+# neither is installed the duration is estimated from the size. Raises InvalidAudio for files that
+# can't be audio.
+def probe_audio(audio_path):
+    size_bytes = os.path.getsize(audio_path)
+    if size_bytes == 0:
+        raise InvalidAudio("The file is empty")
+
+    with open(audio_path, "rb") as f:
+        header = f.read(HEADER_READ_BYTES)
+
+    if header[:4] == b"RIFF" and header[8:12] == b"WAVE":
+        return probe_wav(audio_path)
+    if header[:4] == b"fLaC":
+        return probe_flac(audio_path, header)
+    mp3_offset = mp3_frame_offset(header)
+    probe = probe_mp3(audio_path, header, mp3_offset) if mp3_offset is not None else None
+
+    if probe is None and shutil.which("ffprobe"):
+        probe = probe_with_ffprobe(audio_path)
+    if probe is None and shutil.which("ffmpeg"):
+        probe = probe_with_ffmpeg(audio_path)
+    if probe is None:
+        return make_probe(audio_path, "unknown", "unknown", None, None, size_bytes * 8.0 / FALLBACK_BITRATE, True)
+    return probe
+
+#------------------------------------------------------------------------------------------------------
+# Function to walk the RIFF chunks of a WAV to its "fmt " and "data" chunks, skipping chunk bodies
+def probe_wav(audio_path):
+    size_bytes = os.path.getsize(audio_path)
+    fmt = None
+    with open(audio_path, "rb") as f:
+        f.seek(12)
+        while True:
+            chunk_header = f.read(8)
+            if len(chunk_header) < 8:
+                raise InvalidAudio("WAV file has no data chunk")
+            chunk_id, chunk_size = struct.unpack("<4sI", chunk_header)
+            if chunk_id == b"fmt ":
+                fmt = f.read(chunk_size)
+                if len(fmt) < 16:
+                    raise InvalidAudio("WAV file has a truncated fmt chunk")
+                f.seek(chunk_size % 2, os.SEEK_CUR)
+            elif chunk_id == b"data":
+                data_offset = f.tell()
+                break
+            else:
+                f.seek(chunk_size + chunk_size % 2, os.SEEK_CUR)
+
+    if fmt is None:
+        raise InvalidAudio("WAV file has no fmt chunk before its data")
+    tag, channels, sample_rate, byte_rate, _, bits = struct.unpack("<HHIIHH", fmt[:16])
+    # WAVE_FORMAT_EXTENSIBLE keeps the real format tag at the start of its sub-format GUID
+    if tag == 0xFFFE and len(fmt) >= 26:
+        tag = struct.unpack("<H", fmt[24:26])[0]
+    if not channels or not sample_rate or not byte_rate:
+        raise InvalidAudio("WAV file has an invalid fmt chunk")
+
+    if tag == 1:
+        codec = "pcm_u8" if bits == 8 else f"pcm_s{bits}le"
+    else:
+        codec = WAV_CODECS.get(tag, f"wav_0x{tag:04x}").format(bits=bits)
+    # Streamed WAVs leave the data size at 0 or 0xFFFFFFFF; the data then runs to the end of the file
+    data_size = chunk_size if 0 < chunk_size < 0xFFFFFFFF else size_bytes - data_offset
+    data_size = min(data_size, size_bytes - data_offset)
+    return make_probe(audio_path, "wav", codec, sample_rate, channels, data_size / float(byte_rate))
+
+# Function to read the STREAMINFO block that starts every FLAC file
+def probe_flac(audio_path, header):
+    if len(header) < 42 or header[4] & 0x7F != 0:
+        raise InvalidAudio("FLAC file has no STREAMINFO block")
+    packed = int.from_bytes(header[18:26], "big")
+    sample_rate = packed >> 44
+    channels = ((packed >> 41) & 0x7) + 1
+    total_samples = packed & 0xFFFFFFFFF
+    if not sample_rate:
+        raise InvalidAudio("FLAC file has an invalid STREAMINFO block")
+    if total_samples:
+        return make_probe(audio_path, "flac", "flac", sample_rate, channels, total_samples / float(sample_rate))
+    # An encoder that didn't know the length leaves it at 0; assume about 60% of the PCM size
+    bits = ((packed >> 36) & 0x1F) + 1
+    duration_secs = os.path.getsize(audio_path) / (0.6 * sample_rate * channels * bits / 8.0)
+    return make_probe(audio_path, "flac", "flac", sample_rate, channels, duration_secs, True)
+
+#------------------------------------------------------------------------------------------------------
+# Function to find the first MPEG layer III frame, after an ID3v2 tag if there is one
+def mp3_frame_offset(header):
+    offset = 0
+    if header[:3] == b"ID3" and len(header) >= 10:
+        # The tag size is stored as a 28 bit "syncsafe" integer
+        offset = 10 + ((header[6] & 0x7F) << 21 | (header[7] & 0x7F) << 14 | (header[8] & 0x7F) << 7 | header[9] & 0x7F)
+    if offset + 4 > len(header):
+        return offset if header[:3] == b"ID3" else None
+    return offset if parse_mp3_header(header[offset:offset + 4]) is not None else None
+
+# Function to decode an MPEG audio frame header; None unless it is a valid layer III header
+def parse_mp3_header(frame_header):
+    if len(frame_header) < 4 or frame_header[0] != 0xFF or frame_header[1] & 0xE0 != 0xE0:
+        return None
+    version = {3: 1, 2: 2, 0: 2.5}.get((frame_header[1] >> 3) & 0x3)
+    layer = (frame_header[1] >> 1) & 0x3
+    bitrate_index = frame_header[2] >> 4
+    rate_index = (frame_header[2] >> 2) & 0x3
+    if version is None or layer != 1 or bitrate_index in (0, 15) or rate_index == 3:
+        return None
+    return {
+        "version": version,
+        "bitrate": MP3_BITRATES[1 if version == 1 else 2][bitrate_index] * 1000,
+        "sample_rate": MP3_SAMPLE_RATES[version][rate_index],
+        "channels": 1 if frame_header[3] >> 6 == 3 else 2,
+    }
+
+# Function to read an MP3's duration from its Xing/Info frame count, or from the first frame's
+# bitrate when the file has no Xing header (exact for constant bitrate files). None when no frame
+# follows the ID3 tag directly, to leave the file to ffprobe/ffmpeg.
+def probe_mp3(audio_path, header, offset):
+    frame = parse_mp3_header(header[offset:offset + 4])
+    if frame is None:
+        # The ID3 tag is longer than the bytes read so far; read the frame header after it
+        with open(audio_path, "rb") as f:
+            f.seek(offset)
+            frame_bytes = f.read(HEADER_READ_BYTES)
+        frame = parse_mp3_header(frame_bytes[:4])
+        if frame is None:
+            return None
+        header, offset = frame_bytes, 0
+
+    samples_per_frame = 1152 if frame["version"] == 1 else 576
+    # The Xing/Info header follows the side information, whose size depends on version and channels
+    if frame["version"] == 1:
+        side_info = 32 if frame["channels"] == 2 else 17
+    else:
+        side_info = 17 if frame["channels"] == 2 else 9
+    xing = offset + 4 + side_info
+    if len(header) >= xing + 12 and header[xing:xing + 4] in (b"Xing", b"Info") and header[xing + 7] & 0x1:
+        frames = struct.unpack(">I", header[xing + 8:xing + 12])[0]
+        duration_secs = frames * samples_per_frame / float(frame["sample_rate"])
+        return make_probe(audio_path, "mp3", "mp3", frame["sample_rate"], frame["channels"], duration_secs)
+
+    duration_secs = (os.path.getsize(audio_path) - offset) * 8.0 / frame["bitrate"]
+    return make_probe(audio_path, "mp3", "mp3", frame["sample_rate"], frame["channels"], duration_secs)
+
+#------------------------------------------------------------------------------------------------------
+# Function to read the container and first audio stream with ffprobe; None when ffprobe can't run
+def probe_with_ffprobe(audio_path):
+    try:
+        output = subprocess.run(
+            ["ffprobe", "-v", "error", "-select_streams", "a:0", "-of", "json",
+             "-show_entries", "format=format_name,duration:stream=codec_name,sample_rate,channels", audio_path],
+            capture_output=True, text=True, timeout=PROBE_TIMEOUT_SECS,
+        )
+    except subprocess.SubprocessError:
+        return None
+    if output.returncode != 0:
+        raise InvalidAudio(f"Not a readable audio file: {output.stderr.strip()[:200]}")
+
+    info = json.loads(output.stdout or "{}")
+    streams = info.get("streams") or []
+    if not streams:
+        raise InvalidAudio("The file has no audio stream")
+    stream, container = streams[0], info.get("format", {})
+    duration_secs = float(container.get("duration") or 0)
+    if duration_secs <= 0:
+        raise InvalidAudio("The file has no audio duration")
+    return make_probe(audio_path, container.get("format_name", "unknown").split(",")[0], stream.get("codec_name", "unknown"),
+                      int(stream.get("sample_rate") or 0) or None, stream.get("channels"), duration_secs)
+
+# Function to read the same details from the header dump of "ffmpeg -i", which opens the input and
+# exits without decoding when no output is given
+def probe_with_ffmpeg(audio_path):
+    try:
+        stderr = subprocess.run(
+            ["ffmpeg", "-nostdin", "-hide_banner", "-i", audio_path],
+            capture_output=True, text=True, timeout=PROBE_TIMEOUT_SECS,
+        ).stderr
+    except subprocess.SubprocessError:
+        return None
+
+    container = re.search(r"Input #0, ([^,\s]+)", stderr)
+    duration = re.search(r"Duration: (\d+):(\d+):(\d+(?:\.\d+)?)", stderr)
+    stream = re.search(r"Stream #0:\d+.*?: Audio: (\w+)[^,]*,\s*(\d+) Hz,\s*([^,]+)", stderr)
+    if container is None:
+        raise InvalidAudio("Not a readable audio file")
+    if stream is None:
+        raise InvalidAudio("The file has no audio stream")
+    if duration is None:
+        raise InvalidAudio("The file has no audio duration")
+
+    hours, minutes, seconds = duration.groups()
+    duration_secs = int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+    layout = stream.group(3).strip()
+    channels = {"mono": 1, "stereo": 2}.get(layout)
+    if channels is None and re.match(r"\d+ channels", layout):
+        channels = int(layout.split()[0])
+    return make_probe(audio_path, container.group(1), stream.group(1), int(stream.group(2)), channels, duration_secs)
+
+#------------------------------------------------------------------------------------------------------
+# Function to reject audio longer than MAX_AUDIO_LENGTH_SECS. Durations estimated from the file size
+# are not enforced, as the guessed bitrate could be far off.
+def check_admission(probe, max_secs=MAX_AUDIO_LENGTH_SECS):
+    if not probe["estimated"] and probe["duration_secs"] > max_secs:
+        raise AudioTooLong(f"Audio is {probe['duration_secs']:.0f}s long, the limit is {max_secs:.0f}s")
+
+# Function to tell whether a file must be transcoded, i.e. it isn't already LINEAR16 mono WAV at the target rate
+def needs_transcode(probe, target_sample_rate=16000):
+    return not (
+        probe is not None and probe["format"] == "wav" and probe["codec"] == "pcm_s16le"
+        and probe["channels"] == 1 and probe["sample_rate"] == target_sample_rate
+    )
+
+# Function to count the Speech API requests recognizing this much audio takes against the request quota
+def speech_request_count(duration_secs):
+    return max(1, int(math.ceil(duration_secs / SPEECH_REQUEST_AUDIO_SECS)))
+
+# Function to estimate what recognizing a probed file costs, for routing and rate limiting
+def estimate_cost(probe, target_sample_rate=16000):
+    increment = SPEECH_BILLING_INCREMENT_SECS
+    billed_secs = int(math.ceil(probe["duration_secs"] / increment)) * increment
+    return {
+        "audio_secs": probe["duration_secs"],
+        "billed_secs": billed_secs,
+        "usd": round(billed_secs / 60.0 * SPEECH_USD_PER_MINUTE, 4),
+        "speech_requests": speech_request_count(probe["duration_secs"]),
+        "transcode": needs_transcode(probe, target_sample_rate),
+        # Size of the LINEAR16 mono audio sent for recognition
+        "pcm_bytes": int(probe["duration_secs"] * target_sample_rate * 2),
+    }
@@ -0,0 +1,68 @@
+# Named recognition profiles. Adding a language or model is one entry here: the config is built on
+# first use, the generic transcription task accepts the name, and routing gets a queue per profile.
+RECOGNITION_PROFILES = {
+    "english": {
+        "language_code": "en-US",
+        "alternative_language_codes": [],
+        "model": None,
+        "enable_automatic_punctuation": True,
+        "enable_word_time_offsets": True,
+        "enable_word_confidence": True,
+    },
+    "georgian": {
+        "language_code": "ka-GE",
+        "alternative_language_codes": ["en-US", "ru-RU"],  # Fallback languages
+        "model": None,
+        "enable_automatic_punctuation": True,
+        "enable_word_time_offsets": True,
+        "enable_word_confidence": True,
+    },
+}
+
+# Older names still accepted for a profile
+PROFILE_ALIASES = {
+    "ho_georgian": "georgian",
+}
+
+DEFAULT_PROFILE = "english"
+
+
+class UnknownProfile(ValueError):
+    pass
+
+#------------------------------------------------------------------------------------------------------
+# Function to build the RecognitionConfig of a profile (audio is always LINEAR16 mono 16 kHz)
+def build_profile_config(profile):
+    from google.cloud import speech
+
+    config = speech.RecognitionConfig(
+        encoding=speech.RecognitionConfig.AudioEncoding.LINEAR16,
+        sample_rate_hertz=16000,
+        language_code=profile["language_code"],
+        alternative_language_codes=profile["alternative_language_codes"],
+        enable_word_time_offsets=profile["enable_word_time_offsets"],
+        enable_word_confidence=profile["enable_word_confidence"],
+        enable_automatic_punctuation=profile["enable_automatic_punctuation"],
+    )
+    if profile["model"]:
+        config.model = profile["model"]
+    return config
+
+# Configs are built once, on first use, and shared by every request. Building them imports the
+# Speech SDK, which the API process never needs.
+RECOGNITION_CONFIGS = {}
+
+#------------------------------------------------------------------------------------------------------
+# Function to resolve a profile name or alias to its registry name
+def resolve_profile(name):
+    name = PROFILE_ALIASES.get(name, name)
+    if name not in RECOGNITION_PROFILES:
+        raise UnknownProfile(f"Unknown recognition profile: {name}")
+    return name
+
+# Function to get the shared RecognitionConfig of a profile
+def get_recognition_config(name=DEFAULT_PROFILE):
+    name = resolve_profile(name)
+    if name not in RECOGNITION_CONFIGS:
+        RECOGNITION_CONFIGS[name] = build_profile_config(RECOGNITION_PROFILES[name])
+    return RECOGNITION_CONFIGS[name]
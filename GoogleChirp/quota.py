@@ -0,0 +1,153 @@
+import os
+import sys
+import time
+import random
+
+import redis
+
+from metrics import observe
+
+
+# Redis shared by every worker, so all of them draw from one Speech API quota
+QUOTA_REDIS_URL = os.environ.get("QUOTA_REDIS_URL", "redis://localhost:6379/1")
+
+# Speech API requests per minute allowed across all workers, a little under the project's
+# "Requests per minute" quota; 0 turns the rate limiter off
+SPEECH_REQUESTS_PER_MIN = float(os.environ.get("SPEECH_REQUESTS_PER_MIN", 900))
+
+# Requests that may go out back to back after an idle spell (the size of the token bucket)
+SPEECH_REQUESTS_BURST = float(os.environ.get("SPEECH_REQUESTS_BURST", 30))
+
+# A request waits at most this long for its turn; beyond that the task is retried later (seconds)
+SPEECH_QUOTA_MAX_WAIT_SECS = float(os.environ.get("SPEECH_QUOTA_MAX_WAIT_SECS", 30))
+
+# Retries of a transcription that failed with a retryable error, with full jitter backoff: a random
+# delay up to SPEECH_RETRY_BASE_SECS * 2^retry, capped at SPEECH_RETRY_MAX_SECS (seconds)
+SPEECH_MAX_RETRIES = int(os.environ.get("SPEECH_MAX_RETRIES", 5))
+SPEECH_RETRY_BASE_SECS = float(os.environ.get("SPEECH_RETRY_BASE_SECS", 2))
+SPEECH_RETRY_MAX_SECS = float(os.environ.get("SPEECH_RETRY_MAX_SECS", 120))
+
+# HTTP status of the Google API errors worth retrying: timeouts, quota, server errors and unavailability.
+# Anything else (invalid argument, permission denied, not found, ...) fails the same way on every try.
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+QUOTA_KEY = "quota:speech_requests"
+
+# Token bucket refilled at ARGV[1] tokens per second up to ARGV[2], on the Redis clock so every
+# worker sees the same time. A request takes ARGV[3] tokens, going into debt when the bucket is
+# short, and is told how long to wait until its turn; a request that would wait longer than
+# ARGV[4] seconds takes nothing. Returns {taken, wait}, the wait as a string to keep its fraction.
+TAKE_TOKENS_SCRIPT = """
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local rate, capacity = tonumber(ARGV[1]), tonumber(ARGV[2])
+local cost, max_wait = tonumber(ARGV[3]), tonumber(ARGV[4])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(state[1]) or capacity
+local updated = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - updated) * rate)
+local wait = math.max(0, (cost - tokens) / rate)
+local taken = 0
+if wait <= max_wait then
+    tokens = tokens - cost
+    taken = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil((capacity - tokens) / rate) + 60)
+return {taken, tostring(wait)}
+"""
+
+
+class QuotaExhausted(Exception):
+    pass
+
+_client = None
+_take_tokens = None
+
+def get_quota_client():
+    global _client, _take_tokens
+    if _client is None:
+        _client = redis.Redis.from_url(QUOTA_REDIS_URL)
+        _take_tokens = _client.register_script(TAKE_TOKENS_SCRIPT)
+    return _client
+
+#------------------------------------------------------------------------------------------------------
+# Function to wait for the turn of a Speech API request costing cost requests under the shared rate
+# limit; returns the seconds waited. Raises QuotaExhausted when the turn is more than max_wait away
+# (or, for a request charged several requests, more than their refill time), so the task can
+# give its worker slot back and retry later. Without Redis the request goes out unlimited.
+def acquire_speech_quota(cost=1, max_wait=SPEECH_QUOTA_MAX_WAIT_SECS):
+    if SPEECH_REQUESTS_PER_MIN <= 0:
+        return 0.0
+    rate = SPEECH_REQUESTS_PER_MIN / 60.0
+    if cost > 1:
+        max_wait = max(max_wait, cost / rate)
+    try:
+        get_quota_client()
+        taken, wait = _take_tokens(keys=[QUOTA_KEY], args=[rate, max(SPEECH_REQUESTS_BURST, cost), cost, max_wait])
+    except redis.RedisError as e:
+        print(f"Warning: Speech API rate limiter unavailable: {e}")
+        return 0.0
+
+    wait = float(wait)
+    if not taken:
+        raise QuotaExhausted(f"Speech API rate limit reached, next request in {wait:.1f}s")
+    if wait > 0:
+        time.sleep(wait)
+    observe("speech_quota_wait_seconds", wait)
+    return wait
+
+#------------------------------------------------------------------------------------------------------
+# Network errors of the Google client libraries that are not builtin ConnectionErrors: (module, class
+# names). Storage and Translation talk HTTP through requests and google-auth, and api_core raises
+# RetryError once its own retries of a transient error run out.
+TRANSIENT_ERROR_CLASSES = [
+    ("requests.exceptions", ("ConnectionError", "Timeout", "ChunkedEncodingError")),
+    ("google.auth.exceptions", ("TransportError",)),
+    ("google.api_core.exceptions", ("RetryError",)),
+]
+
+# Function to get the transient error types. Library types are looked up among the loaded modules
+# only: an error can't come from a module that isn't loaded, and the API process never loads them.
+def transient_error_types():
+    types = [QuotaExhausted, ConnectionError, TimeoutError]
+    for module_name, class_names in TRANSIENT_ERROR_CLASSES:
+        module = sys.modules.get(module_name)
+        if module is not None:
+            types += [getattr(module, name) for name in class_names if hasattr(module, name)]
+    return tuple(types)
+
+# Function to tell a transient failure (quota, timeout, server error, lost connection), worth
+# retrying later, from a permanent one. HTTP errors of the resumable GCS upload carry their
+# status on the response instead of a code.
+def is_retryable(error):
+    if isinstance(error, transient_error_types()):
+        return True
+    if getattr(error, "code", None) in RETRYABLE_STATUS_CODES:
+        return True
+    return getattr(getattr(error, "response", None), "status_code", None) in RETRYABLE_STATUS_CODES
+
+# Function to pick the delay before the given retry (0 for the first): full jitter over an
+# exponentially growing window, so tasks failed together don't come back together
+def retry_delay(retries):
+    return random.uniform(0, min(SPEECH_RETRY_MAX_SECS, SPEECH_RETRY_BASE_SECS * 2 ** retries))
+
+#------------------------------------------------------------------------------------------------------
+# A SpeechClient whose recognize and long running recognize calls wait for their turn under the
+# shared rate limit; everything else goes straight to the wrapped client. A long running recognition
+# is charged quota_cost requests (probe.speech_request_count of its audio), so a 30 minute file
+# costs what its 30 inline requests would, not what a 3 second clip does.
+class RateLimitedSpeechClient:
+    def __init__(self, client):
+        self.client = client
+
+    def recognize(self, *args, **kwargs):
+        acquire_speech_quota()
+        return self.client.recognize(*args, **kwargs)
+
+    def long_running_recognize(self, *args, quota_cost=1, **kwargs):
+        acquire_speech_quota(quota_cost)
+        return self.client.long_running_recognize(*args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
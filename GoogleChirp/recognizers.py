@@ -0,0 +1,182 @@
+import io
+import os
+import time
+import wave
+import audioop
+import datetime
+
+from google.cloud import speech
+
+from clients import get_speech_client
+from profiles import get_recognition_config
+
+
+# Recognizer backend: "google" (the Speech API) or "local" (offline, no credentials or network needed)
+RECOGNIZER_BACKEND = os.environ.get("RECOGNIZER_BACKEND", "google")
+
+# Local recognizer: frame length and the RMS level above which a frame counts as voiced
+LOCAL_FRAME_MS = 10
+LOCAL_VOICED_RMS = int(os.environ.get("LOCAL_VOICED_RMS", 500))
+
+# A pause at least this long between words starts a new result (seconds)
+LOCAL_PHRASE_PAUSE_SECS = 0.6
+
+# Latency the local recognizer simulates per request, plus per second of audio, to load test the
+# service with API-like timing (seconds)
+LOCAL_RECOGNIZER_LATENCY_SECS = float(os.environ.get("LOCAL_RECOGNIZER_LATENCY_SECS", 0))
+LOCAL_RECOGNIZER_SECS_PER_AUDIO_SEC = float(os.environ.get("LOCAL_RECOGNIZER_SECS_PER_AUDIO_SEC", 0))
+
+# Each voiced run is named by its dominant frequency (measured from the zero crossing rate): a run
+# at LOCAL_BASE_FREQ + n * LOCAL_FREQ_STEP Hz is heard as LOCAL_VOCABULARY[n]
+LOCAL_BASE_FREQ = 300
+LOCAL_FREQ_STEP = 100
+LOCAL_VOCABULARY = [
+    "alpha", "bravo", "charlie", "delta", "echo", "foxtrot", "golf", "hotel", "india", "juliett", "kilo", "lima",
+    "mike", "november", "oscar", "papa", "quebec", "romeo", "sierra", "tango", "uniform", "victor", "whiskey",
+    "xray", "yankee", "zulu",
+]
+
+
+#------------------------------------------------------------------------------------------------------
+# Function to flatten a Speech API response into plain dicts with word offsets in seconds
+def response_to_results(response):
+    results = []
+    for result in response.results:
+        for alternative in result.alternatives:
+            results.append({
+                "transcript": alternative.transcript,
+                "confidence": alternative.confidence,
+                "words": [
+                    {
+                        "word": word.word,
+                        "start": word.start_time.total_seconds(),
+                        "end": word.end_time.total_seconds(),
+                        "confidence": word.confidence,
+                    }
+                    for word in alternative.words
+                ],
+            })
+    return results
+
+#------------------------------------------------------------------------------------------------------
+# Recognizer backends take a short WAV clip (up to a minute) and return a Speech API RecognizeResponse
+# from recognize_response(), or the plain results of response_to_results() from recognize().
+# Anything with the same recognize() signature can be passed to the chunked engine.
+class Recognizer:
+    # Backend name, part of the result cache key so results of different backends never mix
+    name = None
+    # Whether audio over a minute can go to a long running operation; without it, it is always chunked
+    long_running = False
+
+    def recognize_response(self, wav_bytes, language_config="english"):
+        raise NotImplementedError
+
+    def recognize(self, wav_bytes, language_config="english"):
+        return response_to_results(self.recognize_response(wav_bytes, language_config))
+
+# The Speech API, through the pooled and rate limited clients (or the given client)
+class GoogleRecognizer(Recognizer):
+    name = "google"
+    long_running = True
+
+    def __init__(self, client=None):
+        self.client = client
+
+    def recognize_response(self, wav_bytes, language_config="english"):
+        client = self.client or get_speech_client()
+        config = get_recognition_config(language_config)
+        audio = speech.RecognitionAudio(content=wav_bytes)
+        return client.recognize(config=config, audio=audio)
+
+# Deterministic offline recognizer for development, load tests and running without network. Every
+# voiced run of the audio is reported as one word with its real offsets, named after its frequency,
+# so the same audio always gives the same transcript and tone fixtures give known words.
+class LocalRecognizer(Recognizer):
+    name = "local"
+
+    def __init__(self, latency=LOCAL_RECOGNIZER_LATENCY_SECS, secs_per_audio_sec=LOCAL_RECOGNIZER_SECS_PER_AUDIO_SEC,
+                 voiced_rms=LOCAL_VOICED_RMS):
+        self.latency = latency
+        self.secs_per_audio_sec = secs_per_audio_sec
+        self.voiced_rms = voiced_rms
+
+    def recognize_response(self, wav_bytes, language_config="english"):
+        language_code = get_recognition_config(language_config).language_code.lower()
+        with wave.open(io.BytesIO(wav_bytes), "rb") as wav:
+            rate, width = wav.getframerate(), wav.getsampwidth()
+            data = wav.readframes(wav.getnframes())
+            if wav.getnchannels() == 2:
+                data = audioop.tomono(data, width, 0.5, 0.5)
+        duration_secs = len(data) / float(width * rate)
+
+        results = []
+        for phrase in split_phrases(find_words(data, rate, width, self.voiced_rms)):
+            words = [
+                speech.WordInfo(
+                    word=word,
+                    start_time=datetime.timedelta(seconds=start),
+                    end_time=datetime.timedelta(seconds=end),
+                    confidence=confidence,
+                )
+                for word, start, end, confidence in phrase
+            ]
+            alternative = speech.SpeechRecognitionAlternative(
+                transcript=" ".join(word.word for word in words),
+                confidence=sum(word.confidence for word in words) / len(words),
+                words=words,
+            )
+            results.append(speech.SpeechRecognitionResult(
+                alternatives=[alternative],
+                result_end_time=datetime.timedelta(seconds=phrase[-1][2]),
+                language_code=language_code,
+            ))
+
+        time.sleep(self.latency + self.secs_per_audio_sec * duration_secs)
+        return speech.RecognizeResponse(results=results,
+                                        total_billed_time=datetime.timedelta(seconds=round(duration_secs)))
+
+# Function to find the voiced runs of mono PCM; returns (word, start, end, confidence) with offsets in seconds
+def find_words(data, rate, width, voiced_rms=LOCAL_VOICED_RMS):
+    frame = max(1, int(rate * LOCAL_FRAME_MS / 1000)) * width
+    bytes_per_sec = float(width * rate)
+    words, run_start, run_peak = [], None, 0
+    for offset in range(0, len(data) + frame, frame):
+        rms = audioop.rms(data[offset:offset + frame], width) if offset < len(data) else 0
+        if rms > voiced_rms:
+            run_start = offset if run_start is None else run_start
+            run_peak = max(run_peak, rms)
+        elif run_start is not None:
+            segment = data[run_start:offset]
+            freq = audioop.cross(segment, width) / 2 / (len(segment) / bytes_per_sec)
+            index = min(len(LOCAL_VOCABULARY) - 1, max(0, round((freq - LOCAL_BASE_FREQ) / LOCAL_FREQ_STEP)))
+            confidence = round(min(0.99, 0.5 + run_peak / 32768.0), 3)
+            words.append((LOCAL_VOCABULARY[index], run_start / bytes_per_sec, offset / bytes_per_sec, confidence))
+            run_start, run_peak = None, 0
+    return words
+
+# Function to group words into phrases at every pause of LOCAL_PHRASE_PAUSE_SECS or more
+def split_phrases(words):
+    phrases = []
+    for word in words:
+        if phrases and word[1] - phrases[-1][-1][2] < LOCAL_PHRASE_PAUSE_SECS:
+            phrases[-1].append(word)
+        else:
+            phrases.append([word])
+    return phrases
+
+#------------------------------------------------------------------------------------------------------
+RECOGNIZERS = {
+    "google": GoogleRecognizer,
+    "local": LocalRecognizer,
+}
+
+_recognizer = None
+
+# Function to get the process wide recognizer of RECOGNIZER_BACKEND
+def get_recognizer():
+    global _recognizer
+    if _recognizer is None:
+        if RECOGNIZER_BACKEND not in RECOGNIZERS:
+            raise ValueError(f"Unknown recognizer backend: {RECOGNIZER_BACKEND}")
+        _recognizer = RECOGNIZERS[RECOGNIZER_BACKEND]()
+    return _recognizer
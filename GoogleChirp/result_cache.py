@@ -0,0 +1,206 @@
+import os
+import json
+import time
+import wave
+import hashlib
+
+import redis
+
+
+# Cache backend for transcription results: "disk", "redis" or "off"
+RESULT_CACHE_BACKEND = os.environ.get("RESULT_CACHE_BACKEND", "disk")
+
+# How long a cached transcription stays valid (seconds)
+RESULT_CACHE_TTL_SECS = int(os.environ.get("RESULT_CACHE_TTL_SECS", 7 * 24 * 60 * 60))
+
+# Disk backend: cache directory and total size before the least recently used entries are evicted
+RESULT_CACHE_DIR = os.environ.get("RESULT_CACHE_DIR", "result_cache")
+RESULT_CACHE_MAX_BYTES = int(os.environ.get("RESULT_CACHE_MAX_BYTES", 512 * 1024 * 1024))
+
+# Redis backend: connection and number of entries before the least recently used are evicted
+RESULT_CACHE_REDIS_URL = os.environ.get("RESULT_CACHE_REDIS_URL", "redis://localhost:6379/2")
+RESULT_CACHE_MAX_ENTRIES = int(os.environ.get("RESULT_CACHE_MAX_ENTRIES", 10000))
+
+# Hit/miss counters are kept in Redis so every worker process adds to the same numbers
+RESULT_CACHE_STATS_KEY = "result_cache:stats"
+
+
+#------------------------------------------------------------------------------------------------------
+# Function to fingerprint a RecognitionConfig so any change in language, model or options changes the key.
+# Results of another recognizer backend get their own keys (Google keys are unchanged).
+def config_fingerprint(config, backend="google"):
+    from google.protobuf.json_format import MessageToJson
+
+    config_json = MessageToJson(type(config).pb(config), sort_keys=True, indent=None)
+    if backend != "google":
+        config_json = f"{backend}:{config_json}"
+    return hashlib.sha256(config_json.encode("utf-8")).hexdigest()
+
+#------------------------------------------------------------------------------------------------------
+# Function to start a PCM hash; fed with the samples it gives the same fingerprint as pcm_fingerprint
+def new_pcm_hasher(framerate, nchannels, sampwidth):
+    return hashlib.sha256(f"{framerate}:{nchannels}:{sampwidth}".encode("utf-8"))
+
+# Function to hash the normalized PCM samples of a WAV, ignoring header differences
+def pcm_fingerprint(wav_path, block_frames=64 * 1024):
+    with wave.open(wav_path, "rb") as wav:
+        sha256 = new_pcm_hasher(wav.getframerate(), wav.getnchannels(), wav.getsampwidth())
+        while True:
+            frames = wav.readframes(block_frames)
+            if not frames:
+                break
+            sha256.update(frames)
+    return sha256.hexdigest()
+
+#------------------------------------------------------------------------------------------------------
+# Function to build a cache key from an audio hash ("upload" or "pcm" kind) and a config fingerprint
+def make_cache_key(kind, audio_hash, config_hash):
+    return hashlib.sha256(f"{kind}:{audio_hash}:{config_hash}".encode("utf-8")).hexdigest()
+
+#------------------------------------------------------------------------------------------------------
+class ResultCache:
+    def __init__(self, stats_url=RESULT_CACHE_REDIS_URL):
+        self.stats_client = redis.Redis.from_url(stats_url)
+
+    def record(self, event):
+        try:
+            self.stats_client.hincrby(RESULT_CACHE_STATS_KEY, event, 1)
+        except redis.RedisError as e:
+            print(f"Warning: Could not record cache {event}: {e}")
+
+    def lookup(self, key):
+        value = self.get(key)
+        self.record("hits" if value is not None else "misses")
+        return value
+
+    def stats(self):
+        try:
+            counters = self.stats_client.hgetall(RESULT_CACHE_STATS_KEY)
+        except redis.RedisError as e:
+            return {"error": str(e)}
+        stats = {"backend": RESULT_CACHE_BACKEND, "hits": 0, "misses": 0}
+        stats.update({name.decode(): int(count) for name, count in counters.items()})
+        return stats
+
+    def get(self, key):
+        raise NotImplementedError
+
+    def set(self, key, value):
+        raise NotImplementedError
+
+
+class DiskResultCache(ResultCache):
+    def __init__(self, directory=RESULT_CACHE_DIR, ttl=RESULT_CACHE_TTL_SECS, max_bytes=RESULT_CACHE_MAX_BYTES, **kwargs):
+        super().__init__(**kwargs)
+        self.directory = directory
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + ".json")
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, "r") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if entry["expires_at"] < time.time():
+            self._remove(path)
+            return None
+        # Touch the file so size based eviction drops the least recently used entries first
+        os.utime(path, None)
+        return entry["value"]
+
+    def set(self, key, value):
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"expires_at": time.time() + self.ttl, "value": value}, f)
+        os.replace(tmp_path, path)
+        self.evict()
+
+    def evict(self):
+        now = time.time()
+        entries = []
+        total = 0
+        for name in os.listdir(self.directory):
+            if not name.endswith(".json"):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            if stat.st_mtime + self.ttl < now:
+                self._remove(path)
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+
+        entries.sort()
+        while total > self.max_bytes and entries:
+            _, size, path = entries.pop(0)
+            self._remove(path)
+            total -= size
+            self.record("evictions")
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+class RedisResultCache(ResultCache):
+    prefix = "result_cache:entry:"
+    index_key = "result_cache:lru"
+
+    def __init__(self, url=RESULT_CACHE_REDIS_URL, ttl=RESULT_CACHE_TTL_SECS, max_entries=RESULT_CACHE_MAX_ENTRIES):
+        super().__init__(stats_url=url)
+        self.client = self.stats_client
+        self.ttl = ttl
+        self.max_entries = max_entries
+
+    def get(self, key):
+        value = self.client.get(self.prefix + key)
+        if value is None:
+            return None
+        self.client.zadd(self.index_key, {key: time.time()})
+        return json.loads(value)
+
+    def set(self, key, value):
+        now = time.time()
+        pipe = self.client.pipeline()
+        pipe.set(self.prefix + key, json.dumps(value), ex=self.ttl)
+        pipe.zadd(self.index_key, {key: now})
+        # Entries older than the TTL have already expired in Redis, drop them from the index
+        pipe.zremrangebyscore(self.index_key, 0, now - self.ttl)
+        pipe.execute()
+        self.evict()
+
+    def evict(self):
+        overflow = self.client.zcard(self.index_key) - self.max_entries
+        if overflow <= 0:
+            return
+        keys = [key.decode() for key in self.client.zrange(self.index_key, 0, overflow - 1)]
+        pipe = self.client.pipeline()
+        pipe.delete(*[self.prefix + key for key in keys])
+        pipe.zrem(self.index_key, *keys)
+        pipe.hincrby(RESULT_CACHE_STATS_KEY, "evictions", len(keys))
+        pipe.execute()
+
+#------------------------------------------------------------------------------------------------------
+_result_cache = None
+
+# Function to get the process wide result cache for the configured backend (None when turned off)
+def get_result_cache():
+    global _result_cache
+    if _result_cache is None:
+        if RESULT_CACHE_BACKEND == "redis":
+            _result_cache = RedisResultCache()
+        elif RESULT_CACHE_BACKEND == "disk":
+            _result_cache = DiskResultCache()
+    return _result_cache
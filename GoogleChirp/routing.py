@@ -0,0 +1,141 @@
+import os
+import time
+
+import redis
+from celery.signals import task_prerun
+from kombu import Queue
+
+from metrics import observe
+from probe import estimate_cost, probe_audio
+from profiles import RECOGNITION_PROFILES, resolve_profile
+
+
+# Audio up to this long goes to the interactive queues, longer audio to the long queues (seconds)
+INTERACTIVE_MAX_SECS = float(os.environ.get("INTERACTIVE_MAX_SECS", 5 * 60))
+
+# Time limits per tier: a base plus an allowance per second of audio (seconds)
+TIER_TIME_LIMITS = {
+    "interactive": {"base": 120, "per_audio_sec": 1.0},
+    "long": {"base": 600, "per_audio_sec": 0.5},
+    "bulk": {"base": 600, "per_audio_sec": 0.5},
+}
+
+# Extra time allowed per second of audio when the file must be transcoded first (seconds)
+TRANSCODE_SECS_PER_AUDIO_SEC = float(os.environ.get("TRANSCODE_SECS_PER_AUDIO_SEC", 0.1))
+
+# Seconds of audio per priority step; the Redis broker serves priority 0 first
+PRIORITY_STEP_SECS = 120
+PRIORITY_STEPS = list(range(10))
+
+
+# Queue of the translations run right after transcription (translation.TRANSLATE_PROFILES)
+TRANSLATION_QUEUE = "translation"
+
+# Recent queue wait times kept per queue for the stats endpoint
+QUEUE_STATS_REDIS_URL = os.environ.get("QUEUE_STATS_REDIS_URL", "redis://localhost:6379/1")
+QUEUE_WAIT_SAMPLES = 1000
+
+
+#------------------------------------------------------------------------------------------------------
+# Function to list every queue name, "<tier>.<profile>", and the translation queue
+def queue_names():
+    return [f"{tier}.{profile}" for tier in TIER_TIME_LIMITS for profile in RECOGNITION_PROFILES] + [TRANSLATION_QUEUE]
+
+# Function to get the Celery settings declaring the queues and enabling priorities on the Redis broker.
+# Priorities order the tasks inside each queue; the queues a worker consumes are served round robin,
+# so steady traffic on one profile's queue never starves the others of the same pool.
+def celery_routing_config():
+    return {
+        "task_queues": [Queue(name) for name in queue_names()],
+        "task_default_queue": "interactive.english",
+        "broker_transport_options": {
+            "priority_steps": PRIORITY_STEPS,
+            "sep": ":",
+        },
+    }
+
+#------------------------------------------------------------------------------------------------------
+# Function to build the apply_async options (queue, priority, time limits) for a transcription from
+# the cost estimate of its probe: the billed audio picks the tier and the priority, and files that
+# must be transcoded get more time. The probe taken at upload (probe.probe_audio) and the estimate
+# travel with the task as headers; the worker charges the rate limiter by the estimate.
+def route_transcription(audio_path, language_config="english", bulk=False, probe=None):
+    probe = probe or probe_audio(audio_path)
+    cost = estimate_cost(probe)
+    billed_secs = cost["billed_secs"]
+    if bulk:
+        tier = "bulk"
+    elif billed_secs <= INTERACTIVE_MAX_SECS:
+        tier = "interactive"
+    else:
+        tier = "long"
+
+    limits = TIER_TIME_LIMITS[tier]
+    per_audio_sec = limits["per_audio_sec"] + (TRANSCODE_SECS_PER_AUDIO_SEC if cost["transcode"] else 0)
+    soft_time_limit = int(limits["base"] + per_audio_sec * billed_secs)
+    return {
+        "queue": f"{tier}.{resolve_profile(language_config)}",
+        # Cheaper audio is served first within a queue
+        "priority": min(PRIORITY_STEPS[-1], int(billed_secs // PRIORITY_STEP_SECS)),
+        "soft_time_limit": soft_time_limit,
+        "time_limit": soft_time_limit + 60,
+        "headers": {
+            "enqueued_at": time.time(),
+            "audio_duration_secs": probe["duration_secs"],
+            "audio_probe": probe,
+            "audio_cost": cost,
+        },
+    }
+
+#------------------------------------------------------------------------------------------------------
+_stats_client = None
+
+def get_queue_stats_client():
+    global _stats_client
+    if _stats_client is None:
+        _stats_client = redis.Redis.from_url(QUEUE_STATS_REDIS_URL)
+    return _stats_client
+
+# Function to read a header set by route_transcription from a task request
+def task_header(request, name):
+    return getattr(request, name, None) or (request.headers or {}).get(name)
+
+# Record how long each routed task waited in its queue, measured when a worker picks it up.
+# A retried task keeps its first enqueue time, so its retries are not counted.
+@task_prerun.connect
+def record_queue_wait(task=None, **kwargs):
+    request = task.request
+    enqueued_at = task_header(request, "enqueued_at")
+    queue = (request.delivery_info or {}).get("routing_key")
+    if not enqueued_at or not queue or request.retries:
+        return
+    wait_secs = time.time() - float(enqueued_at)
+    observe("celery_queue_wait_seconds", wait_secs, queue=queue)
+    try:
+        key = f"queue_stats:wait:{queue}"
+        pipe = get_queue_stats_client().pipeline()
+        pipe.lpush(key, round(wait_secs, 3))
+        pipe.ltrim(key, 0, QUEUE_WAIT_SAMPLES - 1)
+        pipe.execute()
+    except redis.RedisError as e:
+        print(f"Warning: Could not record queue wait for {queue}: {e}")
+
+#------------------------------------------------------------------------------------------------------
+# Function to report each queue's depth and recent wait times, for sizing the worker pools
+def queue_stats(broker_client):
+    stats = {}
+    for name in queue_names():
+        # The Redis broker keeps one list per priority step, "<queue>:<priority>" except for 0
+        depth = sum(
+            broker_client.llen(name if priority == 0 else f"{name}:{priority}")
+            for priority in PRIORITY_STEPS
+        )
+        waits = sorted(float(wait) for wait in get_queue_stats_client().lrange(f"queue_stats:wait:{name}", 0, -1))
+        stats[name] = {
+            "depth": depth,
+            "wait_samples": len(waits),
+            "wait_p50_s": waits[len(waits) // 2] if waits else None,
+            "wait_p95_s": waits[min(len(waits) - 1, int(len(waits) * 0.95))] if waits else None,
+            "wait_max_s": waits[-1] if waits else None,
+        }
+    return stats
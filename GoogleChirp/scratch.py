@@ -0,0 +1,162 @@
+import os
+import time
+import shutil
+import datetime
+from contextlib import contextmanager
+
+
+# Directory holding the uploads waiting for (or in) transcription
+UPLOAD_DIR = "uploads_audios"
+
+# Directory holding one workspace per running task, for its processed audio
+SCRATCH_DIR = os.environ.get("SCRATCH_DIR", "scratch")
+
+# RAM-backed directory (e.g. /dev/shm/chirp) for the workspaces of short clips; empty turns it off
+SCRATCH_TMPFS_DIR = os.environ.get("SCRATCH_TMPFS_DIR", "")
+
+# Clips up to this long get a RAM-backed workspace, and only while the tmpfs has this much free (seconds, bytes)
+SCRATCH_TMPFS_MAX_SECS = float(os.environ.get("SCRATCH_TMPFS_MAX_SECS", 120))
+SCRATCH_TMPFS_MIN_FREE_BYTES = int(os.environ.get("SCRATCH_TMPFS_MIN_FREE_BYTES", 256 * 1024 * 1024))
+
+# Disk quota of uploads and workspaces together, and free space kept on their disk. New uploads are
+# refused (503 with Retry-After) while either is exceeded (bytes).
+SCRATCH_QUOTA_BYTES = int(os.environ.get("SCRATCH_QUOTA_BYTES", 20 * 1024 * 1024 * 1024))
+SCRATCH_MIN_FREE_BYTES = int(os.environ.get("SCRATCH_MIN_FREE_BYTES", 1024 * 1024 * 1024))
+SCRATCH_RETRY_AFTER_SECS = 30
+
+# Seconds a measured disk usage is reused before the directories are walked again
+SCRATCH_USAGE_TTL_SECS = 5
+
+# The sweeper removes uploads, workspaces and GCS temp blobs older than these (seconds). A running
+# task never outlives its time limit, and a GCS blob never outlives its operation's deadline.
+SCRATCH_SWEEP_INTERVAL_SECS = int(os.environ.get("SCRATCH_SWEEP_INTERVAL_SECS", 600))
+SCRATCH_UPLOAD_MAX_AGE_SECS = int(os.environ.get("SCRATCH_UPLOAD_MAX_AGE_SECS", 24 * 60 * 60))
+SCRATCH_WORKSPACE_MAX_AGE_SECS = int(os.environ.get("SCRATCH_WORKSPACE_MAX_AGE_SECS", 6 * 60 * 60))
+SCRATCH_BLOB_MAX_AGE_SECS = int(os.environ.get("SCRATCH_BLOB_MAX_AGE_SECS", 12 * 60 * 60))
+
+# Name prefix of every temporary audio blob
+TEMP_BLOB_PREFIX = "temp_audio_"
+
+
+class ScratchFull(Exception):
+    pass
+
+#------------------------------------------------------------------------------------------------------
+# A task's private scratch directory, where the pipeline writes its processed audio, plus the owned
+# files outside it (the task's upload); cleanup() removes both. disown() keeps a file, such as the
+# upload of a task that will be retried.
+class Workspace:
+    def __init__(self, path, owned=()):
+        self.path = path
+        self.owned = list(owned)
+
+    def disown(self, path):
+        if path in self.owned:
+            self.owned.remove(path)
+
+    def cleanup(self):
+        shutil.rmtree(self.path, ignore_errors=True)
+        for path in self.owned:
+            try:
+                os.remove(path)
+                print(f"Cleaned up {path}")
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                print(f"Warning: Could not remove {path}: {e}")
+
+# Function to pick the root of a new workspace: the tmpfs for short clips while it has room, else disk
+def workspace_root(duration_secs=None):
+    if SCRATCH_TMPFS_DIR and duration_secs is not None and duration_secs <= SCRATCH_TMPFS_MAX_SECS:
+        try:
+            os.makedirs(SCRATCH_TMPFS_DIR, exist_ok=True)
+            if shutil.disk_usage(SCRATCH_TMPFS_DIR).free >= SCRATCH_TMPFS_MIN_FREE_BYTES:
+                return SCRATCH_TMPFS_DIR
+        except OSError as e:
+            print(f"Warning: tmpfs scratch {SCRATCH_TMPFS_DIR} unavailable: {e}")
+    return SCRATCH_DIR
+
+# Gives a task its workspace, and removes it with every owned file however the task ends
+@contextmanager
+def task_workspace(task_id, duration_secs=None, owned=()):
+    workspace = Workspace(os.path.join(workspace_root(duration_secs), task_id), owned)
+    os.makedirs(workspace.path, exist_ok=True)
+    try:
+        yield workspace
+    finally:
+        workspace.cleanup()
+
+#------------------------------------------------------------------------------------------------------
+_usage = {"measured_at": 0.0, "bytes": 0}
+
+# Function to sum the size of every file under the given directories
+def directory_bytes(*paths):
+    total = 0
+    for path in paths:
+        for root, _, files in os.walk(path):
+            for name in files:
+                try:
+                    total += os.lstat(os.path.join(root, name)).st_size
+                except OSError:
+                    pass
+    return total
+
+# Function to get the disk used by uploads and workspaces, measured at most every SCRATCH_USAGE_TTL_SECS
+def scratch_usage_bytes():
+    now = time.time()
+    if now - _usage["measured_at"] > SCRATCH_USAGE_TTL_SECS:
+        _usage["bytes"] = directory_bytes(UPLOAD_DIR, SCRATCH_DIR)
+        _usage["measured_at"] = now
+    return _usage["bytes"]
+
+# Function to refuse intake of incoming_bytes more when the quota or the free disk space would be exceeded
+def check_intake(incoming_bytes=0):
+    used = scratch_usage_bytes()
+    if used + incoming_bytes > SCRATCH_QUOTA_BYTES:
+        raise ScratchFull(f"Scratch storage is full ({used} of {SCRATCH_QUOTA_BYTES} bytes used), retry later")
+    free = shutil.disk_usage(UPLOAD_DIR if os.path.isdir(UPLOAD_DIR) else ".").free
+    if free - incoming_bytes < SCRATCH_MIN_FREE_BYTES:
+        raise ScratchFull(f"Not enough free disk space ({free} bytes free), retry later")
+
+#------------------------------------------------------------------------------------------------------
+# Function to remove uploads and workspaces left behind by killed workers, except the uploads of
+# batch items still waiting or running (keep is a set of paths); returns how many were removed
+def sweep_local_files(now=None, keep=()):
+    now = now or time.time()
+    keep = {os.path.abspath(path) for path in keep}
+    removed = 0
+    for root, max_age in ((UPLOAD_DIR, SCRATCH_UPLOAD_MAX_AGE_SECS), (SCRATCH_DIR, SCRATCH_WORKSPACE_MAX_AGE_SECS),
+                          (SCRATCH_TMPFS_DIR, SCRATCH_WORKSPACE_MAX_AGE_SECS)):
+        if not root or not os.path.isdir(root):
+            continue
+        for entry in os.scandir(root):
+            try:
+                if os.path.abspath(entry.path) in keep:
+                    continue
+                if now - entry.stat(follow_symlinks=False).st_mtime < max_age:
+                    continue
+                if entry.is_dir(follow_symlinks=False):
+                    shutil.rmtree(entry.path)
+                else:
+                    os.remove(entry.path)
+                removed += 1
+                print(f"Swept orphaned scratch file {entry.path}")
+            except OSError as e:
+                print(f"Warning: Could not sweep {entry.path}: {e}")
+    return removed
+
+# Function to delete temporary audio blobs older than SCRATCH_BLOB_MAX_AGE_SECS, except those of the
+# operations still pending (keep is a set of blob names); returns how many were deleted
+def sweep_temp_blobs(storage_client, bucket_name, keep=()):
+    cutoff = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(seconds=SCRATCH_BLOB_MAX_AGE_SECS)
+    removed = 0
+    for blob in storage_client.list_blobs(bucket_name, prefix=TEMP_BLOB_PREFIX):
+        if blob.name in keep or blob.time_created is None or blob.time_created > cutoff:
+            continue
+        try:
+            blob.delete()
+            removed += 1
+            print(f"Swept orphaned blob gs://{bucket_name}/{blob.name}")
+        except Exception as e:
+            print(f"Warning: Could not sweep gs://{bucket_name}/{blob.name}: {e}")
+    return removed
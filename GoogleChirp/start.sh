@@ -23,10 +23,22 @@ if [ ! -f "credentials.json" ]; then
     exit 1
 fi
 
-# Start Celery worker in background
-echo "🔧 Starting Celery worker..."
-celery -A app worker --loglevel=info &
-CELERY_PID=$!
+# Start one Celery worker pool per tier in background
+# Interactive: short dictations and transcript translations, many slots. Long/bulk: hour-long files, few slots, one task prefetched at a time.
+echo "🔧 Starting Celery workers..."
+celery -A worker worker -n interactive@%h -Q interactive.english,interactive.georgian,translation \
+    --concurrency=${INTERACTIVE_CONCURRENCY:-4} --prefetch-multiplier=${INTERACTIVE_PREFETCH:-4} --loglevel=info &
+INTERACTIVE_PID=$!
+celery -A worker worker -n long@%h -Q long.english,long.georgian \
+    --concurrency=${LONG_CONCURRENCY:-2} --prefetch-multiplier=1 --loglevel=info &
+LONG_PID=$!
+celery -A worker worker -n bulk@%h -Q bulk.english,bulk.georgian \
+    --concurrency=${BULK_CONCURRENCY:-2} --prefetch-multiplier=1 --loglevel=info &
+BULK_PID=$!
+
+# Scheduler for the periodic check of pending long running operations
+celery -A celery_app beat --loglevel=info &
+BEAT_PID=$!
 
 # Wait a moment for Celery to start
 sleep 3
@@ -36,12 +48,12 @@ echo "🌐 Starting FastAPI server..."
 echo "📖 API Documentation will be available at: http://localhost:8000/docs"
 echo "🔄 ReDoc will be available at: http://localhost:8000/redoc"
 
-uvicorn app:fastapi_app --host 0.0.0.0 --port 8000 --reload
+uvicorn api:fastapi_app --host 0.0.0.0 --port 8000 --reload
 
 # Cleanup function
 cleanup() {
     echo "🛑 Shutting down services..."
-    kill $CELERY_PID 2>/dev/null
+    kill $INTERACTIVE_PID $LONG_PID $BULK_PID $BEAT_PID 2>/dev/null
     pkill -f "celery.*worker" 2>/dev/null
     exit 0
 }
@@ -0,0 +1,134 @@
+import os
+import json
+import asyncio
+
+import redis
+import redis.asyncio
+
+
+# Redis used for task progress pub/sub
+TASK_EVENTS_REDIS_URL = os.environ.get("TASK_EVENTS_REDIS_URL", "redis://localhost:6379/1")
+
+# Channel prefix; each task publishes on TASK_EVENTS_CHANNEL_PREFIX + task_id
+TASK_EVENTS_CHANNEL_PREFIX = "task_events:"
+
+# Latest progress event of each task is kept this long for clients that connect late (seconds)
+TASK_EVENTS_LAST_TTL_SECS = int(os.environ.get("TASK_EVENTS_LAST_TTL_SECS", 60 * 60))
+
+# Seconds between keepalive comments on an idle event stream; the task's stored state is checked
+# again at each one, so a stream never outlives a task whose result event was missed
+TASK_EVENTS_KEEPALIVE_SECS = 15
+
+# Longest a new stream waits for the shared listener to be subscribed (seconds)
+TASK_EVENTS_SUBSCRIBE_TIMEOUT_SECS = 5
+
+
+#------------------------------------------------------------------------------------------------------
+# Worker side: publishing
+#------------------------------------------------------------------------------------------------------
+_publisher = None
+
+# Function to publish a task event; failures are logged and never break the task
+def publish_task_event(task_id, event_type, **data):
+    global _publisher
+    if not task_id:
+        return
+    event = dict(data, type=event_type, task_id=task_id)
+    try:
+        if _publisher is None:
+            _publisher = redis.Redis.from_url(TASK_EVENTS_REDIS_URL)
+        payload = json.dumps(event)
+        pipe = _publisher.pipeline()
+        pipe.publish(TASK_EVENTS_CHANNEL_PREFIX + task_id, payload)
+        if event_type == "progress":
+            pipe.set(TASK_EVENTS_CHANNEL_PREFIX + "last:" + task_id, payload, ex=TASK_EVENTS_LAST_TTL_SECS)
+        pipe.execute()
+    except redis.RedisError as e:
+        print(f"Warning: Could not publish {event_type} event for task {task_id}: {e}")
+
+#------------------------------------------------------------------------------------------------------
+# API side: one shared pub/sub listener per process fanning events out to per-client queues
+#------------------------------------------------------------------------------------------------------
+class TaskEventHub:
+    def __init__(self, url=TASK_EVENTS_REDIS_URL):
+        self.url = url
+        self.subscribers = {}
+        self.listener = None
+        self.client = None
+        # Set while the listener's pattern subscription is active
+        self.subscribed = asyncio.Event()
+
+    # Returns once the listener is subscribed, so every event published after this returns reaches
+    # the queue. Without Redis it gives up after TASK_EVENTS_SUBSCRIBE_TIMEOUT_SECS and the stream
+    # relies on its keepalive checks.
+    async def subscribe(self, task_id):
+        queue = asyncio.Queue(maxsize=100)
+        self.subscribers.setdefault(task_id, set()).add(queue)
+        if self.listener is None or self.listener.done():
+            self.listener = asyncio.create_task(self.listen())
+        try:
+            await asyncio.wait_for(self.subscribed.wait(), TASK_EVENTS_SUBSCRIBE_TIMEOUT_SECS)
+        except asyncio.TimeoutError:
+            print(f"Warning: Task event listener not subscribed, task {task_id} falls back to checks")
+        return queue
+
+    def unsubscribe(self, task_id, queue):
+        queues = self.subscribers.get(task_id)
+        if queues is None:
+            return
+        queues.discard(queue)
+        if not queues:
+            del self.subscribers[task_id]
+
+    async def last_event(self, task_id):
+        if self.client is None:
+            self.client = redis.asyncio.Redis.from_url(self.url)
+        payload = await self.client.get(TASK_EVENTS_CHANNEL_PREFIX + "last:" + task_id)
+        return json.loads(payload) if payload else None
+
+    async def listen(self):
+        # A single pattern subscription receives the events of every task
+        while True:
+            client = redis.asyncio.Redis.from_url(self.url)
+            pubsub = client.pubsub()
+            try:
+                await pubsub.psubscribe(TASK_EVENTS_CHANNEL_PREFIX + "*")
+                self.subscribed.set()
+                async for message in pubsub.listen():
+                    if message["type"] != "pmessage":
+                        continue
+                    task_id = message["channel"].decode()[len(TASK_EVENTS_CHANNEL_PREFIX):]
+                    if task_id not in self.subscribers:
+                        continue
+                    event = json.loads(message["data"])
+                    for queue in list(self.subscribers.get(task_id, ())):
+                        try:
+                            queue.put_nowait(event)
+                        except asyncio.QueueFull:
+                            # A slow client only misses intermediate progress, never the final event
+                            queue.get_nowait()
+                            queue.put_nowait(event)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Warning: Task event listener failed, reconnecting: {e}")
+                await asyncio.sleep(1)
+            finally:
+                self.subscribed.clear()
+                await pubsub.close()
+                await client.close()
+
+
+_hub = None
+
+# Function to get the process wide event hub
+def get_task_event_hub():
+    global _hub
+    if _hub is None:
+        _hub = TaskEventHub()
+    return _hub
+
+#------------------------------------------------------------------------------------------------------
+# Function to format one Server-Sent Event
+def format_sse(event_type, data):
+    return f"event: {event_type}\ndata: {json.dumps(data, default=str)}\n\n"
@@ -0,0 +1,50 @@
+import os
+import sys
+import wave
+import math
+import struct
+
+import pytest
+
+APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, APP_DIR)
+
+# Everything runs offline: no result cache on disk and the Speech API backend unless a test picks another
+os.environ.setdefault("RESULT_CACHE_BACKEND", "off")
+os.environ.setdefault("RECOGNIZER_BACKEND", "google")
+
+
+# Every Redis client the modules create talks to one in-memory server per test. The Lua scripts
+# (rate limiter, operations) need fakeredis with Lua support: pip install "fakeredis[lua]".
+@pytest.fixture
+def fake_redis(monkeypatch):
+    import redis
+    import fakeredis
+    import quota, metrics, batches, partials, routing, operations, task_events, translation
+
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr(redis.Redis, "from_url", classmethod(lambda cls, url, **kwargs: fakeredis.FakeRedis(server=server)))
+    for module in (quota, metrics, batches, partials, operations, translation):
+        monkeypatch.setattr(module, "_client", None)
+    monkeypatch.setattr(quota, "_take_tokens", None)
+    monkeypatch.setattr(operations, "_claim_due", None)
+    monkeypatch.setattr(routing, "_stats_client", None)
+    monkeypatch.setattr(task_events, "_publisher", None)
+    return fakeredis.FakeRedis(server=server)
+
+# Function to write a 16 kHz mono WAV of tones, given as (frequency, seconds); frequency 0 is silence
+def write_tones(path, tones, rate=16000, amplitude=12000):
+    frames = bytearray()
+    for freq, secs in tones:
+        for n in range(int(secs * rate)):
+            frames += struct.pack("<h", int(amplitude * math.sin(2 * math.pi * freq * n / rate)) if freq else 0)
+    with wave.open(str(path), "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(rate)
+        wav.writeframes(bytes(frames))
+    return str(path)
+
+@pytest.fixture
+def make_wav(tmp_path):
+    return lambda name, tones: write_tones(tmp_path / name, tones)
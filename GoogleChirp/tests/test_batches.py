@@ -0,0 +1,74 @@
+import os
+
+import pytest
+
+import batches
+from batches import (
+    batch_done_count, batch_queue_length, create_batch, dispatch_batch_items, finish_batch_item, read_batch_done,
+    running_batch_items,
+)
+
+PROBE = {"duration_secs": 2.0, "sample_rate": 16000, "channels": 1, "codec": "pcm_s16le", "format": "wav"}
+
+
+# Stand-in for celery_app.send_task recording the queued task IDs, failing the ones in failing
+class FakeSender:
+    def __init__(self, failing=()):
+        self.failing = set(failing)
+        self.sent = []
+
+    def __call__(self, name, args=(), task_id=None, **options):
+        if task_id in self.failing:
+            raise ConnectionError("broker unavailable")
+        self.sent.append(task_id)
+
+@pytest.fixture
+def batch(tmp_path, fake_redis):
+    def make(count, concurrency=2):
+        items = []
+        for n in range(count):
+            path = tmp_path / f"{n}.wav"
+            path.write_bytes(b"audio")
+            items.append({"audio_path": str(path), "upload_sha256": str(n), "probe": PROBE})
+        return create_batch(items, "english", concurrency)
+    return make
+
+#------------------------------------------------------------------------------------------------------
+def test_items_are_dispatched_as_slots_free_up(batch, monkeypatch):
+    sender = FakeSender()
+    monkeypatch.setattr(batches, "send_task", sender)
+    batch_id, items = batch(4)
+
+    dispatch_batch_items(batch_id, 2)
+    assert sender.sent == [item["task_id"] for item in items[:2]]
+    assert {item["task_id"] for _, item in running_batch_items()} == set(sender.sent)
+
+    finish_batch_item(batch_id, items[0]["task_id"], {"transcription": []})
+    assert sender.sent[-1] == items[2]["task_id"]
+    assert batch_queue_length(batch_id) == 1
+
+def test_an_item_that_cannot_be_queued_is_finished_with_the_error(batch, monkeypatch):
+    batch_id, items = batch(4)
+    sender = FakeSender(failing={items[0]["task_id"], items[1]["task_id"]})
+    monkeypatch.setattr(batches, "send_task", sender)
+
+    dispatch_batch_items(batch_id, 2)
+
+    # The failed items are done, their uploads removed, and the next items took their slots
+    done, _ = read_batch_done(batch_id)
+    assert [entry["task_id"] for entry in done] == [items[0]["task_id"], items[1]["task_id"]]
+    assert all("broker unavailable" in entry["result"]["error"] for entry in done)
+    assert not any(os.path.exists(item["audio_path"]) for item in items[:2])
+    assert sender.sent == [items[2]["task_id"], items[3]["task_id"]]
+    assert {item["task_id"] for _, item in running_batch_items()} == set(sender.sent)
+    assert batch_queue_length(batch_id) == 0
+
+def test_a_batch_completes_when_the_broker_is_down(batch, monkeypatch):
+    batch_id, items = batch(5)
+    monkeypatch.setattr(batches, "send_task", FakeSender(failing={item["task_id"] for item in items}))
+
+    dispatch_batch_items(batch_id, 2)
+
+    assert batch_done_count(batch_id) == 5
+    assert running_batch_items() == []
+    assert not batches.get_batch_client().sismember(batches.ACTIVE_BATCHES_KEY, batch_id)
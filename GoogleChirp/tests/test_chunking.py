@@ -0,0 +1,146 @@
+import threading
+
+import pytest
+from google.api_core import exceptions
+
+import chunking
+from chunking import merge_chunk_results, plan_chunks, recognize_chunks
+from recognizers import LOCAL_BASE_FREQ, LOCAL_FREQ_STEP, LOCAL_VOCABULARY, LocalRecognizer
+
+WORD_SECS = 0.5
+GAP_SECS = 0.25
+
+# Tones up to 800 Hz: a voiced run is measured to the 10 ms frame, which for high tones can be
+# enough to name them after their neighbour
+WORDS_USED = 6
+
+# Small chunks keep the fixtures short while giving every file many cut points
+CHUNK_SECS = 10
+OVERLAP_SECS = 1
+SEARCH_SECS = 2
+
+
+# Function to build a tone fixture of words back to back; returns the tones and the expected
+# (word, start, end) of each, the local recognizer naming every tone after its frequency
+def spoken_words(count):
+    tones, expected, position = [], [], 0.0
+    for n in range(count):
+        index = n % WORDS_USED
+        tones += [(LOCAL_BASE_FREQ + index * LOCAL_FREQ_STEP, WORD_SECS), (0, GAP_SECS)]
+        expected.append((LOCAL_VOCABULARY[index], position, position + WORD_SECS))
+        position += WORD_SECS + GAP_SECS
+    return tones, expected
+
+# Function to recognize a file chunk by chunk and merge it; returns (chunks, merged words)
+def recognize_file(path):
+    chunks = plan_chunks(path, CHUNK_SECS, OVERLAP_SECS, SEARCH_SECS)
+    results = recognize_chunks(path, chunks, LocalRecognizer(), max_workers=4)
+    merged = merge_chunk_results(results, with_words=True)
+    return chunks, [word for entry in merged for word in entry["words"]]
+
+# Local recognizer failing the given calls (numbered from 1, in call order) with the given error
+class FlakyRecognizer(LocalRecognizer):
+    def __init__(self, error, failing_calls):
+        super().__init__()
+        self.error = error
+        self.failing_calls = set(failing_calls)
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def recognize(self, wav_bytes, language_config="english"):
+        with self.lock:
+            self.calls += 1
+            call = self.calls
+        if call in self.failing_calls:
+            raise self.error
+        return super().recognize(wav_bytes, language_config)
+
+@pytest.fixture
+def long_file(make_wav):
+    tones, expected = spoken_words(60)
+    return make_wav("long.wav", tones), expected
+
+#------------------------------------------------------------------------------------------------------
+def test_every_word_is_kept_once_and_in_order(long_file):
+    path, expected = long_file
+    chunks, words = recognize_file(path)
+
+    assert len(chunks) > 3
+    assert [word["word"] for word in words] == [word for word, _, _ in expected]
+
+def test_word_offsets_are_shifted_by_the_chunk_start(long_file):
+    path, expected = long_file
+    _, words = recognize_file(path)
+
+    for word, (_, start, end) in zip(words, expected):
+        assert word["start"] == pytest.approx(start, abs=0.02)
+        assert word["end"] == pytest.approx(end, abs=0.02)
+
+def test_words_near_cut_points_are_not_duplicated(long_file):
+    path, expected = long_file
+    chunks, words = recognize_file(path)
+    rate = 16000.0
+
+    # Each cut (the end of a chunk's own range) must fall between the words around it, and those
+    # words must appear exactly once although both neighbouring chunks heard them
+    for _, _, _, _, own_end in chunks[:-1]:
+        cut = own_end / rate
+        near = [word for word in expected if abs(word[1] - cut) < OVERLAP_SECS + WORD_SECS]
+        assert near
+        for name, start, _ in near:
+            assert sum(1 for word in words if word["word"] == name and abs(word["start"] - start) < 0.05) == 1
+
+def test_chunks_stay_within_their_length_plus_overlap(long_file):
+    path, _ = long_file
+    chunks = plan_chunks(path, CHUNK_SECS, OVERLAP_SECS, SEARCH_SECS)
+    rate = 16000.0
+
+    for index, start, end, own_start, own_end in chunks:
+        assert (end - start) / rate <= CHUNK_SECS + 2 * OVERLAP_SECS
+        assert start <= own_start < own_end <= end
+    # The owned ranges tile the file without gaps or overlaps
+    assert [chunk[0] for chunk in chunks] == list(range(len(chunks)))
+    assert chunks[0][3] == 0
+    assert all(previous[4] == chunk[3] for previous, chunk in zip(chunks, chunks[1:]))
+
+def test_short_file_is_a_single_chunk(make_wav):
+    tones, expected = spoken_words(8)
+    path = make_wav("short.wav", tones)
+    chunks, words = recognize_file(path)
+
+    assert len(chunks) == 1
+    assert chunks[0][1] == 0
+    assert [word["word"] for word in words] == [word for word, _, _ in expected]
+
+#------------------------------------------------------------------------------------------------------
+def test_a_chunk_failing_transiently_is_retried_alone(long_file, monkeypatch):
+    monkeypatch.setattr(chunking, "retry_delay", lambda retries: 0)
+    path, expected = long_file
+    chunks = plan_chunks(path, CHUNK_SECS, OVERLAP_SECS, SEARCH_SECS)
+    recognizer = FlakyRecognizer(exceptions.TooManyRequests("quota"), [2, 3])
+    results = recognize_chunks(path, chunks, recognizer, max_workers=1)
+    words = [word for entry in merge_chunk_results(results, with_words=True) for word in entry["words"]]
+
+    # Only the failed calls are made again, not the chunks already recognized
+    assert recognizer.calls == len(chunks) + 2
+    assert [word["word"] for word in words] == [word for word, _, _ in expected]
+
+def test_a_chunk_failing_past_its_retries_fails_the_file(long_file, monkeypatch):
+    monkeypatch.setattr(chunking, "retry_delay", lambda retries: 0)
+    monkeypatch.setattr(chunking, "CHUNK_MAX_RETRIES", 2)
+    path, _ = long_file
+    chunks = plan_chunks(path, CHUNK_SECS, OVERLAP_SECS, SEARCH_SECS)
+    recognizer = FlakyRecognizer(exceptions.ServiceUnavailable("unavailable"), [2, 3, 4])
+
+    with pytest.raises(exceptions.ServiceUnavailable):
+        recognize_chunks(path, chunks, recognizer, max_workers=1)
+    assert recognizer.calls == 4
+
+def test_a_permanent_error_is_not_retried(long_file):
+    path, _ = long_file
+    chunks = plan_chunks(path, CHUNK_SECS, OVERLAP_SECS, SEARCH_SECS)
+    recognizer = FlakyRecognizer(exceptions.BadRequest("invalid"), [1])
+
+    with pytest.raises(exceptions.BadRequest):
+        recognize_chunks(path, chunks, recognizer, max_workers=1)
+    assert recognizer.calls == 1
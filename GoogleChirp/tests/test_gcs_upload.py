@@ -0,0 +1,160 @@
+import io
+import wave
+from types import SimpleNamespace
+
+import pytest
+from google.api_core import exceptions
+from google.cloud import speech
+
+import clients
+from gcs_upload import INLINE_MAX_BYTES, AudioStager
+
+BLOCK_BYTES = 64 * 1024
+
+
+# In-memory stand-in for the Storage client: finished resumable uploads become objects of their
+# bucket. A writer can be made to fail on a given write, or on close after the object was stored.
+class FakeStorageClient:
+    def __init__(self, fail_on_write=None, fail_after_close=False):
+        self.objects = {}
+        self.deleted = []
+        self.fail_on_write = fail_on_write
+        self.fail_after_close = fail_after_close
+
+    def bucket(self, bucket_name):
+        return SimpleNamespace(blob=lambda name: FakeBlob(self, bucket_name, name))
+
+class FakeBlob:
+    def __init__(self, client, bucket_name, name):
+        self.client = client
+        self.key = (bucket_name, name)
+        self.name = name
+
+    def open(self, mode, **kwargs):
+        return FakeWriter(self.client, self.key)
+
+    def delete(self):
+        self.client.deleted.append(self.key)
+        if self.client.objects.pop(self.key, None) is None:
+            raise exceptions.NotFound(f"{self.name} not found")
+
+class FakeWriter:
+    def __init__(self, client, key):
+        self.client = client
+        self.key = key
+        self.data = bytearray()
+        self.writes = 0
+
+    def write(self, block):
+        self.writes += 1
+        if self.writes == self.client.fail_on_write:
+            raise ConnectionError("connection aborted")
+        self.data.extend(block)
+
+    def close(self):
+        self.client.objects[self.key] = bytes(self.data)
+        if self.client.fail_after_close:
+            raise ConnectionError("response lost")
+
+# Fake Speech API answering long running recognitions, or failing them with the given error
+class FakeSpeechClient:
+    def __init__(self, error=None):
+        self.error = error
+        self.uris = []
+
+    def long_running_recognize(self, config=None, audio=None):
+        self.uris.append(audio.uri)
+        if self.error is not None:
+            raise self.error
+        alternative = speech.SpeechRecognitionAlternative(transcript="hello", confidence=0.9)
+        response = speech.LongRunningRecognizeResponse(results=[speech.SpeechRecognitionResult(alternatives=[alternative])])
+        return SimpleNamespace(operation=SimpleNamespace(name="operation-1"), result=lambda timeout=None: response)
+
+# Function to stage size_bytes of PCM in fixed-size blocks
+def stage(stager, size_bytes):
+    for offset in range(0, size_bytes, BLOCK_BYTES):
+        stager.write(b"\x01\x00" * (min(BLOCK_BYTES, size_bytes - offset) // 2))
+    return stager.close()
+
+@pytest.fixture
+def storage(fake_redis):
+    def install(**kwargs):
+        client = FakeStorageClient(**kwargs)
+        clients.set_clients(storage_client=client)
+        return client
+    yield install
+    clients.reset_clients()
+
+#------------------------------------------------------------------------------------------------------
+def test_audio_up_to_the_inline_limit_stays_in_memory(storage):
+    client = storage()
+    staged = stage(AudioStager(), INLINE_MAX_BYTES)
+
+    assert staged.blob_name is None
+    assert staged.size_bytes == INLINE_MAX_BYTES
+    assert staged.duration_secs == pytest.approx(60)
+    with wave.open(io.BytesIO(staged.content), "rb") as wav:
+        assert wav.getnframes() * 2 == INLINE_MAX_BYTES
+    assert client.objects == {}
+
+def test_audio_past_the_inline_limit_is_streamed_to_gcs(storage):
+    client = storage()
+    staged = stage(AudioStager(bucket_name="temp-bucket"), INLINE_MAX_BYTES + 2)
+
+    assert staged.content is None
+    assert staged.bucket_name == "temp-bucket"
+    assert staged.blob_name.startswith("temp_audio_") and staged.blob_name.endswith(".pcm")
+    assert client.objects[("temp-bucket", staged.blob_name)] == b"\x01\x00" * (INLINE_MAX_BYTES // 2 + 1)
+    assert staged.size_bytes == INLINE_MAX_BYTES + 2
+
+def test_a_staging_failing_mid_upload_leaves_no_blob(storage):
+    client = storage(fail_on_write=3)
+    stager = AudioStager()
+    with pytest.raises(ConnectionError):
+        stage(stager, INLINE_MAX_BYTES * 2)
+    stager.abort()
+
+    assert len(client.deleted) == 1
+    assert client.objects == {}
+
+def test_a_staging_failing_after_the_upload_finished_deletes_the_blob(storage):
+    client = storage(fail_after_close=True)
+    stager = AudioStager()
+    with pytest.raises(ConnectionError):
+        stage(stager, INLINE_MAX_BYTES * 2)
+    assert len(client.objects) == 1
+    stager.abort()
+
+    assert client.objects == {}
+
+#------------------------------------------------------------------------------------------------------
+@pytest.mark.parametrize("error", [None, exceptions.BadRequest("invalid recognition config")])
+def test_the_temp_blob_is_deleted_after_recognition(storage, make_wav, error):
+    import worker
+
+    client = storage()
+    speech_client = FakeSpeechClient(error)
+    clients.set_clients(speech_client=speech_client)
+    path = make_wav("long.wav", [(0, 61)])
+    staged = worker.stage_audio_direct(path, probe=worker.probe_audio(path), remove_original=False)
+    assert (staged.bucket_name, staged.blob_name) in client.objects
+
+    result = worker.run_staged_recognize(staged, "english")
+
+    assert speech_client.uris == [f"gs://{staged.bucket_name}/{staged.blob_name}"]
+    assert ("error" in result) == (error is not None)
+    assert client.objects == {}
+
+def test_a_failed_direct_staging_keeps_the_upload_and_leaves_no_blob(storage, make_wav):
+    import worker
+
+    client = storage(fail_on_write=1)
+    path = make_wav("long.wav", [(0, 61)])
+
+    # A lost connection is raised for the task to retry, which needs the upload
+    with pytest.raises(ConnectionError):
+        worker.stage_audio_direct(path, probe=worker.probe_audio(path))
+    assert client.objects == {}
+    assert len(client.deleted) == 1
+    with wave.open(path, "rb") as wav:
+        assert wav.getnframes() == 61 * 16000
@@ -0,0 +1,45 @@
+import pytest
+
+from partials import has_segments, mark_submitted, read_segments, store_segments, time_to_first_text
+
+
+def entries(*transcripts):
+    return [{"transcript": text, "start_time": "0.0s", "end_time": "1.0s"} for text in transcripts]
+
+#------------------------------------------------------------------------------------------------------
+def test_segments_are_read_after_the_cursor(fake_redis):
+    store_segments("task", 1, entries("b", "c"))
+    store_segments("task", 0, entries("a"))
+
+    segments, cursor = read_segments("task")
+    assert [segment["segment_id"] for segment in segments] == ["00001.0", "00001.1", "00000.0"]
+    assert cursor == 3
+
+    store_segments("task", 2, entries("d"))
+    segments, cursor = read_segments("task", cursor)
+    assert [segment["transcript"] for segment in segments] == ["d"]
+    assert cursor == 4
+
+def test_a_part_stored_again_after_a_retry_is_ignored(fake_redis):
+    store_segments("task", 0, entries("a"))
+    store_segments("task", 1, entries("b", "c"))
+    _, cursor = read_segments("task")
+
+    # The retried task recognizes every part again
+    assert store_segments("task", 0, entries("a")) is None
+    assert store_segments("task", 1, entries("b", "c")) is None
+    store_segments("task", 2, entries("d"))
+
+    segments, _ = read_segments("task")
+    assert [segment["segment_id"] for segment in segments] == ["00000.0", "00001.0", "00001.1", "00002.0"]
+    assert [segment["transcript"] for segment in read_segments("task", cursor)[0]] == ["d"]
+
+def test_time_to_first_text_counts_from_submission(fake_redis):
+    mark_submitted("task")
+    assert time_to_first_text("task") is None
+    assert not has_segments("task")
+
+    store_segments("task", 0, entries("a"))
+    assert has_segments("task")
+    assert time_to_first_text("task") == pytest.approx(0, abs=1)
+    assert time_to_first_text("task") >= 0
@@ -0,0 +1,218 @@
+import os
+import random
+import shutil
+import datetime
+from types import SimpleNamespace
+
+import pytest
+import requests
+from google.api_core import exceptions
+from google.auth import exceptions as auth_exceptions
+from google.cloud import speech
+
+import quota
+import clients
+from quota import QuotaExhausted, RateLimitedSpeechClient, acquire_speech_quota, is_retryable, retry_delay
+
+
+# Fake Speech API failing with the given errors, one per call, then answering
+class FlakySpeechClient:
+    def __init__(self, errors):
+        self.errors = list(errors)
+        self.calls = 0
+
+    def recognize(self, config=None, audio=None):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        word = speech.WordInfo(word="hello", start_time=datetime.timedelta(seconds=0.1),
+                               end_time=datetime.timedelta(seconds=0.5), confidence=0.9)
+        alternative = speech.SpeechRecognitionAlternative(transcript="hello", confidence=0.9, words=[word])
+        return speech.RecognizeResponse(results=[speech.SpeechRecognitionResult(alternatives=[alternative])])
+
+class RetryRequested(Exception):
+    pass
+
+# Stand-in for a bound Celery task: retry() is recorded and returns the exception the task raises
+class FakeTask:
+    def __init__(self):
+        self.request = SimpleNamespace(id="task-1", retries=0, headers={})
+        self.countdowns = []
+
+    def retry(self, exc=None, countdown=None, max_retries=None):
+        self.countdowns.append(countdown)
+        return RetryRequested(exc)
+
+# Function to run a transcription task the way Celery would, running it again after every retry
+def run_with_retries(audio_path):
+    import worker
+
+    task = FakeTask()
+    while True:
+        try:
+            return task, worker.run_transcription_task(task, audio_path, "english")
+        except RetryRequested:
+            assert os.path.exists(audio_path), "a retried task must keep its upload"
+            task.request.retries += 1
+
+@pytest.fixture
+def upload(tmp_path, monkeypatch, make_wav, fake_redis):
+    monkeypatch.chdir(tmp_path)
+    return make_wav("upload.wav", [(440, 1.0), (0, 0.5)])
+
+@pytest.fixture
+def speech_client():
+    def install(errors):
+        client = FlakySpeechClient(errors)
+        clients.set_clients(speech_client=client)
+        return client
+    yield install
+    clients.reset_clients()
+
+#------------------------------------------------------------------------------------------------------
+@pytest.mark.parametrize("error", [
+    exceptions.TooManyRequests("quota"),
+    exceptions.ResourceExhausted("quota"),
+    exceptions.ServiceUnavailable("unavailable"),
+    exceptions.InternalServerError("internal"),
+    exceptions.GatewayTimeout("timeout"),
+    QuotaExhausted("next request in 40s"),
+    ConnectionError("reset"),
+    requests.exceptions.ConnectionError("connection aborted"),
+    requests.exceptions.ReadTimeout("read timed out"),
+    auth_exceptions.TransportError("token refresh failed"),
+    exceptions.RetryError("deadline exceeded while retrying", None),
+    requests.exceptions.HTTPError("503", response=SimpleNamespace(status_code=503)),
+])
+def test_transient_errors_are_retryable(error):
+    assert is_retryable(error)
+
+@pytest.mark.parametrize("error", [
+    exceptions.BadRequest("bad"),
+    exceptions.InvalidArgument("invalid"),
+    exceptions.PermissionDenied("denied"),
+    exceptions.NotFound("missing"),
+    ValueError("bug"),
+    requests.exceptions.HTTPError("403", response=SimpleNamespace(status_code=403)),
+])
+def test_permanent_errors_are_not_retryable(error):
+    assert not is_retryable(error)
+
+def test_retry_delay_stays_within_the_full_jitter_window(monkeypatch):
+    monkeypatch.setattr(quota, "SPEECH_RETRY_BASE_SECS", 2)
+    monkeypatch.setattr(quota, "SPEECH_RETRY_MAX_SECS", 60)
+    random.seed(0)
+    for retries in range(10):
+        window = min(60, 2 * 2 ** retries)
+        delays = [retry_delay(retries) for _ in range(500)]
+        assert all(0 <= delay <= window for delay in delays)
+        # Spread over the whole window, not bunched at its end like plain exponential backoff
+        assert min(delays) < window * 0.1 and max(delays) > window * 0.9
+
+#------------------------------------------------------------------------------------------------------
+def test_acquire_speech_quota_refills_at_the_configured_rate(fake_redis, monkeypatch):
+    monkeypatch.setattr(quota, "SPEECH_REQUESTS_PER_MIN", 600)
+    monkeypatch.setattr(quota, "SPEECH_REQUESTS_BURST", 5)
+    # Requests are booked back to back without sleeping, so each wait is its place in the line
+    monkeypatch.setattr(quota.time, "sleep", lambda secs: None)
+    waits = [acquire_speech_quota(max_wait=10) for _ in range(10)]
+
+    # The burst goes out at once, then each request is booked 1 / rate = 0.1s after the one before
+    assert waits[:5] == pytest.approx([0] * 5, abs=0.02)
+    assert waits[5:] == pytest.approx([0.1, 0.2, 0.3, 0.4, 0.5], abs=0.05)
+
+def test_acquire_speech_quota_gives_up_past_max_wait(fake_redis, monkeypatch):
+    monkeypatch.setattr(quota, "SPEECH_REQUESTS_PER_MIN", 60)
+    monkeypatch.setattr(quota, "SPEECH_REQUESTS_BURST", 1)
+    assert acquire_speech_quota(max_wait=0.5) == pytest.approx(0, abs=0.02)
+    with pytest.raises(QuotaExhausted):
+        acquire_speech_quota(max_wait=0.5)
+
+def test_a_request_costlier_than_max_wait_waits_for_its_own_refill(fake_redis, monkeypatch):
+    monkeypatch.setattr(quota, "SPEECH_REQUESTS_PER_MIN", 600)
+    monkeypatch.setattr(quota, "SPEECH_REQUESTS_BURST", 5)
+    monkeypatch.setattr(quota.time, "sleep", lambda secs: None)
+    assert acquire_speech_quota(cost=5, max_wait=0.5) == pytest.approx(0, abs=0.02)
+    # 30 requests refill in 3s, longer than max_wait, yet the request is not refused for it
+    assert acquire_speech_quota(cost=30, max_wait=0.5) == pytest.approx(3, abs=0.05)
+    with pytest.raises(QuotaExhausted):
+        acquire_speech_quota(cost=1, max_wait=0.5)
+
+def test_long_running_recognize_is_charged_its_quota_cost(monkeypatch):
+    costs = []
+    monkeypatch.setattr(quota, "acquire_speech_quota", lambda cost=1, **kwargs: costs.append(cost))
+    client = RateLimitedSpeechClient(SimpleNamespace(long_running_recognize=lambda config=None, audio=None: "operation",
+                                                     recognize=lambda config=None, audio=None: "response"))
+
+    assert client.long_running_recognize(config="config", audio="audio", quota_cost=30) == "operation"
+    assert client.recognize(config="config", audio="audio") == "response"
+    assert costs == [30, 1]
+
+def test_acquire_speech_quota_is_off_at_zero(monkeypatch):
+    monkeypatch.setattr(quota, "SPEECH_REQUESTS_PER_MIN", 0)
+    monkeypatch.setattr(quota, "get_quota_client", lambda: pytest.fail("the limiter must not touch Redis"))
+    assert acquire_speech_quota() == 0.0
+
+#------------------------------------------------------------------------------------------------------
+def test_transient_failures_are_retried_until_success(upload, speech_client):
+    client = speech_client([exceptions.TooManyRequests("quota"), exceptions.ServiceUnavailable("unavailable")])
+    task, result = run_with_retries(upload)
+
+    assert len(task.countdowns) == 2
+    assert client.calls == 3
+    assert result["transcription"][0]["transcript"] == "hello"
+    assert not os.path.exists(upload)
+
+def test_retries_stop_at_max_retries(upload, speech_client, monkeypatch):
+    import worker
+
+    monkeypatch.setattr(worker, "SPEECH_MAX_RETRIES", 3)
+    client = speech_client([exceptions.ServiceUnavailable("unavailable")] * 10)
+    task, result = run_with_retries(upload)
+
+    assert len(task.countdowns) == 3
+    assert client.calls == 4
+    assert "503" in result["error"]
+    assert not os.path.exists(upload)
+
+def test_bad_request_is_not_retried(upload, speech_client):
+    client = speech_client([exceptions.BadRequest("invalid recognition config")])
+    task, result = run_with_retries(upload)
+
+    assert task.countdowns == []
+    assert client.calls == 1
+    assert "400" in result["error"]
+    assert not os.path.exists(upload)
+
+def test_a_gcs_staging_connection_error_is_retried(upload, speech_client, monkeypatch):
+    import worker
+
+    # The staging upload loses its connection once
+    class FlakyStager(worker.AudioStager):
+        failures = [requests.exceptions.ConnectionError("connection aborted")]
+
+        def write(self, block):
+            if self.failures:
+                raise self.failures.pop()
+            super().write(block)
+
+    monkeypatch.setattr(worker, "AudioStager", FlakyStager)
+    monkeypatch.setattr(worker, "DIRECT_GCS_UPLOAD", True)
+    client = speech_client([])
+    task, result = run_with_retries(upload)
+
+    assert FlakyStager.failures == []
+    assert len(task.countdowns) == 1
+    assert client.calls == 1
+    assert result["transcription"][0]["transcript"] == "hello"
+
+@pytest.mark.skipif(not shutil.which("ffmpeg"), reason="needs ffmpeg")
+def test_a_sink_error_during_transcoding_is_raised_as_it_is(upload):
+    from transcoder import transcode_audio_to_sink
+
+    class LostConnection:
+        def write(self, block):
+            raise requests.exceptions.ConnectionError("connection aborted")
+
+    with pytest.raises(requests.exceptions.ConnectionError):
+        transcode_audio_to_sink(upload, LostConnection(), backends=["ffmpeg", "pydub"])
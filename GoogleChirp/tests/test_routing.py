@@ -0,0 +1,35 @@
+import pytest
+
+import routing
+from probe import estimate_cost
+from routing import route_transcription
+
+
+# Function to build a probe of audio with the given duration, LINEAR16 mono 16 kHz WAV unless another format is given
+def probe(duration_secs, format="wav", codec="pcm_s16le"):
+    return {"format": format, "codec": codec, "sample_rate": 16000, "channels": 1,
+            "duration_secs": duration_secs, "estimated": False}
+
+#------------------------------------------------------------------------------------------------------
+@pytest.mark.parametrize("duration_secs, requests", [(3, 1), (60, 1), (61, 2), (30 * 60, 30)])
+def test_cost_counts_the_speech_requests_of_the_audio(duration_secs, requests):
+    assert estimate_cost(probe(duration_secs))["speech_requests"] == requests
+
+def test_tier_and_priority_follow_the_billed_audio():
+    short = route_transcription("clip.wav", "english", probe=probe(3))
+    long = route_transcription("meeting.wav", "english", probe=probe(30 * 60))
+
+    assert short["queue"] == "interactive.english"
+    assert long["queue"] == "long.english"
+    assert short["priority"] < long["priority"]
+    assert long["headers"]["audio_cost"]["speech_requests"] == 30
+
+def test_files_to_transcode_get_more_time(monkeypatch):
+    monkeypatch.setattr(routing, "TRANSCODE_SECS_PER_AUDIO_SEC", 0.1)
+    wav = route_transcription("a.wav", "english", probe=probe(600))
+    mp3 = route_transcription("a.mp3", "english", probe=probe(600, "mp3", "mp3"))
+
+    assert not wav["headers"]["audio_cost"]["transcode"]
+    assert mp3["headers"]["audio_cost"]["transcode"]
+    assert mp3["soft_time_limit"] - wav["soft_time_limit"] == 60
+    assert mp3["time_limit"] == mp3["soft_time_limit"] + 60
@@ -0,0 +1,80 @@
+import os
+import hashlib
+
+import pytest
+
+from uploads import InvalidUpload, MultipartReceiver, UploadTooLarge
+
+BOUNDARY = "testboundary"
+CONTENT_TYPE = f"multipart/form-data; boundary={BOUNDARY}"
+
+
+# Function to build a multipart body from (name, filename or None, bytes) parts
+def multipart_body(parts):
+    body = b""
+    for name, filename, data in parts:
+        disposition = f'form-data; name="{name}"' + (f'; filename="{filename}"' if filename else "")
+        body += f"--{BOUNDARY}\r\nContent-Disposition: {disposition}\r\n\r\n".encode() + data + b"\r\n"
+    return body + f"--{BOUNDARY}--\r\n".encode()
+
+# Function to feed a body to a receiver in small chunks, as the server would receive it
+def receive(receiver, body, chunk_size=1000):
+    try:
+        for offset in range(0, len(body), chunk_size):
+            receiver.write(body[offset:offset + chunk_size])
+        return receiver.finish()
+    except Exception:
+        receiver.discard()
+        raise
+
+@pytest.fixture
+def destination(tmp_path):
+    return lambda filename: str(tmp_path / filename)
+
+#------------------------------------------------------------------------------------------------------
+def test_files_are_written_and_hashed_with_the_fields(tmp_path, destination):
+    audio = os.urandom(50000)
+    body = multipart_body([("language", None, b"georgian"), ("file", "../clip.wav", audio)])
+    fields, uploads = receive(MultipartReceiver(CONTENT_TYPE, destination, "file"), body)
+
+    assert fields == {"language": "georgian"}
+    assert [upload["filename"] for upload in uploads] == ["clip.wav"]
+    assert uploads[0]["audio_path"] == str(tmp_path / "clip.wav")
+    assert uploads[0]["size_bytes"] == len(audio)
+    assert uploads[0]["sha256"] == hashlib.sha256(audio).hexdigest()
+    with open(uploads[0]["audio_path"], "rb") as f:
+        assert f.read() == audio
+
+def test_several_files_up_to_max_files(tmp_path, destination):
+    body = multipart_body([("files", f"{n}.wav", bytes([n]) * 3000) for n in range(3)])
+    _, uploads = receive(MultipartReceiver(CONTENT_TYPE, destination, "files", max_files=3), body)
+    assert [upload["size_bytes"] for upload in uploads] == [3000] * 3
+
+    with pytest.raises(InvalidUpload):
+        receive(MultipartReceiver(CONTENT_TYPE, destination, "files", max_files=2), body)
+
+def test_limit_trips_while_reading_and_nothing_is_left(tmp_path, destination):
+    body = multipart_body([("file", "big.wav", b"x" * 100000)])
+    receiver = MultipartReceiver(CONTENT_TYPE, destination, "file", max_bytes=10000)
+
+    fed = []
+    def write(chunk):
+        fed.append(chunk)
+        MultipartReceiver.write(receiver, chunk)
+    receiver.write = write
+    with pytest.raises(UploadTooLarge):
+        receive(receiver, body)
+
+    assert sum(len(chunk) for chunk in fed) < 20000
+    assert os.listdir(tmp_path) == []
+
+@pytest.mark.parametrize("content_type, body", [
+    ("application/json", b"{}"),
+    (CONTENT_TYPE, multipart_body([("audio", "clip.wav", b"data")])),
+    (CONTENT_TYPE, multipart_body([("language", None, b"english")])),
+    (CONTENT_TYPE, multipart_body([("file", "clip.wav", b"x" * 5000)])[:3000]),
+])
+def test_invalid_bodies_are_refused(tmp_path, destination, content_type, body):
+    with pytest.raises(InvalidUpload):
+        receive(MultipartReceiver(content_type, destination, "file"), body)
+    assert os.listdir(tmp_path) == []
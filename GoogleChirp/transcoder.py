@@ -0,0 +1,167 @@
+import os
+import wave
+import shutil
+import tempfile
+import subprocess
+
+
+# Size of each block of decoded PCM moved from the decoder pipe to the destination WAV (bytes)
+TRANSCODE_BLOCK_SIZE = int(os.environ.get("TRANSCODE_BLOCK_SIZE", 256 * 1024))
+
+# Formats sox decodes reliably; everything else (mp3, m4a, ...) goes through ffmpeg
+SOX_FORMATS = {".wav", ".flac", ".ogg", ".aiff", ".aif", ".au"}
+
+
+class TranscodeError(Exception):
+    pass
+
+#------------------------------------------------------------------------------------------------------
+# Functions building a decoder command that writes raw LINEAR16 mono PCM at the target rate to stdout
+def ffmpeg_command(audio_path, target_sample_rate):
+    return [
+        "ffmpeg", "-nostdin", "-v", "error",
+        "-i", audio_path,
+        "-f", "s16le", "-acodec", "pcm_s16le",
+        "-ac", "1", "-ar", str(target_sample_rate),
+        "pipe:1",
+    ]
+
+def sox_command(audio_path, target_sample_rate):
+    return [
+        "sox", audio_path,
+        "-t", "raw", "-e", "signed-integer", "-b", "16",
+        "-c", "1", "-r", str(target_sample_rate),
+        "-",
+    ]
+
+DECODER_COMMANDS = {"ffmpeg": ffmpeg_command, "sox": sox_command}
+
+#------------------------------------------------------------------------------------------------------
+# Function to pick the order in which backends are tried for a file, based on its extension
+def select_backends(audio_path):
+    file_extension = os.path.splitext(audio_path)[1].lower()
+    preferred = ["sox", "ffmpeg"] if file_extension in SOX_FORMATS else ["ffmpeg", "sox"]
+    backends = [backend for backend in preferred if shutil.which(backend)]
+    # pydub decodes the whole file in memory, so it is only the last resort
+    backends.append("pydub")
+    return backends
+
+#------------------------------------------------------------------------------------------------------
+# Function to stream decoder output to write() block by block, with constant memory
+def decode_with_pipe(backend, audio_path, write, target_sample_rate=16000, block_size=TRANSCODE_BLOCK_SIZE):
+    command = DECODER_COMMANDS[backend](audio_path, target_sample_rate)
+    # stderr goes to a file so a chatty decoder can never block on a full pipe
+    stderr_file = tempfile.TemporaryFile()
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=stderr_file)
+    try:
+        while True:
+            block = process.stdout.read(block_size)
+            if not block:
+                break
+            write(block)
+        if process.wait() != 0:
+            stderr_file.seek(0)
+            stderr = stderr_file.read().decode(errors="replace").strip()
+            raise TranscodeError(f"{backend} exited with {process.returncode}: {stderr}")
+    finally:
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+        process.stdout.close()
+        stderr_file.close()
+
+# Function to stream decoder output into a WAV file
+def transcode_with_pipe(backend, audio_path, destination_path, target_sample_rate=16000, block_size=TRANSCODE_BLOCK_SIZE):
+    with wave.open(destination_path, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(target_sample_rate)
+        decode_with_pipe(backend, audio_path, wav.writeframesraw, target_sample_rate, block_size)
+
+#------------------------------------------------------------------------------------------------------
+# Function to transcode with pydub (full in-memory decode)
+def transcode_with_pydub(audio_path, destination_path, target_sample_rate=16000):
+    from pydub import AudioSegment
+
+    audio = AudioSegment.from_file(audio_path)
+    audio = audio.set_channels(1).set_frame_rate(target_sample_rate).set_sample_width(2)
+    audio.export(destination_path, format="wav")
+
+# Function to decode with pydub and hand the raw PCM to write() in one piece
+def decode_with_pydub(audio_path, write, target_sample_rate=16000):
+    from pydub import AudioSegment
+
+    audio = AudioSegment.from_file(audio_path)
+    write(audio.set_channels(1).set_frame_rate(target_sample_rate).set_sample_width(2).raw_data)
+
+#------------------------------------------------------------------------------------------------------
+# Main function to transcode any supported audio to a LINEAR16 mono WAV at the target rate.
+# Backends are tried in the order from select_backends() (or the given list) until one succeeds.
+def transcode_audio(audio_path, destination_path, target_sample_rate=16000, backends=None):
+    if not os.path.exists(audio_path):
+        raise TranscodeError(f"Input audio file does not exist: {audio_path}")
+
+    errors = []
+    for backend in backends or select_backends(audio_path):
+        try:
+            if backend == "pydub":
+                transcode_with_pydub(audio_path, destination_path, target_sample_rate)
+            else:
+                transcode_with_pipe(backend, audio_path, destination_path, target_sample_rate)
+            print(f"Audio successfully processed with {backend} and saved at: {destination_path}")
+            return backend
+        except Exception as e:
+            print(f"Error during audio processing with {backend}: {e}")
+            errors.append(f"{backend}: {e}")
+
+    raise TranscodeError("All transcoding backends failed (" + "; ".join(errors) + ")")
+
+#------------------------------------------------------------------------------------------------------
+# Function to transcode any supported audio to raw LINEAR16 mono PCM written into a sink (any object
+# with write(), such as gcs_upload.AudioStager). A backend that already wrote part of the audio can't
+# be retried, so the next backend is only tried when the failed one wrote nothing. An error of the
+# sink itself (such as a GCS upload error) is raised as it is, for the caller to retry or not.
+def transcode_audio_to_sink(audio_path, sink, target_sample_rate=16000, backends=None):
+    if not os.path.exists(audio_path):
+        raise TranscodeError(f"Input audio file does not exist: {audio_path}")
+
+    errors = []
+    for backend in backends or select_backends(audio_path):
+        written = [0]
+        sink_error = [None]
+
+        def write(block):
+            written[0] += len(block)
+            try:
+                sink.write(block)
+            except Exception as e:
+                sink_error[0] = e
+                raise
+
+        try:
+            if backend == "pydub":
+                decode_with_pydub(audio_path, write, target_sample_rate)
+            else:
+                decode_with_pipe(backend, audio_path, write, target_sample_rate)
+            print(f"Audio successfully processed with {backend} and streamed ({written[0]} bytes)")
+            return backend
+        except Exception as e:
+            if sink_error[0] is not None:
+                raise sink_error[0]
+            print(f"Error during audio processing with {backend}: {e}")
+            errors.append(f"{backend}: {e}")
+            if written[0]:
+                break
+
+    raise TranscodeError("Transcoding failed (" + "; ".join(errors) + ")")
+
+# Function to copy the PCM of a WAV already in the target format into a sink block by block, with
+# no decoder (see probe.needs_transcode)
+def copy_wav_to_sink(audio_path, sink, block_size=TRANSCODE_BLOCK_SIZE):
+    with wave.open(audio_path, "rb") as wav:
+        frames_per_block = max(1, block_size // (wav.getsampwidth() * wav.getnchannels()))
+        while True:
+            block = wav.readframes(frames_per_block)
+            if not block:
+                break
+            sink.write(block)
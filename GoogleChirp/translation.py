@@ -0,0 +1,200 @@
+import os
+import re
+import time
+import hashlib
+
+import redis
+
+from clients import get_translate_client
+from metrics import increment
+from profiles import RECOGNITION_PROFILES, resolve_profile
+
+
+# Translation backend: "google" (Cloud Translation API, needs google-cloud-translate) or "local"
+# (an offline word-by-word stand-in for development and tests)
+TRANSLATION_BACKEND = os.environ.get("TRANSLATION_BACKEND", "google")
+
+# Google Cloud project billed for translations; the project of the default credentials when empty
+TRANSLATION_PROJECT_ID = os.environ.get("TRANSLATION_PROJECT_ID", "")
+
+# Most segments and characters sent in one backend call
+TRANSLATION_BATCH_MAX_SEGMENTS = int(os.environ.get("TRANSLATION_BATCH_MAX_SEGMENTS", 128))
+TRANSLATION_BATCH_MAX_CHARS = int(os.environ.get("TRANSLATION_BATCH_MAX_CHARS", 30000))
+
+# Largest text accepted by POST /translate/ (characters)
+TRANSLATION_MAX_CHARS = int(os.environ.get("TRANSLATION_MAX_CHARS", 200000))
+
+# Profiles whose transcripts are translated by a Celery task as soon as they finish, so the UI's
+# translation is answered from the cache (comma separated, e.g. "georgian"), and the target language
+TRANSLATE_PROFILES = [name for name in os.environ.get("TRANSLATE_PROFILES", "").split(",") if name]
+TRANSLATION_TARGET_LANGUAGE = os.environ.get("TRANSLATION_TARGET_LANGUAGE", "en")
+
+# Every translated sentence is memoized in Redis, shared by the API and the workers
+TRANSLATION_REDIS_URL = os.environ.get("TRANSLATION_REDIS_URL", "redis://localhost:6379/1")
+TRANSLATION_CACHE_TTL_SECS = int(os.environ.get("TRANSLATION_CACHE_TTL_SECS", 30 * 24 * 60 * 60))
+
+TRANSLATION_PREFIX = "translation:"
+
+# Latency the local translator simulates per backend call (seconds)
+LOCAL_TRANSLATOR_LATENCY_SECS = float(os.environ.get("LOCAL_TRANSLATOR_LATENCY_SECS", 0))
+
+# Vocabulary of the local translator per (source, target) language; other words come back as [word]
+LOCAL_DICTIONARY = {
+    ("ka", "en"): {
+        "და": "and", "არის": "is", "იყო": "was", "ერთი": "one", "ორი": "two", "სამი": "three",
+        "კაცი": "man", "ქალი": "woman", "შვილი": "child", "ვაჟი": "son", "ქალიშვილი": "daughter",
+        "მამა": "father", "დედა": "mother", "უძღები": "prodigal", "რომელსაც": "who", "ყავდა": "had",
+        "სახლი": "house", "დიდი": "big", "პატარა": "small", "კარგი": "good", "ცუდი": "bad",
+        "დღე": "day", "ღამე": "night", "წელი": "year", "დრო": "time", "ენა": "language",
+        "ქართული": "Georgian", "ინგლისური": "English", "გამარჯობა": "hello", "მადლობა": "thank you",
+        "დიახ": "yes", "არა": "no", "მე": "I", "შენ": "you", "ის": "he", "ჩვენ": "we", "ეს": "this",
+        "არ": "not", "რა": "what", "სად": "where", "როდის": "when", "რატომ": "why", "როგორ": "how",
+    },
+}
+
+
+#------------------------------------------------------------------------------------------------------
+# Function to split text into sentences, the unit that is translated and cached. The UI sends the
+# segments of a transcript joined by spaces, which splits back into the sentences of each segment.
+def split_sentences(text):
+    sentences = (" ".join(part.split()) for part in re.split(r"(?<=[.!?;…])\s+", text))
+    return [sentence for sentence in sentences if sentence]
+
+# Function to get the language of a recognition profile as a translation language code ("ka-GE" -> "ka")
+def profile_language(profile):
+    return RECOGNITION_PROFILES[resolve_profile(profile)]["language_code"].split("-")[0]
+
+#------------------------------------------------------------------------------------------------------
+# Translator backends translate a list of texts in one call and return their translations in order
+class GoogleTranslator:
+    name = "google"
+
+    def __init__(self, project_id=TRANSLATION_PROJECT_ID):
+        self.project_id = project_id
+
+    def translate_batch(self, texts, source_language, target_language):
+        if not self.project_id:
+            import google.auth
+            self.project_id = google.auth.default()[1]
+        response = get_translate_client().translate_text(request={
+            "parent": f"projects/{self.project_id}/locations/global",
+            "contents": texts,
+            "mime_type": "text/plain",
+            "source_language_code": source_language,
+            "target_language_code": target_language,
+        })
+        return [translation.translated_text for translation in response.translations]
+
+# Offline stand-in translating word by word from LOCAL_DICTIONARY
+class LocalTranslator:
+    name = "local"
+
+    def __init__(self, latency=LOCAL_TRANSLATOR_LATENCY_SECS):
+        self.latency = latency
+
+    def translate_batch(self, texts, source_language, target_language):
+        time.sleep(self.latency)
+        if source_language == target_language:
+            return list(texts)
+        words = LOCAL_DICTIONARY.get((source_language, target_language), {})
+        translate_word = lambda match: words.get(match.group().lower(), f"[{match.group()}]")
+        return [re.sub(r"[^\W\d_]+", translate_word, text) for text in texts]
+
+TRANSLATORS = {
+    "google": GoogleTranslator,
+    "local": LocalTranslator,
+}
+
+_translator = None
+_client = None
+
+# Function to get the process wide translator of TRANSLATION_BACKEND
+def get_translator():
+    global _translator
+    if _translator is None:
+        if TRANSLATION_BACKEND not in TRANSLATORS:
+            raise ValueError(f"Unknown translation backend: {TRANSLATION_BACKEND}")
+        _translator = TRANSLATORS[TRANSLATION_BACKEND]()
+    return _translator
+
+def get_translation_client():
+    global _client
+    if _client is None:
+        _client = redis.Redis.from_url(TRANSLATION_REDIS_URL)
+    return _client
+
+#------------------------------------------------------------------------------------------------------
+def cache_key(backend, source_language, target_language, text):
+    digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+    return f"{TRANSLATION_PREFIX}{backend}:{source_language}:{target_language}:{digest}"
+
+# Function to split texts into batches within TRANSLATION_BATCH_MAX_SEGMENTS and TRANSLATION_BATCH_MAX_CHARS
+def make_batches(texts):
+    batches, chars = [], 0
+    for text in texts:
+        full = batches and (len(batches[-1]) >= TRANSLATION_BATCH_MAX_SEGMENTS
+                            or chars + len(text) > TRANSLATION_BATCH_MAX_CHARS)
+        if not batches or full:
+            batches.append([])
+            chars = 0
+        batches[-1].append(text)
+        chars += len(text)
+    return batches
+
+# Function to translate a list of segments, returning (translations in order, stats). Repeated
+# segments are translated once, segments translated before come from the cache, and the rest go
+# to the backend in as few batched calls as possible. A cache failure never fails the translation.
+def translate_segments(segments, source_language, target_language, translator=None):
+    translator = translator or get_translator()
+    texts = [" ".join(segment.split()) for segment in segments]
+    unique = [text for text in dict.fromkeys(texts) if text]
+    keys = {text: cache_key(translator.name, source_language, target_language, text) for text in unique}
+
+    translated = {}
+    try:
+        cached = get_translation_client().mget([keys[text] for text in unique]) if unique else []
+        translated = {text: value.decode("utf-8") for text, value in zip(unique, cached) if value is not None}
+    except redis.RedisError as e:
+        print(f"Warning: Translation cache lookup failed: {e}")
+
+    missing = [text for text in unique if text not in translated]
+    batches = make_batches(missing)
+    for batch in batches:
+        translated.update(zip(batch, translator.translate_batch(batch, source_language, target_language)))
+
+    if missing:
+        try:
+            pipe = get_translation_client().pipeline(transaction=False)
+            for text in missing:
+                pipe.set(keys[text], translated[text], ex=TRANSLATION_CACHE_TTL_SECS)
+            pipe.execute()
+        except redis.RedisError as e:
+            print(f"Warning: Translation cache store failed: {e}")
+    increment("translation_segments_total", len(unique) - len(missing), outcome="cache")
+    increment("translation_segments_total", len(missing), outcome="backend")
+
+    stats = {
+        "segments": len(texts),
+        "unique": len(unique),
+        "cached": len(unique) - len(missing),
+        "backend_calls": len(batches),
+        "method": translator.name,
+    }
+    return [translated.get(text, "") for text in texts], stats
+
+# Function to translate a whole text sentence by sentence; returns (translation, stats)
+def translate_text(text, source_language, target_language, translator=None):
+    translations, stats = translate_segments(split_sentences(text), source_language, target_language, translator)
+    return " ".join(translations), stats
+
+# Function to translate the segments of a transcript, each sentence by sentence like translate_text,
+# so the cache it fills answers the UI's request for the same transcript; returns (translations, stats)
+def translate_transcript(segments, source_language, target_language, translator=None):
+    sentences = [split_sentences(segment) for segment in segments]
+    translations, stats = translate_segments([s for parts in sentences for s in parts], source_language,
+                                             target_language, translator)
+    joined, position = [], 0
+    for parts in sentences:
+        joined.append(" ".join(translations[position:position + len(parts)]))
+        position += len(parts)
+    return joined, stats
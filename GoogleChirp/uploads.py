@@ -0,0 +1,163 @@
+import os
+import hashlib
+
+from multipart.multipart import MultipartParser, parse_options_header
+from starlette.concurrency import run_in_threadpool
+
+
+# Largest upload accepted by the transcription endpoints (bytes)
+MAX_UPLOAD_BYTES = int(os.environ.get("MAX_UPLOAD_BYTES", 2 * 1024 * 1024 * 1024))
+
+# Size of each block copied from a file to disk (bytes)
+UPLOAD_CHUNK_SIZE = int(os.environ.get("UPLOAD_CHUNK_SIZE", 1024 * 1024))
+
+# Largest plain form field (language, output, ...) accepted with an upload (bytes)
+MAX_FORM_FIELD_BYTES = 64 * 1024
+
+
+class UploadTooLarge(Exception):
+    pass
+
+class InvalidUpload(Exception):
+    pass
+
+#------------------------------------------------------------------------------------------------------
+# Function to copy a file object to disk in fixed-size blocks, hashing the bytes as they pass through
+def copy_stream_to_disk(source, audio_path, max_bytes=MAX_UPLOAD_BYTES, chunk_size=UPLOAD_CHUNK_SIZE):
+    sha256 = hashlib.sha256()
+    size_bytes = 0
+    try:
+        with open(audio_path, "wb") as f:
+            while True:
+                chunk = source.read(chunk_size)
+                if not chunk:
+                    break
+                size_bytes += len(chunk)
+                if max_bytes and size_bytes > max_bytes:
+                    raise UploadTooLarge(f"Upload exceeds the {max_bytes} byte limit")
+                sha256.update(chunk)
+                f.write(chunk)
+    except Exception:
+        # Never leave a partial upload behind
+        if os.path.exists(audio_path):
+            os.remove(audio_path)
+        raise
+
+    return {"audio_path": audio_path, "size_bytes": size_bytes, "sha256": sha256.hexdigest()}
+
+#------------------------------------------------------------------------------------------------------
+# Multipart/form-data receiver writing each file part straight to its destination as the body
+# arrives, hashing it on the way, so an upload is written to disk once and the size limit trips
+# while reading instead of after the body was spooled. destination(filename) gives the path of each
+# file; small form fields are kept in memory. Feed it with write() and call finish() at the end.
+class MultipartReceiver:
+    def __init__(self, content_type, destination, file_field, max_bytes=MAX_UPLOAD_BYTES, max_files=1):
+        _, params = parse_options_header(content_type)
+        if not content_type.startswith("multipart/form-data") or b"boundary" not in params:
+            raise InvalidUpload("Expected a multipart/form-data body")
+        self.destination = destination
+        self.file_field = file_field
+        self.max_bytes = max_bytes
+        self.max_files = max_files
+        self.fields = {}
+        self.uploads = []
+        self.part = None
+        self.header_name = b""
+        self.header_value = b""
+        self.parser = MultipartParser(params[b"boundary"], {
+            "on_part_begin": self.on_part_begin,
+            "on_part_data": self.on_part_data,
+            "on_part_end": self.on_part_end,
+            "on_header_field": self.on_header_field,
+            "on_header_value": self.on_header_value,
+            "on_header_end": self.on_header_end,
+            "on_headers_finished": self.on_headers_finished,
+        })
+
+    def on_part_begin(self):
+        self.part = {"disposition": b"", "data": b"", "file": None}
+
+    def on_header_field(self, data, start, end):
+        self.header_name += data[start:end]
+
+    def on_header_value(self, data, start, end):
+        self.header_value += data[start:end]
+
+    def on_header_end(self):
+        if self.header_name.lower() == b"content-disposition":
+            self.part["disposition"] = self.header_value
+        self.header_name = self.header_value = b""
+
+    def on_headers_finished(self):
+        _, options = parse_options_header(self.part["disposition"])
+        name = options.get(b"name", b"").decode("utf-8", "replace")
+        self.part["name"] = name
+        if b"filename" not in options:
+            return
+        if name != self.file_field:
+            raise InvalidUpload(f"Unexpected file field: {name}")
+        if len(self.uploads) >= self.max_files:
+            raise InvalidUpload(f"At most {self.max_files} files can be uploaded at once")
+        filename = os.path.basename(options[b"filename"].decode("utf-8", "replace"))
+        audio_path = self.destination(filename)
+        upload = {"filename": filename, "audio_path": audio_path, "size_bytes": 0, "sha256": hashlib.sha256()}
+        self.uploads.append(upload)
+        upload["file"] = open(audio_path, "wb")
+        self.part["file"] = upload
+
+    def on_part_data(self, data, start, end):
+        upload = self.part["file"]
+        if upload is None:
+            self.part["data"] += data[start:end]
+            if len(self.part["data"]) > MAX_FORM_FIELD_BYTES:
+                raise InvalidUpload(f"Form field {self.part['name']} is too large")
+            return
+        upload["size_bytes"] += end - start
+        if self.max_bytes and upload["size_bytes"] > self.max_bytes:
+            raise UploadTooLarge(f"Upload exceeds the {self.max_bytes} byte limit")
+        upload["sha256"].update(data[start:end])
+        upload["file"].write(data[start:end])
+
+    def on_part_end(self):
+        upload = self.part["file"]
+        if upload is None:
+            self.fields[self.part["name"]] = self.part["data"].decode("utf-8", "replace")
+        else:
+            upload["file"].close()
+
+    def write(self, chunk):
+        self.parser.write(chunk)
+
+    # Function to end the body; returns (form fields, uploads with their path, size and sha256)
+    def finish(self):
+        self.parser.finalize()
+        if not self.uploads:
+            raise InvalidUpload(f"No file uploaded in the {self.file_field} field")
+        if any(not upload["file"].closed for upload in self.uploads):
+            raise InvalidUpload("The upload body ended in the middle of a file")
+        for upload in self.uploads:
+            del upload["file"]
+            upload["sha256"] = upload["sha256"].hexdigest()
+        return self.fields, self.uploads
+
+    # Function to remove every file written so far, after a failure
+    def discard(self):
+        for upload in self.uploads:
+            if "file" in upload:
+                upload["file"].close()
+            if os.path.exists(upload["audio_path"]):
+                os.remove(upload["audio_path"])
+
+# Function to receive a multipart upload request straight into the files given by destination(filename).
+# Each body chunk is parsed and written in the thread pool, so the event loop never blocks on disk.
+# Returns (form fields, uploads); nothing is left on disk when it raises.
+async def receive_uploads(request, destination, file_field="file", max_bytes=MAX_UPLOAD_BYTES, max_files=1):
+    receiver = MultipartReceiver(request.headers.get("content-type", ""), destination, file_field, max_bytes, max_files)
+    try:
+        async for chunk in request.stream():
+            if chunk:
+                await run_in_threadpool(receiver.write, chunk)
+        return receiver.finish()
+    except Exception:
+        receiver.discard()
+        raise
@@ -0,0 +1,92 @@
+import os
+import json
+import zlib
+
+from kombu.serialization import register
+
+
+# Serializer of task results in the Redis result backend: "zjson" (zlib compressed JSON, default),
+# "json", or "msgpack" when the msgpack package is installed
+RESULT_SERIALIZER = os.environ.get("RESULT_SERIALIZER", "zjson")
+
+# zlib level of the compressed JSON results
+RESULT_COMPRESSION_LEVEL = int(os.environ.get("RESULT_COMPRESSION_LEVEL", 6))
+
+# Output modes of a transcription: transcript segments only, or segments plus the word table
+OUTPUT_MODES = ("segments", "words")
+
+
+#------------------------------------------------------------------------------------------------------
+# Word level results are kept as one columnar table per transcription instead of a dict per word:
+#   strings     distinct word strings
+#   word        index of each word into strings
+#   entry       index of each word's transcription entry
+#   start_ms    word start offsets in milliseconds
+#   end_ms      word end offsets in milliseconds
+#   confidence  word confidences in thousandths
+# All columns are parallel lists of ints, which JSON, msgpack and zlib all store compactly.
+def build_word_table(entries_words):
+    strings, string_index = [], {}
+    table = {"strings": strings, "word": [], "entry": [], "start_ms": [], "end_ms": [], "confidence": []}
+    for entry_index, words in enumerate(entries_words):
+        for word in words:
+            text = word["word"]
+            if text not in string_index:
+                string_index[text] = len(strings)
+                strings.append(text)
+            table["word"].append(string_index[text])
+            table["entry"].append(entry_index)
+            table["start_ms"].append(int(round(word["start"] * 1000)))
+            table["end_ms"].append(int(round(word["end"] * 1000)))
+            table["confidence"].append(int(round(word["confidence"] * 1000)))
+    return table
+
+# Function to expand a word table back into one dict per word (offsets in seconds), e.g. for subtitles
+def expand_word_table(table):
+    return [
+        {
+            "word": table["strings"][word],
+            "entry": entry,
+            "start": start_ms / 1000.0,
+            "end": end_ms / 1000.0,
+            "confidence": confidence / 1000.0,
+        }
+        for word, entry, start_ms, end_ms, confidence in zip(
+            table["word"], table["entry"], table["start_ms"], table["end_ms"], table["confidence"],
+        )
+    ]
+
+#------------------------------------------------------------------------------------------------------
+# Function to build a transcription result from entries that still carry their "words" (dicts with
+# offsets in seconds); the words move out of the entries into the result's word table
+def transcription_with_words(entries):
+    entries_words = [entry.pop("words", None) or [] for entry in entries]
+    return {"transcription": entries, "words": build_word_table(entries_words)}
+
+# Function to shape a result for the requested output mode; the word table is dropped unless asked for
+def apply_output_mode(result, output_mode="segments"):
+    if output_mode == "words" or "words" not in result:
+        return result
+    return {key: value for key, value in result.items() if key != "words"}
+
+#------------------------------------------------------------------------------------------------------
+# zlib compressed JSON as a kombu serializer for the result backend. Results stored as plain JSON
+# before the switch still decode.
+def zjson_dumps(value):
+    return zlib.compress(json.dumps(value, separators=(",", ":")).encode("utf-8"), RESULT_COMPRESSION_LEVEL)
+
+def zjson_loads(payload):
+    if isinstance(payload, str):
+        payload = payload.encode("latin-1")
+    if payload[:1] in (b"{", b"["):
+        return json.loads(payload)
+    return json.loads(zlib.decompress(payload))
+
+register("zjson", zjson_dumps, zjson_loads, content_type="application/x-zjson", content_encoding="binary")
+
+# Function to get the Celery settings storing results with RESULT_SERIALIZER
+def celery_result_config():
+    return {
+        "result_serializer": RESULT_SERIALIZER,
+        "result_accept_content": ["json", "zjson", RESULT_SERIALIZER],
+    }
@@ -0,0 +1,642 @@
+import os
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from celery import states
+from celery.exceptions import Ignore
+from google.cloud import speech
+from profiles import get_recognition_config
+from chunking import get_wav_duration, merge_chunk_results, run_chunked_recognize
+from transcoder import TranscodeError, copy_wav_to_sink, transcode_audio, transcode_audio_to_sink
+from probe import InvalidAudio, needs_transcode, probe_audio, speech_request_count
+from clients import get_speech_client, get_storage_client
+from partials import has_segments, store_segments, time_to_first_text
+from batches import finish_batch_item, pending_batch_audio_paths, running_batch_items
+from routing import TRANSLATION_QUEUE, task_header
+from quota import SPEECH_MAX_RETRIES, is_retryable, retry_delay
+from translation import TRANSLATE_PROFILES, TRANSLATION_TARGET_LANGUAGE, profile_language, translate_transcript
+from task_events import publish_task_event
+from result_cache import config_fingerprint, get_result_cache, make_cache_key, pcm_fingerprint
+from recognizers import get_recognizer, response_to_results
+from word_table import apply_output_mode, transcription_with_words
+from metrics import (
+    count_recognition_path, count_stage_error, current_labels, increment, metric_labels, observe_stage,
+    observe_time_to_first_text, stage_timer,
+)
+from gcs_upload import DIRECT_GCS_UPLOAD, GCS_TEMP_BUCKET, AudioStager
+from operations import (
+    ASYNC_OPERATIONS, OPERATIONS_POLL_WORKERS, check_operation, claim_due_operations, operation_timeout,
+    pending_operation_blobs, remove_operation, reschedule_operation, save_pending_operation,
+)
+from scratch import sweep_local_files, sweep_temp_blobs, task_workspace
+from celery_app import (
+    BATCH_ITEM_TASK, POLL_OPERATIONS_TASK, REAP_BATCHES_TASK, SWEEP_SCRATCH_TASK, TRANSCRIPTION_TASK, TRANSLATION_TASK,
+    celery_app, send_task,
+)
+
+
+# Worker side of the service: the Celery tasks and the transcription pipeline they run. Start it with
+# "celery -A worker worker"; the API (api.py) only queues tasks by name and never imports this module.
+
+# Recognize audio longer than a minute as concurrent chunks instead of one long running operation
+CHUNKED_RECOGNITION = os.environ.get("CHUNKED_RECOGNITION", "1") == "1"
+
+
+# Function to transcribe an uploaded file with a recognition profile (language_config is the profile
+# name), answering from the result cache when the same audio was already recognized with the same
+# config. A repeated upload hits before the transcode, the same audio in another container or
+# encoding hits after it, and both skip the Speech API call.
+# progress(stage, **data) is called as the work moves through transcoding and recognition, and
+# on_segments(part_index, entries) as each part of a long file finishes recognition.
+# With defer_operation a long running operation may be left pending (see run_batch_recognize); its
+# record then carries the cache keys to fill once it finishes.
+# probe is the header probe taken at upload (probe.probe_audio); the file is probed again without it.
+# Processed audio is written to workdir (the task's scratch workspace), or the system temp directory.
+# Without a workdir the upload is deleted once transcoded; with one, the task's workspace removes it
+# when the task ends, or keeps it when the task is retried.
+# Retryable Speech API errors (quota.is_retryable) are raised instead of returned.
+def transcribe_audio_file(audio_path, language_config="english", upload_sha256=None, progress=None, on_segments=None,
+                          defer_operation=False, probe=None, workdir=None):
+    progress = progress or (lambda stage, **data: None)
+
+    # Check if input file exists
+    if not os.path.exists(audio_path):
+        return {"error": f"Input audio file not found: {audio_path}"}
+    if probe is None:
+        try:
+            probe = probe_audio(audio_path)
+        except InvalidAudio as e:
+            os.remove(audio_path)
+            return {"error": f"Invalid audio file: {e}"}
+
+    recognizer = get_recognizer()
+    cache = get_result_cache()
+    config_hash = config_fingerprint(get_recognition_config(language_config), recognizer.name)
+    upload_key = make_cache_key("upload", upload_sha256, config_hash) if upload_sha256 else None
+
+    cached = cache_lookup(cache, upload_key)
+    if cached is not None:
+        print(f"Result cache hit for upload {audio_path}")
+        count_recognition_path("cache")
+        os.remove(audio_path)
+        return cached
+
+    remove_original = workdir is None
+    progress("transcoding")
+    # Audio that won't be chunked is streamed from the transcoder into memory or GCS; chunking
+    # needs a local WAV to cut, and a recognizer without long running operations reads it locally
+    if DIRECT_GCS_UPLOAD and recognizer.long_running and not recognize_in_chunks(probe["duration_secs"], recognizer):
+        with stage_timer("transcode"):
+            staged = stage_audio_direct(audio_path, probe=probe, remove_original=remove_original)
+        if staged is None:
+            count_stage_error("transcode")
+            return {"error": "Audio processing failed"}
+        pcm_hash = lambda: staged.pcm_sha256
+        recognize = lambda: run_staged_recognize(staged, language_config, defer_operation)
+        discard = lambda: delete_gcs_blob(staged.bucket_name, staged.blob_name) if staged.blob_name else None
+        cleanup = lambda: None
+    else:
+        # Preprocess audio locally
+        with stage_timer("transcode"):
+            processed_audio_path = preprocess_audio_local(audio_path, probe=probe, workdir=workdir,
+                                                          remove_original=remove_original)
+        if not processed_audio_path or not os.path.exists(processed_audio_path):
+            count_stage_error("transcode")
+            return {"error": "Audio processing failed"}
+        pcm_hash = lambda: pcm_fingerprint(processed_audio_path)
+        recognize = lambda: run_batch_recognize(processed_audio_path, language_config, progress, on_segments,
+                                                defer_operation)
+        discard = lambda: None
+        # A WAV used as it is is the upload itself, left to the workspace when there is one
+        keep = not remove_original and processed_audio_path == audio_path
+        cleanup = lambda: None if keep else remove_processed_file(processed_audio_path)
+
+    try:
+        pcm_key = make_cache_key("pcm", pcm_hash(), config_hash)
+        transcription_result = cache_lookup(cache, pcm_key)
+        if transcription_result is not None:
+            print(f"Result cache hit for audio of {audio_path}")
+            count_recognition_path("cache")
+            discard()
+        else:
+            # Get transcription using standard Speech API
+            progress("recognizing")
+            transcription_result = recognize()
+            if "transcription" in transcription_result:
+                cache_store(cache, pcm_key, transcription_result)
+            elif "pending_operation" in transcription_result:
+                transcription_result["pending_operation"]["cache_keys"] = [pcm_key, upload_key]
+        if "transcription" in transcription_result:
+            cache_store(cache, upload_key, transcription_result)
+    finally:
+        cleanup()
+
+    return transcription_result
+
+# Function to remove the local processed WAV
+def remove_processed_file(processed_audio_path):
+    with stage_timer("cleanup"):
+        if os.path.exists(processed_audio_path):
+            os.remove(processed_audio_path)
+            print(f"Cleaned up processed file: {processed_audio_path}")
+
+# Function to read from the result cache without ever failing the transcription
+def cache_lookup(cache, key):
+    if cache is None or key is None:
+        return None
+    try:
+        return cache.lookup(key)
+    except Exception as e:
+        print(f"Warning: Result cache lookup failed: {e}")
+        return None
+
+# Function to write to the result cache without ever failing the transcription
+def cache_store(cache, key, value):
+    if cache is None or key is None:
+        return
+    try:
+        cache.set(key, value)
+    except Exception as e:
+        print(f"Warning: Result cache store failed: {e}")
+
+# Function to run a transcription task, pushing progress and the final result to event subscribers.
+# When the audio went to a long running operation, the task records it and ends without a result;
+# poll_pending_operations finishes it later under the same task ID.
+# A retryable error (quota, unavailable, deadline exceeded, ...) retries the task with jittered
+# exponential backoff, keeping its upload; after SPEECH_MAX_RETRIES it finishes with the error.
+# output_mode picks the result shape (see word_table.OUTPUT_MODES).
+def run_transcription_task(task, audio_path, language_config, upload_sha256=None, batch_id=None, output_mode="segments"):
+    task_id = task.request.id
+
+    def progress(stage, **data):
+        publish_task_event(task_id, "progress", stage=stage, **data)
+
+    # Stage metrics are labelled with the profile and the duration measured when the task was routed.
+    # The upload and everything written to the task's workspace are removed however the task ends.
+    duration_secs = task_header(task.request, "audio_duration_secs")
+    with metric_labels(language_config, duration_secs), task_workspace(task_id, duration_secs, [audio_path]) as workspace:
+        try:
+            result = transcribe_audio_file(audio_path, language_config, upload_sha256, progress,
+                                           partial_segments_writer(task_id), ASYNC_OPERATIONS,
+                                           task_header(task.request, "audio_probe"), workspace.path)
+        except Exception as e:
+            if is_retryable(e) and task.request.retries < SPEECH_MAX_RETRIES:
+                countdown = retry_delay(task.request.retries)
+                print(f"Retrying transcription task {task_id} in {countdown:.1f}s after: {e}")
+                increment("transcription_retries_total", profile=language_config, error=type(e).__name__)
+                progress("retrying", attempt=task.request.retries + 1, countdown=round(countdown, 1))
+                workspace.disown(audio_path)
+                raise task.retry(exc=e, countdown=countdown, max_retries=SPEECH_MAX_RETRIES)
+            print(f"Error in transcription task {task_id}: {e}")
+            result = {"error": f"Transcription failed: {str(e)}"}
+
+        if "pending_operation" in result:
+            record = dict(result["pending_operation"], task_id=task_id, language_config=language_config,
+                          batch_id=batch_id, output_mode=output_mode)
+            try:
+                save_pending_operation(record)
+            except Exception as e:
+                print(f"Error recording operation {record['name']} of task {task_id}: {e}")
+                delete_gcs_blob(record["bucket"], record["blob"])
+                result = {"error": f"Transcription failed: {str(e)}"}
+            else:
+                progress("awaiting_operation")
+                task.update_state(state="AWAITING_OPERATION", meta={"operation": record["name"]})
+                # Leaves the task state as is instead of storing a result
+                raise Ignore()
+
+        return finish_transcription(task_id, result, batch_id, output_mode, language_config)
+
+# Function to get the on_segments callback storing and publishing a task's partial segments
+def partial_segments_writer(task_id):
+    def on_segments(part_index, entries):
+        try:
+            segments = store_segments(task_id, part_index, entries)
+        except Exception as e:
+            print(f"Warning: Could not store partial segments for task {task_id}: {e}")
+            return
+        # A part stored before a retry was already published
+        if segments is not None:
+            publish_task_event(task_id, "segments", segments=segments)
+    return on_segments
+
+# Function to finish a transcription: store it as segments, shape it for the output mode, publish the
+# result event, queue its translation when the profile is in TRANSLATE_PROFILES and, for a batch item,
+# record it and start the next waiting item of the batch
+def finish_transcription(task_id, result, batch_id=None, output_mode="segments", language_config=None):
+    # Short audio and cache hits arrive in one piece; store them as a single part
+    try:
+        if "transcription" in result and not has_segments(task_id):
+            partial_segments_writer(task_id)(0, result["transcription"])
+        ttft = time_to_first_text(task_id)
+        if ttft is not None:
+            print(f"Task {task_id} time to first text: {ttft}s")
+            observe_time_to_first_text(ttft)
+    except Exception as e:
+        print(f"Warning: Could not finalize partial segments for task {task_id}: {e}")
+
+    status = "error" if "error" in result else "success"
+    increment("transcriptions_total", profile=current_labels()["profile"], status=status)
+    if status == "success" and language_config in TRANSLATE_PROFILES:
+        queue_translation(task_id, result, language_config)
+    result = apply_output_mode(result, output_mode)
+    publish_task_event(task_id, "result", status="success", result=result)
+
+    if batch_id is not None:
+        finish_batch_item(batch_id, task_id, result)
+    return result
+
+# Function to queue the translation of a finished transcript. It runs on the translation queue, so it
+# never holds up transcriptions, and fills the translation cache the UI's /translate/ call reads.
+def queue_translation(task_id, result, language_config):
+    segments = [entry["transcript"] for entry in result.get("transcription") or []]
+    if not segments:
+        return
+    try:
+        send_task(TRANSLATION_TASK, args=[task_id, segments, profile_language(language_config),
+                                          TRANSLATION_TARGET_LANGUAGE, language_config],
+                  queue=TRANSLATION_QUEUE, headers={"enqueued_at": time.time()})
+    except Exception as e:
+        print(f"Warning: Could not queue the translation of task {task_id}: {e}")
+
+# Celery task for transcription with any registered recognition profile
+@celery_app.task(bind=True, name=TRANSCRIPTION_TASK)
+def process_transcription(self, audio_path, language_config="english", upload_sha256=None, output_mode="segments"):
+    return run_transcription_task(self, audio_path, language_config, upload_sha256, output_mode=output_mode)
+
+# Batch item tasks that fail with an exception still finish their item with the error, so the item
+# frees its slot in the batch. Items killed outright are left to reap_batch_items.
+class BatchItemTask(celery_app.Task):
+    def on_failure(self, exc, task_id, args, kwargs, einfo):
+        print(f"Batch item task {task_id} failed: {exc}")
+        finish_batch_item(args[0], task_id, {"error": f"Transcription failed: {str(exc)}"})
+
+# Celery task for one file of a batch; each finished item starts the next waiting one of its batch
+@celery_app.task(bind=True, base=BatchItemTask, name=BATCH_ITEM_TASK)
+def process_batch_item(self, batch_id, audio_path, language_config="english", upload_sha256=None, output_mode="segments"):
+    return run_transcription_task(self, audio_path, language_config, upload_sha256, batch_id, output_mode)
+
+# Celery task translating a finished transcript; the translation is pushed to event subscribers
+@celery_app.task(name=TRANSLATION_TASK)
+def translate_transcription(task_id, segments, source_language, target_language, language_config=None):
+    with metric_labels(language_config), stage_timer("translate"):
+        translations, stats = translate_transcript(segments, source_language, target_language)
+    print(f"Translated task {task_id} ({source_language} -> {target_language}): {stats}")
+    publish_task_event(task_id, "translation", translation=" ".join(translations), translations=translations,
+                       source_language=source_language, target_language=target_language)
+    return {"translations": translations, **stats}
+
+# Periodic task checking the pending long running operations in batches and finishing those done
+@celery_app.task(name=POLL_OPERATIONS_TASK)
+def poll_pending_operations():
+    records = claim_due_operations()
+    if not records:
+        return 0
+    client = get_speech_client()
+    with ThreadPoolExecutor(max_workers=OPERATIONS_POLL_WORKERS) as pool:
+        finished = sum(pool.map(lambda record: poll_operation(client, record), records))
+    print(f"Checked {len(records)} pending operations, {finished} finished")
+    return finished
+
+# Function to check one pending operation and finish its task once it is done; returns whether it finished
+def poll_operation(client, record):
+    try:
+        state, payload = check_operation(client, record)
+    except Exception as e:
+        print(f"Warning: Could not check operation {record['name']}: {e}")
+        reschedule_operation(record["name"])
+        return False
+
+    if state == "running":
+        reschedule_operation(record["name"])
+        return False
+    with metric_labels(record["language_config"], record.get("duration_secs")):
+        observe_stage("long_running_wait", time.time() - record["submitted_at"])
+        if state == "done":
+            result = recognition_response_to_output(payload, record["language_config"])
+        elif state == "failed":
+            count_stage_error("long_running_wait")
+            result = {"error": f"Transcription failed: {payload}"}
+        else:
+            count_stage_error("long_running_wait")
+            result = {"error": f"Transcription timed out after {int(record['deadline'] - record['submitted_at'])}s"}
+
+        finish_operation(record, result)
+    return True
+
+# Function to finish the task of a completed operation under its original task ID
+def finish_operation(record, result):
+    delete_gcs_blob(record["bucket"], record["blob"])
+    if "transcription" in result:
+        cache = get_result_cache()
+        for key in record["cache_keys"]:
+            cache_store(cache, key, result)
+
+    # Stored before the result event, so a client reacting to the event finds the result
+    output_mode = record.get("output_mode", "segments")
+    celery_app.backend.store_result(record["task_id"], apply_output_mode(result, output_mode), states.SUCCESS)
+    try:
+        finish_transcription(record["task_id"], result, record.get("batch_id"), output_mode,
+                             record["language_config"])
+    finally:
+        remove_operation(record["name"])
+
+# Periodic task finishing the running batch items whose task ended without finishing them: killed by
+# the hard time limit or with its worker (the task is then stored as failed), or revoked. Each one is
+# recorded with an error and the next waiting item of its batch is started.
+@celery_app.task(name=REAP_BATCHES_TASK)
+def reap_batch_items():
+    reaped = 0
+    for batch_id, item in running_batch_items():
+        task = celery_app.AsyncResult(item["task_id"])
+        if task.state == states.SUCCESS:
+            result = task.result
+        elif task.state in (states.FAILURE, states.REVOKED):
+            result = {"error": f"Transcription failed: {task.result!r}"}
+        else:
+            continue
+        print(f"Reaping batch item {item['task_id']} of batch {batch_id} ({task.state})")
+        finish_batch_item(batch_id, item["task_id"], result)
+        reaped += 1
+    return reaped
+
+# Periodic task removing local files and GCS temp blobs left behind by killed workers or failed deletes.
+# Local files are swept on the host of the worker that runs it; uploads of unfinished batch items are kept.
+@celery_app.task(name=SWEEP_SCRATCH_TASK)
+def sweep_scratch():
+    try:
+        keep = pending_batch_audio_paths()
+    except Exception as e:
+        print(f"Warning: Could not list pending batch uploads, skipping the local sweep: {e}")
+        keep = None
+    removed = sweep_local_files(keep=keep) if keep is not None else 0
+    try:
+        removed += sweep_temp_blobs(get_storage_client(), GCS_TEMP_BUCKET, pending_operation_blobs())
+    except Exception as e:
+        print(f"Warning: Could not sweep temporary blobs: {e}")
+    return removed
+
+# Function to preprocess audio locally into workdir (the system temp directory by default); a WAV
+# already in the target format is used as it is
+def preprocess_audio_local(audio_path, target_sample_rate=16000, probe=None, workdir=None, remove_original=True):
+    if probe is not None and not needs_transcode(probe, target_sample_rate):
+        print(f"Audio is already LINEAR16 mono at {target_sample_rate} Hz, skipping transcoding: {audio_path}")
+        return audio_path
+
+    # Create a temporary file for the processed audio
+    import tempfile
+    with tempfile.NamedTemporaryFile(suffix='.wav', delete=False, dir=workdir) as tmp_file:
+        processed_audio_path = tmp_file.name
+
+    result = preprocess_audio_with_sox(audio_path, processed_audio_path, target_sample_rate, remove_original)
+    if result is None and os.path.exists(processed_audio_path):
+        os.remove(processed_audio_path)
+    return result
+
+# Function to transcode an upload straight into an AudioStager (memory or resumable GCS upload) and
+# delete the original on success (unless remove_original is False); returns the StagedAudio or None.
+# A transient GCS failure (quota.is_retryable) is raised instead, with the original kept, so the task is retried.
+def stage_audio_direct(audio_path, target_sample_rate=16000, probe=None, remove_original=True):
+    stager = AudioStager(target_sample_rate)
+    try:
+        if probe is not None and not needs_transcode(probe, target_sample_rate):
+            copy_wav_to_sink(audio_path, stager)
+        else:
+            transcode_audio_to_sink(audio_path, stager, target_sample_rate)
+        staged = stager.close()
+    except Exception as e:
+        print(f"Error: {e}")
+        stager.abort()
+        if is_retryable(e):
+            raise
+        return None
+    if not remove_original:
+        return staged
+
+    # Remove the original file
+    try:
+        os.remove(audio_path)
+        print(f"Deleted the original audio file: {audio_path}")
+    except OSError as e:
+        print(f"Warning: Could not delete original audio file: {e}")
+
+    return staged
+
+#------------------------------------------------------------------------------------------------------
+
+# Function to preprocess large audio files with pydub (decodes the whole file in memory)
+def preprocess_audio(audio_path, destination_blob_name, target_sample_rate=16000):
+    return transcode_and_remove_original(audio_path, destination_blob_name, target_sample_rate, backends=["pydub"])
+
+# Function to preprocess large audio files by streaming them through sox or ffmpeg,
+# picked by format, with pydub as the fallback
+def preprocess_audio_with_sox(audio_path, destination_blob_name, target_sample_rate=16000, remove_original=True):
+    return transcode_and_remove_original(audio_path, destination_blob_name, target_sample_rate,
+                                         remove_original=remove_original)
+
+# Function to transcode to LINEAR16 mono WAV and delete the original on success (unless remove_original is False)
+def transcode_and_remove_original(audio_path, processed_audio_path, target_sample_rate=16000, backends=None,
+                                  remove_original=True):
+    try:
+        transcode_audio(audio_path, processed_audio_path, target_sample_rate, backends)
+    except TranscodeError as e:
+        print(f"Error: {e}")
+        return None
+
+    # Verify the processed file was created
+    if not os.path.exists(processed_audio_path):
+        print(f"Error: Processed audio file was not created: {processed_audio_path}")
+        return None
+    if not remove_original:
+        return processed_audio_path
+
+    # Remove the original file
+    try:
+        os.remove(audio_path)
+        print(f"Deleted the original audio file: {audio_path}")
+    except OSError as e:
+        print(f"Warning: Could not delete original audio file: {e}")
+
+    return processed_audio_path
+
+#------------------------------------------------------------------------------------------------------
+# Function to upload audio to Google Cloud Storage
+def upload_to_gcs(bucket_name, source_file_name, destination_blob_name):
+    storage_client = get_storage_client()
+    bucket = storage_client.bucket(bucket_name)
+    blob = bucket.blob(destination_blob_name)
+
+    blob.upload_from_filename(source_file_name)
+
+    return f"gs://{bucket_name}/{destination_blob_name}"
+#------------------------------------------------------------------------------------------------------
+# Function to Get audio from Google Cloud Storage
+#------------------------------------------------------------------------------------------------------
+def get_file_from_bucket(bucket_name, file_path):
+    try:
+        # Create a client to interact with Google Cloud Storage
+        storage_client = get_storage_client()
+
+        # Get the bucket object
+        bucket = storage_client.get_bucket(bucket_name)
+
+        # Get the blob object representing the file
+        blob = bucket.blob(file_path)
+
+        # Download the file contents as a string
+        file_contents = blob.download_as_text()
+
+        # Parse the JSON data
+        json_data = json.loads(file_contents)
+
+        return json_data
+
+    except Exception as e:
+        print(f"Error retrieving file from bucket: {e}")
+        return None
+#------------------------------------------------------------------------------------------------------  
+
+# Function to check whether audio of this length is recognized as concurrent chunks: with
+# CHUNKED_RECOGNITION, and always with a recognizer that has no long running operations
+def recognize_in_chunks(duration_secs, recognizer):
+    return duration_secs > 60 and (CHUNKED_RECOGNITION or not recognizer.long_running)
+
+#Main Function to Generate transcript
+# With defer_operation, audio sent to GCS only has its long running operation submitted; the result
+# is {"pending_operation": {...}} and the operations poller finishes the transcription later.
+# Inline and chunked audio go to the RECOGNIZER_BACKEND recognizer, long running operations to Google.
+def run_batch_recognize(audio_path, language_config="english", progress=None, on_segments=None, defer_operation=False):
+    try:
+        duration_secs = get_wav_duration(audio_path)
+        recognizer = get_recognizer()
+
+        # Long files are split into overlapping chunks and recognized concurrently
+        if recognize_in_chunks(duration_secs, recognizer):
+            def on_chunk(done, total, chunk):
+                if on_segments is not None:
+                    on_segments(chunk["index"], merge_chunk_results([chunk], language_config))
+                if progress is not None:
+                    progress("recognizing", chunks_done=done, chunks_total=total)
+
+            count_recognition_path("chunked")
+            return run_chunked_recognize(audio_path, language_config, recognizer, on_chunk=on_chunk)
+
+        # Synchronous recognition takes up to a minute of audio; only inline audio is read into memory
+        file_size = os.path.getsize(audio_path)
+        
+        if duration_secs > 60:
+            # Upload to GCS for longer audio
+            print(f"Audio file is {file_size} bytes, uploading to GCS for processing")
+            
+            # Generate a unique filename for GCS
+            import uuid
+            gcs_filename = f"temp_audio_{uuid.uuid4()}.wav"
+            with stage_timer("gcs_upload"):
+                upload_to_gcs(GCS_TEMP_BUCKET, audio_path, gcs_filename)
+            return run_long_running_recognize(get_speech_client(), get_recognition_config(language_config),
+                                              GCS_TEMP_BUCKET, gcs_filename, duration_secs, language_config,
+                                              defer_operation)
+                
+        else:
+            # Use inline audio for shorter files
+            print(f"Audio file is {file_size} bytes, using inline processing")
+            count_recognition_path("inline")
+            with open(audio_path, "rb") as audio_file:
+                content = audio_file.read()
+            with stage_timer("recognize"):
+                response = recognizer.recognize_response(content, language_config)
+        
+        return recognition_response_to_output(response, language_config)
+        
+    except Exception as e:
+        if is_retryable(e):
+            raise
+        print(f"Error in run_batch_recognize: {e}")
+        return {"error": f"Transcription failed: {str(e)}"}
+
+# Function to recognize audio staged by stage_audio_direct, inline or from its GCS blob
+def run_staged_recognize(staged, language_config="english", defer_operation=False):
+    try:
+        if staged.content is None:
+            return run_long_running_recognize(get_speech_client(), get_recognition_config(language_config),
+                                              staged.bucket_name, staged.blob_name, staged.duration_secs,
+                                              language_config, defer_operation)
+
+        print(f"Audio is {staged.size_bytes} bytes, using inline processing")
+        count_recognition_path("inline")
+        with stage_timer("recognize"):
+            response = get_recognizer().recognize_response(staged.content, language_config)
+        return recognition_response_to_output(response, language_config)
+    except Exception as e:
+        if is_retryable(e):
+            raise
+        print(f"Error in run_staged_recognize: {e}")
+        return {"error": f"Transcription failed: {str(e)}"}
+
+# Function to recognize audio in a GCS blob with a long running operation. With defer_operation only the
+# operation is submitted and {"pending_operation": {...}} returned; otherwise it waits for the result.
+# The blob is deleted here unless the operations poller takes it over.
+def run_long_running_recognize(client, config, bucket_name, blob_name, duration_secs, language_config="english",
+                               defer_operation=False):
+    gcs_uri = f"gs://{bucket_name}/{blob_name}"
+    handed_over = False
+    count_recognition_path("gcs")
+    try:
+        # Use long running recognition with GCS URI
+        audio = speech.RecognitionAudio(uri=gcs_uri)
+        with stage_timer("recognize"):
+            operation = client.long_running_recognize(config=config, audio=audio,
+                                                      quota_cost=speech_request_count(duration_secs))
+        timeout = operation_timeout(duration_secs)
+
+        if defer_operation:
+            print(f"Submitted operation {operation.operation.name} for {gcs_uri}")
+            handed_over = True
+            return {"pending_operation": {
+                "name": operation.operation.name,
+                "bucket": bucket_name,
+                "blob": blob_name,
+                "duration_secs": duration_secs,
+                "submitted_at": time.time(),
+                "deadline": time.time() + timeout,
+            }}
+
+        with stage_timer("long_running_wait"):
+            response = operation.result(timeout=timeout)
+        return recognition_response_to_output(response, language_config)
+    finally:
+        if not handed_over:
+            delete_gcs_blob(bucket_name, blob_name)
+
+# Function to turn a recognize or long running recognize response into the transcription output,
+# with the word offsets and confidences in the result's word table
+def recognition_response_to_output(response, language_config="english"):
+    with stage_timer("result_parse"):
+        output_data = []
+        for result in response_to_results(response):
+            words = result["words"]
+            entry = {
+                "start_time": f"{words[0]['start']}s" if words else "0.0s",
+                "end_time": f"{words[-1]['end']}s" if words else "0.0s",
+                "language_code": language_config,
+                "confidence": result["confidence"],
+                "transcript": result["transcript"],
+                "words": words,
+            }
+            output_data.append(entry)
+
+        if not output_data:
+            return {"error": "No transcription results found"}
+
+        return transcription_with_words(output_data)
+
+# Function to delete a temporary GCS upload
+def delete_gcs_blob(bucket_name, blob_name):
+    start = time.perf_counter()
+    try:
+        get_storage_client().bucket(bucket_name).blob(blob_name).delete()
+        print(f"Cleaned up GCS file: {blob_name}")
+    except Exception as e:
+        count_stage_error("cleanup")
+        print(f"Warning: Could not clean up GCS file: {e}")
+    observe_stage("cleanup", time.perf_counter() - start)